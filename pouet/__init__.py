@@ -1,10 +1,10 @@
-__all__ = ["config", "obsprogram", "clouds", "design", "main", "meteo", "obs", "plots", "run", "util"]
+__all__ = ["config", "obsprogram", "batch", "cli", "clouds", "cloudstore", "design", "fetcher", "main", "meteo", "nowcast", "obs", "pixelmap", "plots", "providers", "reprocess", "resources", "run", "skygrid", "util", "weatherhistory", "weatherparser", "weatherservice"]
 
 
 # add the pouet package to sys path so submodules can be called directly
 # todo: find a way to use absolute imports instead, i.e. pouet.obs instead of obs
 
-import os, sys, inspect
-path = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
+import os, sys
+path = os.path.dirname(os.path.abspath(__file__))
 sys.path.append(path)
 
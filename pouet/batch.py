@@ -0,0 +1,304 @@
+"""
+Vectorized computation of the observability of a whole catalogue at once
+
+The functions of this module work on numpy arrays of coordinates and constraints (one element per target) instead of looping over :class:`~obs.Observable` objects. They reproduce the flags and observability value of :meth:`~obs.Observable.compute_observability`, so results can be checked against the scalar path.
+
+.. note:: all the angles are in radians, except the constraints minangletomoon which is in degrees like in the obsprogram files.
+"""
+
+import numpy as np
+from astropy.time import Time
+from astropy import units as u
+import astropy.coordinates.angles as angles
+
+import util
+
+import logging
+logger = logging.getLogger(__name__)
+
+ERROR_CONN = 2.
+ERROR_COMPUTE = 3.
+
+
+def compute_cloudfree(meteo, azimuths, altitudes):
+	"""
+	Cloud-free fraction of the sky in the direction of each target, see :meth:`~obs.Observable.is_cloudfree`
+
+	:param meteo: a Meteo object, whose cloudmap attribute has been actualized beforehand. The map is predicted at the meteo time if the nowcast is enabled, see :meth:`~meteo.Meteo.get_cloudmap`
+	:param azimuths: numpy array, azimuths in radians
+	:param altitudes: numpy array, altitudes in radians
+
+	:return: numpy array of cloud-free fractions, or 2 if there is no cloud map and 3 if the position is outside of the map
+	"""
+	cloudfree = np.ones(np.shape(azimuths)) * ERROR_CONN
+	cloudmap = meteo.get_cloudmap()
+	if cloudmap is None:
+		logger.warning("No cloud map in meteo object")
+		return cloudfree
+
+	cloudmap = np.asarray(cloudmap)
+	xpix, ypix, valid = meteo.allsky.pixelmap.pixels(np.ravel(azimuths), np.ravel(altitudes), shape=cloudmap.shape)
+	# a single gather from the map, the invalid positions read pixel (0, 0) and are overwritten
+	cloudfree = np.where(valid, np.round(cloudmap[xpix, ypix], 3), ERROR_COMPUTE)
+
+	return cloudfree.reshape(np.shape(azimuths))
+
+
+def compute_positions(meteo, alphas, deltas, obs_time=None):
+	"""
+	Computes the altitude, azimuth, airmass and the angles to the Moon, Sun and wind of all the targets, see :meth:`~obs.Observable.update`
+
+	:param meteo: a Meteo object, whose time attribute has been actualized beforehand
+	:param alphas: numpy array, right ascensions in radians
+	:param deltas: numpy array, declinations in radians
+	:param obs_time: Astropy Time object. If None, use the meteo time.
+
+	:return: dictionary of numpy arrays: azimuth, altitude, airmass, angletomoon, angletosun and angletowind, all angles in radians. angletowind is NaN if there is no valid wind direction.
+	"""
+	if obs_time is None:
+		obs_time = meteo.time
+
+	alphas = np.atleast_1d(np.asarray(alphas, dtype=np.float64))
+	deltas = np.atleast_1d(np.asarray(deltas, dtype=np.float64))
+
+	az, alt = meteo.get_AzAlt_array(alphas, deltas, obs_time)
+
+	positions = {"azimuth": az, "altitude": alt}
+	positions["airmass"] = util.elev2airmass(alt, meteo.elev)
+	positions["angletomoon"] = util.angular_separation(meteo.moonaz.radian, meteo.moonalt.radian, az, alt)
+	positions["angletosun"] = util.angular_separation(meteo.sunaz.radian, meteo.sunalt.radian, az, alt)
+
+	if meteo.winddirection < 0 or meteo.winddirection > 360:
+		positions["angletowind"] = np.ones_like(az) * np.nan
+	else:
+		positions["angletowind"] = util.angular_separation(np.deg2rad(meteo.winddirection), 0., az, 0.)
+
+	return positions
+
+
+def _general_observability(res, minangletomoon, maxairmass):
+	"""
+	Applies the moon distance and airmass conditions of :meth:`~obs.Observable.compute_observability`, adding the obs_moondist, obs_highairmass and obs_airmass flags to res
+
+	:param res: dictionary containing the angletomoon (radians) and airmass arrays, of any shape
+	:param minangletomoon: float or numpy array broadcastable against the arrays of res, minimum angle to the moon in degrees
+	:param maxairmass: float or numpy array broadcastable against the arrays of res, maximum airmass
+
+	:return: numpy array of observabilities
+	"""
+	observability = np.ones(np.shape(res["airmass"]))
+	moondist = np.rad2deg(res["angletomoon"])
+	airmass = res["airmass"]
+
+	res["obs_moondist"] = ~(moondist < minangletomoon)
+	observability[~res["obs_moondist"]] *= 0.8
+
+	res["obs_highairmass"] = ~(airmass > 1.5)
+	observability[~res["obs_highairmass"]] *= 0.7
+
+	res["obs_airmass"] = ~(airmass > maxairmass)
+	observability[~res["obs_airmass"]] = 0
+
+	return observability
+
+
+def compute_observability(meteo, alphas, deltas, minangletomoon, maxairmass, cwvalidity=30, cloudscheck=True, future=False):
+	"""
+	Computes the observability of all the targets, a value between 0 and 1, and the associated flags, see :meth:`~obs.Observable.compute_observability`
+
+	The program-specific conditions and the internal observability flag are not taken into account here, see :meth:`~batch.update_observables`
+
+	:param meteo: a Meteo object, whose time attribute has been actualized beforehand
+	:param alphas: numpy array, right ascensions in radians
+	:param deltas: numpy array, declinations in radians
+	:param minangletomoon: float or numpy array, minimum angle to the moon in degrees
+	:param maxairmass: float or numpy array, maximum airmass
+	:param cwvalidity: float, current weather validity: time (in minutes) after/before which the allsky cloud coverage and wind are not taken into account in the observability, effectively setting the future variable to True
+	:param cloudscheck: boolean, if set to True then use the cloud coverage in the observability computation.
+	:param future: boolean, if set to True then cloud coverage and wind are note taken into account in the observability.
+
+	:return: dictionary of numpy arrays, containing the positions of :meth:`~batch.compute_positions`, observability, cloudfree and the obs_* boolean flags
+	"""
+	logger.debug("Computing observability of {} targets...".format(np.size(alphas)))
+	res = compute_positions(meteo, alphas, deltas)
+	n = np.size(res["altitude"])
+
+	# the weather and all-sky data are those of the current time of the meteo, the replay time if any
+	if np.abs(meteo.time - meteo.now()).to(u.s).value / 60. > cwvalidity: future = True
+
+	observability = _general_observability(res, minangletomoon, maxairmass)
+
+	# wind
+	res["obs_wind"] = np.ones(n, dtype=bool)
+	res["obs_wind_info"] = np.ones(n, dtype=bool)
+	if not future:
+		windspeed = meteo.get_windspeed()
+		if windspeed > 0. and windspeed < 100. and not (meteo.winddirection < 0 or meteo.winddirection > 360):
+			if windspeed >= float(meteo.location.get("weather", "windWarnLevel")):
+				res["obs_wind"][np.rad2deg(res["angletowind"]) < 90] = False
+			if windspeed >= float(meteo.location.get("weather", "windLimitLevel")):
+				res["obs_wind"][:] = False
+			observability[~res["obs_wind"]] = 0
+		else:
+			res["obs_wind_info"][:] = False
+	else:
+		res["obs_wind_info"][:] = False
+
+	# clouds
+	res["obs_clouds"] = np.ones(n, dtype=bool) * cloudscheck
+	res["obs_clouds_info"] = np.ones(n, dtype=bool)
+	res["cloudfree"] = np.ones(n) * np.nan
+	if not future and cloudscheck:
+		cloudfree = compute_cloudfree(meteo, res["azimuth"], res["altitude"])
+		res["cloudfree"] = cloudfree
+
+		cloudy = cloudfree <= 0.5
+		maybe = (cloudfree > 0.5) & (cloudfree <= 0.9)
+		res["obs_clouds"][cloudy | maybe] = False
+		# no cloud info above 1, and for the NaN of the masked pixels
+		res["obs_clouds_info"][~(cloudfree <= 1.)] = False
+		observability[cloudy] = 0
+		observability[maybe] *= cloudfree[maybe]
+	else:
+		res["obs_clouds_info"][:] = False
+
+	res["observability"] = observability
+	return res
+
+
+def update_observables(observables, meteo, cwvalidity=30, cloudscheck=True, future=False):
+	"""
+	Computes the observability of a list of observables in one pass and stores the results in each observable, like :meth:`~obs.Observable.compute_observability` does
+
+	:param observables: list of :class:`~obs.Observable`. Hidden observables are not updated.
+	:param meteo: a Meteo object, whose time attribute has been actualized beforehand
+	:param cwvalidity: float, see :meth:`~batch.compute_observability`
+	:param cloudscheck: boolean, see :meth:`~batch.compute_observability`
+	:param future: boolean, see :meth:`~batch.compute_observability`
+	"""
+	observables = [o for o in observables if o.hidden is False]
+	if len(observables) == 0:
+		return
+
+	alphas = np.array([o.alpha.radian for o in observables])
+	deltas = np.array([o.delta.radian for o in observables])
+	minangletomoon = np.array([o.minangletomoon for o in observables], dtype=np.float64)
+	maxairmass = np.array([o.maxairmass for o in observables], dtype=np.float64)
+
+	res = compute_observability(meteo, alphas, deltas, minangletomoon, maxairmass, cwvalidity=cwvalidity, cloudscheck=cloudscheck, future=future)
+
+	# Angle arrays are built once, indexing them is much cheaper than creating a new Angle per target
+	azimuths = angles.Angle(res["azimuth"], unit="radian")
+	altitudes = angles.Angle(res["altitude"], unit="radian")
+	angletomoons = angles.Angle(res["angletomoon"], unit="radian")
+	angletosuns = angles.Angle(res["angletosun"], unit="radian")
+	angletowinds = angles.Angle(res["angletowind"], unit="radian")
+	has_cloudfree = ~np.isnan(res["cloudfree"])
+
+	for i, o in enumerate(observables):
+		o.azimuth = azimuths[i]
+		o.altitude = altitudes[i]
+		o.airmass = res["airmass"][i]
+		o.angletomoon = angletomoons[i]
+		o.angletosun = angletosuns[i]
+		o.angletowind = None if np.isnan(res["angletowind"][i]) else angletowinds[i]
+
+		for flag in ["obs_moondist", "obs_highairmass", "obs_airmass", "obs_wind", "obs_wind_info", "obs_clouds", "obs_clouds_info"]:
+			setattr(o, flag, bool(res[flag][i]))
+
+		if has_cloudfree[i]:
+			o.cloudfree = res["cloudfree"][i]
+			if o.cloudfree not in [ERROR_CONN, ERROR_COMPUTE]:
+				o.cloudcover = 1.-np.floor(float(o.cloudfree)*10.)/10.
+
+		observability = res["observability"][i]
+
+		o.obs_internal = True
+		if hasattr(o, 'internalobs'):
+			if o.internalobs == 0:
+				o.obs_internal = False
+				observability = o.internalobs
+
+		pobs, _, _ = o.program.observability(o.attributes, meteo.time)
+		if pobs == 0: observability = 0
+
+		o.observability = observability
+
+	logger.debug("Observability of {} targets computed".format(len(observables)))
+
+
+def compute_night(meteo, alphas, deltas, minangletomoon, maxairmass, times):
+	"""
+	Computes the positions and observability of all the targets at all the given times in one pass, for night planning
+
+	Like in :func:`~plots.shownightobs`, these are predictions: wind and clouds are not taken into account. The Sun and Moon positions are interpolated in :meth:`~meteo.Meteo.get_ephemerides`, and the meteo time is left untouched.
+
+	:param meteo: a Meteo object
+	:param alphas: numpy array, right ascensions in radians
+	:param deltas: numpy array, declinations in radians
+	:param minangletomoon: float or numpy array, minimum angle to the moon in degrees
+	:param maxairmass: float or numpy array, maximum airmass
+	:param times: array-valued Astropy Time object, see :meth:`~meteo.Meteo.get_nighttimes`
+
+	:return: dictionary of numpy arrays of shape (targets, times): azimuth, altitude, airmass, angletomoon, angletosun (radians), observability and the obs_moondist, obs_highairmass and obs_airmass flags. The times are stored under "times".
+	"""
+	alphas = np.atleast_1d(np.asarray(alphas, dtype=np.float64))
+	deltas = np.atleast_1d(np.asarray(deltas, dtype=np.float64))
+	logger.debug("Computing night observability of {} targets at {} times...".format(len(alphas), len(times)))
+
+	eph = meteo.get_ephemerides(times).get(times)
+	az, alt = meteo.get_AzAlt_array(alphas, deltas, times)
+
+	res = {"times": times, "azimuth": az, "altitude": alt}
+	res["airmass"] = util.elev2airmass(alt, meteo.elev)
+	res["angletomoon"] = util.angular_separation(eph["moonaz"], eph["moonalt"], az, alt)
+	res["angletosun"] = util.angular_separation(eph["sunaz"], eph["sunalt"], az, alt)
+
+	# constraints are given per target, they apply to all times
+	minangletomoon = np.asarray(minangletomoon, dtype=np.float64)
+	maxairmass = np.asarray(maxairmass, dtype=np.float64)
+	if minangletomoon.ndim > 0: minangletomoon = minangletomoon[:, np.newaxis]
+	if maxairmass.ndim > 0: maxairmass = maxairmass[:, np.newaxis]
+
+	res["observability"] = _general_observability(res, minangletomoon, maxairmass)
+	return res
+
+
+def night_observables(observables, meteo, obs_night, twilight="nautical", nhours=100):
+	"""
+	Computes the observability of a list of observables along a night, see :meth:`~batch.compute_night`
+
+	On top of the general conditions, the internal observability flag and the program-specific conditions of each observable are applied at each time.
+
+	:param observables: list of :class:`~obs.Observable`, or a :class:`~obs.Catalogue`
+	:param meteo: a Meteo object
+	:param obs_night: string formatted as YYYY-MM-DD. Night where the observations start.
+	:param twilight: string, see :meth:`~meteo.Meteo.get_nighttimes`
+	:param nhours: integer, number of times along the night
+
+	:return: dictionary of numpy arrays of shape (targets, times), see :meth:`~batch.compute_night`, with the target names under "names"
+	"""
+	observables = list(observables)
+	times = meteo.get_nighttimes(obs_night, twilight=twilight, nhours=nhours)
+
+	alphas = np.array([o.alpha.radian for o in observables])
+	deltas = np.array([o.delta.radian for o in observables])
+	minangletomoon = np.array([o.minangletomoon for o in observables], dtype=np.float64)
+	maxairmass = np.array([o.maxairmass for o in observables], dtype=np.float64)
+
+	res = compute_night(meteo, alphas, deltas, minangletomoon, maxairmass, times)
+	res["names"] = [o.name for o in observables]
+
+	observability = res["observability"]
+	timelist = list(times)
+	for i, o in enumerate(observables):
+		if hasattr(o, 'internalobs') and o.internalobs == 0:
+			observability[i] = 0
+			continue
+		if getattr(o, "program", None) is None:
+			continue
+		for j, time in enumerate(timelist):
+			pobs, _, _ = o.program.observability(o.attributes, time)
+			if pobs == 0: observability[i, j] = 0
+
+	return res
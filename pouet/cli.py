@@ -0,0 +1,215 @@
+"""
+Headless command-line interface: computes the observability of catalogues and streams the results as TSV, CSV or JSON lines
+
+Nothing from Qt or matplotlib is imported, so it can run in cron jobs and pipelines on headless machines. Example::
+
+    pouet cats/example.pouet --start "2018-02-12 00:00:00" --end "2018-02-12 08:00:00" --step 60 --format csv
+
+By default only the Sun and Moon positions are computed (as for a prediction). Use ``--weather`` to fetch the current weather report, and ``--clouds`` to also analyse the all-sky image.
+"""
+
+import sys
+import argparse
+import csv
+import json
+import numpy as np
+from astropy.time import Time, TimeDelta
+import logging
+
+import obs, run
+
+logger = logging.getLogger(__name__)
+
+COLUMNS = ["time", "name", "alpha", "delta", "obsprogram", "altitude", "azimuth", "airmass", "angletomoon", "angletosun", "angletowind", "cloudcover", "observability"]
+
+
+def parse_args(argv=None):
+    """
+    :param argv: list of command-line arguments. If None, use sys.argv
+    :return: argparse Namespace
+    """
+    parser = argparse.ArgumentParser(prog="pouet", description="Compute the observability of catalogues and stream the results, without starting the GUI.")
+    parser.add_argument("catalogues", nargs="+", help="catalogue files, see obs.rdbimport")
+    parser.add_argument("--obsprogram", default=None, help="default obsprogram, for the catalogues without an obsprogram column")
+    parser.add_argument("--station", default="LaSilla", help="name of the station config file (default: %(default)s)")
+
+    when = parser.add_argument_group("time", "a single time (--start, default now), a time range (--start, --end and --step) or a whole night (--night)")
+    when.add_argument("--start", default=None, help="UTC time, formatted as YYYY-MM-DD HH:MM:SS")
+    when.add_argument("--end", default=None, help="UTC time of the end of the range, included")
+    when.add_argument("--step", type=float, default=30., help="time step of the range, in minutes (default: %(default)s)")
+    when.add_argument("--night", default=None, help="night formatted as YYYY-MM-DD, between nautical twilights")
+    when.add_argument("--nsteps", type=int, default=20, help="number of times along the night (default: %(default)s)")
+
+    parser.add_argument("--format", choices=["tsv", "csv", "json"], default="tsv", help="output format, json is one object per line (default: %(default)s)")
+    parser.add_argument("--output", default=None, help="output file. Default is the standard output")
+    parser.add_argument("--observable", action="store_true", help="only output the targets with an observability above 0")
+    parser.add_argument("--weather", action="store_true", help="fetch the current weather report")
+    parser.add_argument("--clouds", action="store_true", help="fetch and analyse the current all-sky image, implies --weather")
+    parser.add_argument("--debugmode", action="store_true", help="use dummy weather and all-sky data")
+    parser.add_argument("--replay-weather", nargs="+", default=[], metavar="FILE", help="archived weather reports, the one of --start is used instead of the current report")
+    parser.add_argument("--replay-allsky", nargs="+", default=[], metavar="FILE", help="archived all-sky images, dated by their modification time, the one of --start is used instead of the current image")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log to stderr, -vv for debug logs")
+
+    args = parser.parse_args(argv)
+    if args.clouds:
+        args.weather = True
+    if args.night is not None and (args.start is not None or args.end is not None):
+        parser.error("--night cannot be combined with --start or --end")
+    if args.end is not None and args.step <= 0:
+        parser.error("--step must be positive")
+    return args
+
+
+def get_times(args, currentmeteo):
+    """
+    :param args: argparse Namespace, see :func:`~cli.parse_args`
+    :param currentmeteo: a Meteo object, for the twilights of the night, and the current time without --start, the replay time if any
+    :return: list of Astropy Time objects
+    """
+    if args.night is not None:
+        return list(currentmeteo.get_nighttimes(args.night, nhours=args.nsteps))
+
+    start = currentmeteo.now() if args.start is None else Time(args.start, format="iso", scale="utc")
+    if args.end is None:
+        return [start]
+
+    end = Time(args.end, format="iso", scale="utc")
+    nsteps = int(np.floor((end - start).sec / (args.step * 60.) + 1e-9)) + 1
+    return [start + TimeDelta(i * args.step * 60., format="sec") for i in range(max(nsteps, 0))]
+
+
+def load_catalogue(filepaths, obsprogram=None):
+    """
+    :param filepaths: list of catalogue files
+    :param obsprogram: default obsprogram, see :meth:`~obs.rdbimport`
+    :return: :class:`~obs.Catalogue`. Targets appearing several times, in one or several catalogues, are only kept once: the first one is kept.
+    """
+    catalogue = obs.Catalogue()
+    names = set()
+    for filepath in filepaths:
+        observables = []
+        for o in obs.rdbimport(filepath, obsprogram=obsprogram):
+            if o.name not in names:
+                names.add(o.name)
+                observables.append(o)
+        catalogue.extend(observables)
+    logger.info("Loaded {} targets".format(len(catalogue)))
+    return catalogue
+
+
+def rows(catalogue, obs_time, observable=False):
+    """
+    Formats the results of the catalogue at one time
+
+    :param catalogue: :class:`~obs.Catalogue`, updated beforehand
+    :param obs_time: Astropy Time object
+    :param observable: boolean, if True only yield the targets with an observability above 0
+    :return: generator of dictionaries, with the keys of COLUMNS. Angles are in degrees, missing values are None.
+    """
+    def value(array, i, decimals):
+        return None if np.isnan(array[i]) else round(float(array[i]), decimals)
+
+    altitude = np.rad2deg(catalogue.altitude)
+    azimuth = np.rad2deg(catalogue.azimuth)
+    angletomoon = np.rad2deg(catalogue.angletomoon)
+    angletosun = np.rad2deg(catalogue.angletosun)
+    angletowind = np.rad2deg(catalogue.angletowind)
+    time = obs_time.iso
+
+    for i in range(len(catalogue)):
+        if observable and not catalogue.observability[i] > 0:
+            continue
+        view = catalogue[i]
+        yield {
+            "time": time,
+            "name": catalogue.names[i],
+            "alpha": view.alpha.to_string(sep=":", pad=True, precision=2),
+            "delta": view.delta.to_string(sep=":", pad=True, precision=1, alwayssign=True),
+            "obsprogram": catalogue.obsprograms[i],
+            "altitude": value(altitude, i, 2),
+            "azimuth": value(azimuth, i, 2),
+            "airmass": value(catalogue.airmass, i, 3),
+            "angletomoon": value(angletomoon, i, 2),
+            "angletosun": value(angletosun, i, 2),
+            "angletowind": value(angletowind, i, 2),
+            "cloudcover": value(catalogue.cloudcover, i, 1),
+            "observability": value(catalogue.observability, i, 3),
+        }
+
+
+class Writer:
+    """
+    Streams rows to a file in TSV, CSV or JSON lines format
+    """
+    def __init__(self, stream, fmt="tsv"):
+        """
+        :param stream: file-like object
+        :param fmt: string, "tsv", "csv" or "json"
+        """
+        self.stream = stream
+        self.fmt = fmt
+        if fmt == "json":
+            self.writer = None
+        else:
+            self.writer = csv.DictWriter(stream, fieldnames=COLUMNS, delimiter="\t" if fmt == "tsv" else ",", lineterminator="\n")
+            self.writer.writeheader()
+
+    def write(self, row):
+        if self.writer is None:
+            self.stream.write(json.dumps(row) + "\n")
+        else:
+            self.writer.writerow({k: "" if v is None else v for k, v in row.items()})
+
+    def flush(self):
+        self.stream.flush()
+
+
+def main(argv=None, stream=None):
+    """
+    Entry point of the command-line interface
+
+    :param argv: list of command-line arguments. If None, use sys.argv
+    :param stream: file-like object to write to. If None, use --output or the standard output
+    :return: exit status
+    """
+    args = parse_args(argv)
+    level = [logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)]
+    logging.basicConfig(format='PID %(process)06d | %(asctime)s | %(levelname)s: %(name)s(%(funcName)s): %(message)s', level=level, stream=sys.stderr)
+
+    catalogue = load_catalogue(args.catalogues, obsprogram=args.obsprogram)
+    provider = None
+    if args.replay_weather or args.replay_allsky:
+        import providers
+        start = None if args.start is None else Time(args.start, format="iso", scale="utc")
+        provider = providers.ReplayProvider(args.replay_weather, args.replay_allsky, speed=0., start=start)
+    currentmeteo = run.startup(name=args.station, cloudscheck=args.clouds, debugmode=args.debugmode, minimal=not args.weather, provider=provider)
+    times = get_times(args, currentmeteo)
+
+    close = False
+    if stream is None:
+        if args.output is None:
+            stream = sys.stdout
+        else:
+            stream = open(args.output, "w")
+            close = True
+
+    try:
+        writer = Writer(stream, args.format)
+        for obs_time in times:
+            # the weather and all-sky were fetched at startup, if asked for
+            run.refresh_status(currentmeteo, catalogue, minimal=True, obs_time=obs_time, cloudscheck=args.clouds)
+            for row in rows(catalogue, obs_time, observable=args.observable):
+                writer.write(row)
+            writer.flush()
+    except BrokenPipeError:
+        # e.g. piped into head
+        return 0
+    finally:
+        if close:
+            stream.close()
+    return 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
@@ -3,23 +3,22 @@ import scipy.ndimage
 from scipy.optimize import least_squares
 import scipy.ndimage.filters as filters
 import scipy.ndimage as ndimage
-from scipy.spatial import cKDTree
 import copy
 #todo: there seem to be a problem with urllib.request which does not exists anymore...?
 #import urllib.request, urllib.parse, urllib.error        
-import requests
+import io
+from PIL import Image
 import astropy.time
 from astropy import units as u
-import sys, os, inspect
+import sys, os
 
-import util
+import util, resources, pixelmap, fetcher, cloudstore, nowcast
 
 import logging
 logger = logging.getLogger(__name__)
 
 global SETTINGS
-herepath = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
-SETTINGS = util.readconfig(os.path.join(herepath, "config/settings.cfg"))
+SETTINGS = resources.settings()
 
 class Clouds():
     """
@@ -29,14 +28,15 @@ class Clouds():
     :note: This module can also be used to explore older images, see the example code in `__main__()`.
     """
     
-    def __init__(self, name, fimage=None, debugmode=False):
+    def __init__(self, name, fimage=None, debugmode=False, provider=None):
         """
         Initialises the class
         
-        :param fimage: (default is None) filename of the all sky image to analyse
+        :param fimage: (default is None) filename of the all sky image to analyse in debug mode. Otherwise, the image is downloaded in memory.
         :type: string
         :param name: (default is "LaSilla") name of the location to load the right config file
         :param debugmode: whether or not POUET is in debugmode. If true, it ought to return some static and dummy data
+        :param provider: object providing the images instead of the url of the station, and their time, see :mod:`providers`. Overrides the debugmode.
         """
         self.location = name
         self.station = (util.load_station(name)).AllSky()
@@ -44,33 +44,116 @@ class Clouds():
         self.debugmode = debugmode
         self.failed_connection = False
 
-        if fimage is None:
-            fimage = "current.jpg"
-            if debugmode:
-                fimage = os.path.join(os.path.dirname(os.path.abspath(inspect.stack()[0][1])) , "config", "AllSkyDebugMode.jpg")
-                logger.warning("Cloud analysis is working in debug mode (not using the real current image)")
-            self.fimage = fimage
+        if fimage is None and debugmode:
+            fimage = resources.path("config", "AllSkyDebugMode.jpg")
+            logger.warning("Cloud analysis is working in debug mode (not using the real current image)")
+        self.fimage = fimage
 
+        self._im_masked = None
+        self._im_original = None
+        self._frame = None
         self.observability_map = None
+        # stars and image of the last analysis, for the incremental updates
+        self.stars = None
+        self.analysed_image = None
+        self.last_full_analysis = None
+        self._store = None
+        self.nowcaster = nowcast.Nowcaster(blocksize=int(SETTINGS["clouds"]["nowcastblocksize"]), maxshift=int(SETTINGS["clouds"]["nowcastmaxshift"]), maxtime=float(SETTINGS["clouds"]["nowcastmaxtime"]))
+        self._pixelmap = None
+        timeout = (float(SETTINGS["clouds"]["connecttimeout"]), float(SETTINGS["clouds"]["readtimeout"]))
+        self.fetcher = fetcher.Fetcher(self.station.params['url'], timeout=timeout)
+        self.provider = provider
+        if provider is not None:
+            self.fetcher = provider.allsky
+
+    def now(self):
+        """
+        :return: Astropy Time object, current time of the provider if any, otherwise the current time
+        """
+        if self.provider is not None:
+            return self.provider.now()
+        return astropy.time.Time.now()
+
+    def __copy__(self):
+        """
+        Copy on which an analysis does not change this object, see :meth:`~meteo.Meteo.update_concurrent`
+
+        The state that the analysis changes in place, the image of the last analysis and the nowcaster, is copied. The images and maps are only replaced by the analysis, they are shared, as well as the fetcher of the images and the cloud store: the copy takes over the downloads and the storage.
+        """
+        allsky = self.__class__.__new__(self.__class__)
+        allsky.__dict__.update(self.__dict__)
+        if self.analysed_image is not None:
+            allsky.analysed_image = self.analysed_image.copy()
+        allsky.nowcaster = copy.copy(self.nowcaster)
+        return allsky
+
+    @property
+    def im_original(self):
+        """
+        Gray all-sky image
+        """
+        return self._im_original
+
+    @im_original.setter
+    def im_original(self, value):
+        self._im_original = value
+        self._frame = None
+
+    @property
+    def im_masked(self):
+        """
+        Gray all-sky image, with NaN on the pixels hidden by the station mask
+        """
+        return self._im_masked
+
+    @im_masked.setter
+    def im_masked(self, value):
+        self._im_masked = value
+        self._frame = None
+
+    @property
+    def frame(self):
+        """
+        :class:`~clouds.Frame` of the current images, created again when they are replaced
+        """
+        if self._frame is None and self.im_masked is not None:
+            self._frame = Frame(self.im_original, self.im_masked)
+        return self._frame
+
+    @property
+    def pixelmap(self):
+        """
+        Lookup tables and mask of the station, see :mod:`pixelmap`. Loaded on first use.
+        """
+        if self._pixelmap is None:
+            self._pixelmap = pixelmap.load(self.location, self.station)
+        return self._pixelmap
 
     def retrieve_image(self):
         """
-        Downloads the current all sky from the server and saves it to disk.
+        Downloads the current all sky from the server and decodes it in memory, if it changed since the last download.
         The url of the image is retrived from the corresponding configuration file.
+        
+        :return: None, 1 if the download failed or 2 if the image did not change
         """
-        if not self.debugmode:
-            try:
-                logger.info("Loading all sky from {}...".format(self.station.params['url']))
-                #urllib.request.urlretrieve(self.params['url'], "current.JPG")
-                open("current.jpg", 'wb').write(requests.get(self.station.params['url']).content)
-                self.failed_connection = False
-            except :
+        if self.debugmode and self.provider is None:
+            image = self.fimage
+        else:
+            logger.info("Loading all sky from {}...".format(self.fetcher.url))
+            status = self.fetcher.fetch()
+            if status == fetcher.FAILED:
                 self.failed_connection = True
                 logger.warning("Cannot download All Sky image. Either you or the server is offline!")
                 return 1
-
-        self.im_masked, self.im_original = loadallsky(self.fimage, station=self.station, return_complete=True)
-        self.last_im_refresh = astropy.time.Time.now()
+            self.failed_connection = False
+            if status == fetcher.UNCHANGED and self.im_original is not None:
+                logger.info("All sky image unchanged since the last download")
+                self.last_im_refresh = self.now()
+                return 2
+            image = io.BytesIO(self.fetcher.content)
+
+        self.im_masked, self.im_original = loadallsky(image, station=self.station, return_complete=True, pixelmap=self.pixelmap)
+        self.last_im_refresh = self.now()
         
     def update(self, donotdownloadtime=1.5):
         """
@@ -81,22 +164,75 @@ class Clouds():
         :return: an observability map with the same dimension as the input image. Then, use all sky get image coordinate method to retrieve observability for a given target.
         """
         logger.debug("Updating the all-sky image")
-        if not self.last_im_refresh is None and (astropy.time.Time.now() - self.last_im_refresh).to(u.s).value / 60. < donotdownloadtime:
+        if not self.last_im_refresh is None and (self.now() - self.last_im_refresh).to(u.s).value / 60. < donotdownloadtime:
             logger.info("Last image was downloaded more recently than {} minutes ago, I don't download it again".format(donotdownloadtime))
             #Seems to be okay#logger.critical("TODO: make sure that this map is correct and there's no .T missing (see get_observability_map)")
             return self.observability_map
         
-        self.retrieve_image()
+        status = self.retrieve_image()
         if self.failed_connection:
             logger.warning("Connection down and not running in debugmode so cannot analyse All Sky")
             return None
+        if status == 2 and self.observability_map is not None:
+            # same image, same stars
+            return self.observability_map
+        if SETTINGS["clouds"]["incremental"] == "True" and self.last_full_analysis is not None \
+                and (self.last_im_refresh - self.last_full_analysis).to(u.s).value / 60. < float(SETTINGS["clouds"]["incrementalmaxage"]):
+            observability = self.update_incremental(blocksize=int(SETTINGS["clouds"]["incrementalblocksize"]), diff_threshold=float(SETTINGS["clouds"]["incrementalthreshold"]), maxfraction=float(SETTINGS["clouds"]["incrementalmaxfraction"]))
+            if observability is not None:
+                self.record(observability)
+                return observability
+        
         x, y = self.detect_stars()
         if x is None or y is None:
             return None
         
-        return self.get_observability_map(x, y)
+        self.stars = (np.array(x), np.array(y))
+        self.analysed_image = np.array(self.im_original)
+        self.last_full_analysis = self.last_im_refresh
+        observability = self.get_observability_map(x, y)
+        self.record(observability)
+        return observability
+
+    @property
+    def store(self):
+        """
+        :class:`~cloudstore.CloudStore` of the `store` folder of the settings, None if it is not set
+        """
+        if self._store is None and SETTINGS["clouds"]["store"].strip() != "":
+            self._store = cloudstore.CloudStore(os.path.expanduser(SETTINGS["clouds"]["store"].strip()), naz=int(SETTINGS["clouds"]["storeazbins"]), nalt=int(SETTINGS["clouds"]["storealtbins"]))
+        return self._store
+
+    def record(self, observability):
+        """
+        Appends a new observability map to the store, if any, and to the nowcaster, with the time of the image download
+
+        :param observability: map, as returned by :meth:`get_observability_map`
+        """
+        if self.last_im_refresh is None:
+            return
+        if SETTINGS["clouds"]["nowcast"] == "True":
+            self.nowcaster.add(self.last_im_refresh, observability)
+        if self.store is None:
+            return
+        try:
+            self.store.append(self.last_im_refresh, self.store.bin_map(observability, self.pixelmap))
+        except (OSError, ValueError) as e:
+            logger.warning("Could not store the cloud map: {}".format(e))
+
+    def predict(self, obs_time):
+        """
+        Observability map predicted at a later time from the motion of the clouds, see :mod:`nowcast`
+
+        :param obs_time: Astropy Time object
+        :return: map with the orientation of the observability_map attribute, or None if there is no prediction for this time
+        """
+        predicted = self.nowcaster.predict(obs_time)
+        if predicted is None:
+            return None
+        return predicted.T
         
-    def detect_stars(self, sigma_blur=1.0, threshold=0.05, neighborhood_size=20, fwhm_threshold=5, meas_star=True, return_all=False):
+    def detect_stars(self, sigma_blur=1.0, threshold=0.05, neighborhood_size=20, fwhm_threshold=5, meas_star=True, return_all=False, maxcandidates=None, refine=None):
         """
         Analyses the images to find the stars. 
 
@@ -108,53 +244,29 @@ class Clouds():
         :param fwhm_threshold: select objects smaller than this fwhm
         :param meas_star: if not interested in computing fwhm for all objects bypass and return positions of objects
         :param return_all: if `True`, returns the positions of stars + detected objects otherwise only stars
+        :param maxcandidates: maximum number of candidates whose fwhm is measured, the ones with the highest contrast are kept. If None, use the `clouds` section of the settings.
+        :param refine: if `True`, refine the fwhm with a Gaussian fit, see :func:`~clouds.measure_fwhm`. If None, use the `clouds` section of the settings.
 
         """
         logger.debug("Detecting stars in All Sky...")
-        original = self.im_original
-        image = copy.copy(self.im_masked)#filters.gaussian_filter(self.im_masked, sigma_blur)
         
         # This condition is there only to make the code more resilient, but should not occur.
-        if image is None:
+        if self.im_masked is None:
             logger.error("im_masked is None, probably an issue with the download. Skipping analysis...")
             return None, None
         
-        image /= filters.gaussian_filter(np.nan_to_num(image), 10)
-        data_max = filters.maximum_filter(image, neighborhood_size)
-        maxima = (image == data_max)
-        
-        data_min = filters.minimum_filter(image, neighborhood_size)
-
-        # In order to avoid outputing warnings, remove all nans (not the Indian bread)
         try:
-            delta_arr = data_max - data_min
+            x, y, contrast = find_candidates(self.frame, threshold=threshold, neighborhood_size=neighborhood_size)
         except TypeError:
             logging.warning("Could only download part of the all sky image and failed to analyse it")
             return None, None
-        delta_arr[np.isnan(delta_arr)] = 0.
-
-        diff = (delta_arr > threshold)
-        maxima[diff == 0] = 0
-        labeled, _ = ndimage.label(maxima)
-        slices = ndimage.find_objects(labeled)
-
-        x, y = [], []
-        for dy, dx in slices:
-            x_center = (dx.start + dx.stop - 1)/2
-            x.append(x_center)
-            y_center = (dy.start + dy.stop - 1)/2    
-            y.append(y_center)
         
         if not meas_star: 
             return x, y
-        resx = []
-        resy = []
-        for xx, yy in zip(x, y):
-            f = fwhm(original, xx, yy, 18)
-            if f < fwhm_threshold:
-                resx.append(xx)
-                resy.append(yy)
-                #resfwhm.append(f)
+
+        stars = select_stars(self.im_original, x, y, contrast, fwhm_threshold=fwhm_threshold, maxcandidates=maxcandidates, refine=refine)
+        resx = [x[i] for i in stars]
+        resy = [y[i] for i in stars]
         logger.info("Done. {} stars found".format(len(resx)))
         
         if return_all:
@@ -175,48 +287,306 @@ class Clouds():
         :return: an observability map with the same dimension as the input image.
         """
         logger.debug("Creating an observability map...")
-        observability = copy.copy(self.im_masked) * 0.
-        
-        if len(x) > 0:
-            notnans = np.where(np.isnan(self.im_masked) == False)
-            notnans = list(zip(notnans[0], notnans[1]))
-            pts = np.array([x,y]).T
-            tree = cKDTree(pts)    
-            for nx, ny in notnans:
-                obs = len(tree.query_ball_point((ny,nx), threshold))
-                if obs > 2 : observability[nx,ny] = 1. 
-                elif obs >= 1 : observability[nx,ny] = 0.5
-            observability[filters.gaussian_filter(np.nan_to_num(self.im_masked), 10) > max_pxval] = 0
-            observability = filters.gaussian_filter(observability, filter_sigma)
+        observability = observability_map(self.frame, x, y, threshold=threshold, filter_sigma=filter_sigma, max_pxval=max_pxval)
         
         self.observability_map = observability.T
         return observability
 
+    def update_incremental(self, blocksize=32, diff_threshold=3., maxfraction=0.5):
+        """
+        Updates the stars and the observability map of the last analysis only in the blocks of the image that changed since then, see :func:`~clouds.changed_blocks`
+
+        The stars are detected again in the changed blocks, with the default parameters of :meth:`detect_stars`, and the map is recomputed where these stars can change it. The rest of the map is kept.
+
+        :param blocksize: size of the square blocks, in px
+        :param diff_threshold: mean absolute difference of the pixel values above which a block changed
+        :param maxfraction: fraction of changed blocks above which nothing is done, as a full analysis is as fast
+
+        :return: the observability map, like :meth:`get_observability_map`, or None if a full analysis is needed
+        """
+        if self.stars is None or self.analysed_image is None or np.shape(self.analysed_image) != np.shape(self.im_original):
+            return None
+
+        changed = changed_blocks(self.analysed_image, self.im_original, blocksize, diff_threshold)
+        if changed.mean() > maxfraction:
+            logger.info("{:.0f}% of the all sky changed, analysing the whole image".format(changed.mean() * 100.))
+            return None
+        if not changed.any():
+            logger.info("All sky unchanged since the last analysis")
+            return self.observability_map.T
+        logger.debug("Analysing {} changed blocks of the all sky...".format(changed.sum()))
+
+        shape = np.shape(self.im_original)
+        labels, nregions = ndimage.label(changed)
+        labels = np.repeat(np.repeat(labels, blocksize, axis=0), blocksize, axis=1)[:shape[0], :shape[1]]
+        regions = ndimage.find_objects(labels)
+        # the changed pixels become the reference of the next comparison
+        self.analysed_image[labels > 0] = self.im_original[labels > 0]
+
+        x, y = self.stars
+        unchanged = labels[y.astype(int), x.astype(int)] == 0
+        x, y = x[unchanged], y[unchanged]
+
+        # the detection in a region only depends on the pixels closer than the normalisation blur and the neighborhood of the extrema
+        margin = 4 * 10 + 10 + 1
+        newx, newy, newcontrast = [], [], []
+        for i, region in enumerate(regions):
+            window = _expand(region, margin, shape)
+            try:
+                cx, cy, contrast = find_candidates(self.frame.window(window))
+            except TypeError:
+                return None
+            cx = np.array(cx) + window[1].start
+            cy = np.array(cy) + window[0].start
+            inside = labels[cy.astype(int), cx.astype(int)] == i + 1
+            newx.append(cx[inside])
+            newy.append(cy[inside])
+            newcontrast.append(contrast[inside])
+        newx, newy, newcontrast = np.concatenate(newx), np.concatenate(newy), np.concatenate(newcontrast)
+        stars = select_stars(self.im_original, newx, newy, newcontrast)
+        x = np.concatenate([x, newx[stars]])
+        y = np.concatenate([y, newy[stars]])
+        self.stars = (x, y)
+        logger.info("Done. {} stars found, {} in the changed blocks".format(len(x), len(stars)))
+
+        # a star changes the map up to the neighbour distance and the blurs
+        margin = 40 + int(4 * 3 + 0.5)
+        observability = np.array(self.observability_map.T)
+        for region in regions:
+            patch = _expand(region, margin, shape)
+            window = _expand(region, 2 * margin, shape)
+            local = observability_map(self.frame.window(window), x - window[1].start, y - window[0].start)
+            observability[patch] = local[patch[0].start - window[0].start:patch[0].stop - window[0].start, patch[1].start - window[1].start:patch[1].stop - window[1].start]
+
+        self.observability_map = observability.T
+        return observability
+
+
+def _expand(region, margin, shape):
+    """
+    :return: the slices of a region grown by a margin, clipped to the image shape
+    """
+    return tuple(slice(max(s.start - margin, 0), min(s.stop + margin, n)) for s, n in zip(region, shape))
+
+
+class Frame():
+    """
+    Products derived from an all-sky image, each computed at most once and shared by the steps of the analysis
+
+    The images are kept in the float type they are given, float32 for the images of :func:`~clouds.loadallsky`.
+    """
+    
+    def __init__(self, original, masked, background=None, normalised=None):
+        """
+        :param original: gray image
+        :param masked: gray image, with NaN on the masked pixels
+        :param background: if already known, blurred masked image, see :attr:`background`
+        :param normalised: if already known, masked image divided by the background, see :attr:`normalised`
+        """
+        self.original = original
+        self.masked = masked
+        self._background = background
+        self._normalised = normalised
+
+    @property
+    def background(self):
+        """
+        Masked image, with 0 instead of NaN, blurred with a Gaussian kernel of 10 px
+        """
+        if self._background is None:
+            self._background = filters.gaussian_filter(np.nan_to_num(self.masked), 10)
+        return self._background
 
-def rgb2gray(arr):
+    @property
+    def normalised(self):
+        """
+        Masked image divided by its background
+        """
+        if self._normalised is None:
+            self._normalised = self.masked / self.background
+        return self._normalised
+
+    def window(self, region):
+        """
+        Part of the frame. The products computed on the whole frame are kept, the others are computed on the window only.
+
+        :param region: tuple of slices, (rows, columns)
+        :return: :class:`~clouds.Frame`
+        """
+        background = None if self._background is None else self._background[region]
+        normalised = None if self._normalised is None else self._normalised[region]
+        return Frame(self.original[region], self.masked[region], background=background, normalised=normalised)
+
+
+def find_candidates(frame, threshold=0.05, neighborhood_size=20):
+    """
+    Finds the local maxima of an image normalised by its blurred version, see :meth:`~clouds.Clouds.detect_stars`
+
+    :param frame: :class:`~clouds.Frame` of the image
+    :param threshold: threshold of detection
+    :param neighborhood_size: footprint of the maximum and minimum filters
+
+    :return: lists of the x and y positions of the candidates, and array of their contrast (difference between the maximum and minimum in their neighborhood)
+    """
+    image = frame.normalised
+    data_max = filters.maximum_filter(image, neighborhood_size)
+    maxima = (image == data_max)
+    
+    data_min = filters.minimum_filter(image, neighborhood_size)
+
+    # In order to avoid outputing warnings, remove all nans (not the Indian bread)
+    delta_arr = np.subtract(data_max, data_min, out=data_max)
+    del data_min
+    delta_arr[np.isnan(delta_arr)] = 0.
+
+    diff = (delta_arr > threshold)
+    maxima[diff == 0] = 0
+    labeled, _ = ndimage.label(maxima)
+    slices = ndimage.find_objects(labeled)
+
+    x, y = [], []
+    for dy, dx in slices:
+        x_center = (dx.start + dx.stop - 1)/2
+        x.append(x_center)
+        y_center = (dy.start + dy.stop - 1)/2    
+        y.append(y_center)
+
+    contrast = delta_arr[np.array(y, dtype=int), np.array(x, dtype=int)]
+    return x, y, contrast
+
+
+def select_stars(original, x, y, contrast, fwhm_threshold=5, maxcandidates=None, refine=None):
+    """
+    Selects the candidates that are as small as stars
+
+    :param original: unmasked image
+    :param x: x positions of the candidates
+    :param y: y positions of the candidates
+    :param contrast: array of the contrasts of the candidates, see :func:`~clouds.find_candidates`
+    :param fwhm_threshold: select objects smaller than this fwhm
+    :param maxcandidates: maximum number of candidates whose fwhm is measured, the ones with the highest contrast are kept. If None, use the `clouds` section of the settings.
+    :param refine: if `True`, refine the fwhm with a Gaussian fit, see :func:`~clouds.measure_fwhm`. If None, use the `clouds` section of the settings.
+
+    :return: array of the indices of the stars
+    """
+    if maxcandidates is None:
+        maxcandidates = int(SETTINGS["clouds"]["maxcandidates"])
+    if refine is None:
+        refine = SETTINGS["clouds"]["fwhmrefine"] == "True"
+
+    candidates = np.arange(len(x))
+    if len(x) > maxcandidates:
+        candidates = np.sort(np.argsort(-contrast, kind="stable")[:maxcandidates])
+        logger.info("{} candidates, measuring only the {} with the highest contrast".format(len(x), maxcandidates))
+
+    f = measure_fwhm(original, np.array(x)[candidates], np.array(y)[candidates], 18, refine=refine)
+    return candidates[f < fwhm_threshold]
+
+
+def observability_map(frame, x, y, threshold=40, filter_sigma=3, max_pxval=180):
+    """
+    Observability of the sky from the positions of the detected stars, see :meth:`~clouds.Clouds.get_observability_map`
+
+    :param frame: :class:`~clouds.Frame` of the image
+    :param x: x coordinates of detected stars, in the image
+    :param y: y coordinates of detected stars, in the image
+    :param threshold: distance threshold in px of stars such that we have observations
+    :param filter_sigma: sigma of the Gaussian kernel
+    :param max_pxval: px value above which the visibility is considered to be 0
+
+    :return: map with the same dimension as the image
+    """
+    # NaN on the masked pixels, 0 elsewhere
+    observability = frame.masked * 0.
+    
+    if len(x) > 0:
+        counts = count_neighbours(np.shape(observability), x, y, threshold)
+        notnans = ~np.isnan(frame.masked)
+        observability[notnans & (counts > 2)] = 1.
+        observability[notnans & (counts >= 1) & (counts <= 2)] = 0.5
+        observability[frame.background > max_pxval] = 0
+        observability = filters.gaussian_filter(observability, filter_sigma)
+    
+    return observability
+
+
+def count_neighbours(shape, x, y, radius):
+    """
+    Counts, for every pixel of an image, the number of points closer than a given radius
+
+    Each point adds one to the pixels of a disk around it, so the cost scales with the number of points and not with the number of pixels.
+
+    :param shape: shape of the image, (rows, columns)
+    :param x: list or array of the x (column) coordinates of the points
+    :param y: list or array of the y (row) coordinates of the points
+    :param radius: distance in px, a pixel at exactly this distance is counted
+
+    :return: integer array of the given shape
+    """
+    counts = np.zeros(shape, dtype=np.int32)
+    nrows, ncols = shape
+    for xx, yy in zip(x, y):
+        r0, r1 = max(int(np.ceil(yy - radius)), 0), min(int(np.floor(yy + radius)), nrows - 1)
+        c0, c1 = max(int(np.ceil(xx - radius)), 0), min(int(np.floor(xx + radius)), ncols - 1)
+        if r0 > r1 or c0 > c1:
+            continue
+        dr = np.arange(r0, r1 + 1)[:, np.newaxis] - yy
+        dc = np.arange(c0, c1 + 1)[np.newaxis, :] - xx
+        counts[r0:r1 + 1, c0:c1 + 1] += (dr * dr + dc * dc) <= radius * radius
+    return counts
+
+
+def changed_blocks(previous, current, blocksize, threshold):
+    """
+    Compares two images block by block
+
+    :param previous: image
+    :param current: image of the same shape
+    :param blocksize: size of the square blocks, in px. The blocks on the right and bottom edges can be smaller.
+    :param threshold: mean absolute difference of the pixel values above which a block changed
+
+    :return: boolean array, one element per block
+    """
+    diff = np.abs(np.asarray(current, dtype=np.float64) - previous)
+    ny, nx = diff.shape
+    rows = np.arange(0, ny, blocksize)
+    cols = np.arange(0, nx, blocksize)
+    sums = np.add.reduceat(np.add.reduceat(diff, rows, axis=0), cols, axis=1)
+    sizes = np.outer(np.diff(np.append(rows, ny)), np.diff(np.append(cols, nx)))
+    return sums / sizes > threshold
+
+
+def rgb2gray(arr, dtype=np.float64):
     """
     Converts from RGB to gray.
     
     .. note:: The all sky in LaSilla is not RGB, but JPG is is 3D...
+    
+    :param dtype: float type of the gray image
     """
-    red = arr[:,:,0]
-    green = arr[:,:,1]
-    blue = arr[:,:,2]
+    gray = np.multiply(arr[:,:,0], 0.299, dtype=dtype)
+    gray += np.multiply(arr[:,:,1], 0.587, dtype=dtype)
+    gray += np.multiply(arr[:,:,2], 0.144, dtype=dtype)
     
-    return 0.299 * red + 0.587 * green + 0.144 * blue
+    return gray
 
 
-def loadallsky(fnimg, station, return_complete=False):
+def loadallsky(fnimg, station, return_complete=False, pixelmap=None):
     """
     Loads the all sky image
     
+    :param fnimg: filename or file-like object of the image, e.g. a :class:`io.BytesIO` of the downloaded bytes
     :param return_complete: returns the masked image and the unmasked image
+    :param pixelmap: :class:`~pixelmap.PixelMap` of the station, to reuse its mask. If None, the mask is computed by the station.
     
     :return: Masked image or masked image and original image. Note that if cannot download, returns `None` or `None, None`. 
     """
     logger.debug("Loading image {}...".format(fnimg))
-    im = scipy.ndimage.imread(fnimg)
-    ar = np.array(im)
+    try:
+        with Image.open(fnimg) as im:
+            ar = np.array(im)
+    except (OSError, ValueError):
+        ar = np.array(None)
     if len(np.shape(ar)) != 3:
         logging.warning("Something went wrong during the AllSky download, skipping this")
         if return_complete:
@@ -224,10 +594,14 @@ def loadallsky(fnimg, station, return_complete=False):
         else:
             return None
     
-    ar = rgb2gray(ar)
-    rest = copy.copy(ar)
+    # the 8-bit pixel values do not need more than single precision
+    ar = rgb2gray(ar, dtype=np.float32)
+    rest = ar.copy()
     
-    mask = station.get_mask(ar)
+    if pixelmap is None:
+        mask = station.get_mask(ar)
+    else:
+        mask = pixelmap.get_mask(ar)
     ar[mask] = np.nan
     
     if return_complete:
@@ -235,6 +609,21 @@ def loadallsky(fnimg, station, return_complete=False):
     else:
         return ar
 
+_grids = {}
+
+def stamp_grid(stampsize):
+    """
+    Pixel coordinates of a square stamp, computed once per stamp size and shared between all the measurements
+
+    :param stampsize: size of the stamp in px
+
+    :return: x and y coordinates, float arrays of shape (stampsize, stampsize). They must not be modified.
+    """
+    if stampsize not in _grids:
+        x = np.arange(stampsize, dtype=np.float64)
+        _grids[stampsize] = np.meshgrid(x, x)
+    return _grids[stampsize]
+
 def gaussian(params, stamp, stampsize):
     """
     Returns a 2D gaussian profile
@@ -248,14 +637,10 @@ def gaussian(params, stamp, stampsize):
     
     xc, yc, std, i0, sky = params
 
-    x = np.arange(stampsize)
-    x = x.astype(np.float64)
+    x, y = stamp_grid(stampsize)
     std = std.astype(np.float64)
     i0 = i0.astype(np.float64)
-    x, y = np.meshgrid(x,x)
-    x -= xc
-    y -= yc
-    r = np.hypot(x,y)
+    r = np.hypot(x - xc, y - yc)
 
     g = i0 * np.exp (-0.5 * (r / std)**2.) / std / np.sqrt(2.*np.pi) + sky
     g -= stamp
@@ -337,6 +722,69 @@ def fwhm(data,xc,yc,stampsize,show=False):
 
     return p[2] * 2. * np.sqrt(2.*np.log(2.))
 
+def measure_fwhm(data, xc, yc, stampsize, refine=False, niter=10):
+    """
+    Measures the FWHM of many stars at once, with Gaussian-weighted (adaptive) second moments computed on all the stamps together
+
+    The weight is iterated towards the size and centroid of each star, so that the noise of the background does not dominate the moments. With `refine`, each measurement is used as the starting point of a Gaussian fit like in :func:`~clouds.fwhm`.
+
+    :param data: the image
+    :param xc: array of the centroid x positions
+    :param yc: array of the centroid y positions
+    :param stampsize: size of nominal square stamp, must be even
+    :param refine: if `True`, refine each FWHM with a least-squares Gaussian fit
+    :param niter: number of iterations of the adaptive moments
+
+    :return: array of the fwhm in px, NaN for the stars too close to the edge, with NaN in their stamp or without any flux
+    """
+    assert stampsize % 2 == 0
+    xc = np.asarray(xc, dtype=np.float64)
+    yc = np.asarray(yc, dtype=np.float64)
+    res = np.ones(len(xc)) * np.nan
+
+    inside = ~((xc < stampsize) | (yc < stampsize) | (data.shape[1] - xc < stampsize) | (data.shape[0] - yc < stampsize))
+    if not np.any(inside):
+        return res
+    xi = (xc[inside] - stampsize / 2.).astype(int)
+    yi = (yc[inside] - stampsize / 2.).astype(int)
+    g = np.arange(stampsize)
+    stamps = data[(yi[:, np.newaxis] + g)[:, :, np.newaxis], (xi[:, np.newaxis] + g)[:, np.newaxis, :]]
+    valid = ~np.isnan(stamps).any(axis=(1, 2))
+
+    x, y = stamp_grid(stampsize)
+    sky = np.median(stamps.reshape(len(stamps), -1), axis=1)
+    flux = np.clip(stamps - sky[:, np.newaxis, np.newaxis], 0., None)
+    flux[~valid] = 0.
+
+    # start from a 2 px wide star at the center of the stamp, like the guess of fwhm
+    mx = np.ones(len(stamps)) * stampsize / 2.
+    my = np.ones(len(stamps)) * stampsize / 2.
+    std = np.ones(len(stamps)) * 2.
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for _ in range(niter):
+            dx = x - mx[:, np.newaxis, np.newaxis]
+            dy = y - my[:, np.newaxis, np.newaxis]
+            w = flux * np.exp(-0.5 * (dx ** 2 + dy ** 2) / std[:, np.newaxis, np.newaxis] ** 2)
+            total = w.sum(axis=(1, 2))
+            mx = (w * x).sum(axis=(1, 2)) / total
+            my = (w * y).sum(axis=(1, 2)) / total
+            # with a Gaussian weight as wide as the star, the measured variance is half of the true one
+            var = (w * (dx ** 2 + dy ** 2)).sum(axis=(1, 2)) / total
+            std = np.sqrt(np.clip(var, 0.04, 1e4))
+    valid &= total > 0
+
+    fwhms = std * 2. * np.sqrt(2. * np.log(2.))
+
+    if refine:
+        for i in np.where(valid)[0]:
+            guess = [mx[i], my[i], std[i], flux[i].sum() * 2. * np.pi * std[i], sky[i]]
+            fit = least_squares(gaussian, guess, args=(stamps[i], stampsize), method='lm', max_nfev=50)
+            fwhms[i] = np.abs(fit.x[2]) * 2. * np.sqrt(2. * np.log(2.))
+
+    fwhms[~valid] = np.nan
+    res[inside] = fwhms
+    return res
+
 
 """
 ###################################################################################################
@@ -0,0 +1,219 @@
+"""
+Append-only time series of the cloud maps, binned in azimuth and elevation and memory-mapped on disk
+
+Each observability map of :mod:`clouds` is reduced to the mean observability of the pixels of each (elevation, azimuth) bin, using the per-pixel coordinates of :class:`~pixelmap.PixelMap`. The store is a folder with three files:
+
+* `meta.json`: the grid of the bins,
+* `times.f8`: the MJD of the maps, in increasing order, as float64,
+* `maps.f4`: the binned maps, as float32 arrays of shape (nalt, naz). NaN for the bins without sky pixels.
+
+Both data files are only appended to, and read through :class:`numpy.memmap`, so that queries over a time range only read the maps of that range. A map is only part of the store once its time is written: the bytes left after the last complete record by an interrupted append are ignored when reading, and cut before the next append.
+
+.. note:: like in :mod:`batch`, the angles are in radians.
+"""
+
+import os
+import json
+import numpy as np
+from astropy.time import Time
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class CloudStore:
+	"""
+	Time series of binned cloud maps, see the module documentation
+	"""
+	def __init__(self, path, naz=36, nalt=9):
+		"""
+		:param path: folder of the store, created if needed
+		:param naz: number of azimuth bins over 360 deg, for a new store
+		:param nalt: number of elevation bins over 90 deg, for a new store. An existing store keeps its own grid.
+		"""
+		self.path = path
+		metapath = os.path.join(path, "meta.json")
+		if os.path.exists(metapath):
+			with open(metapath) as f:
+				meta = json.load(f)
+			naz, nalt = meta["naz"], meta["nalt"]
+		else:
+			if not os.path.isdir(path):
+				os.makedirs(path)
+			with open(metapath, "w") as f:
+				json.dump({"naz": naz, "nalt": nalt}, f)
+		self.naz = naz
+		self.nalt = nalt
+		self._bins = {}
+		self._times = None
+		self._maps = None
+
+	def __len__(self):
+		return len(self.times)
+
+	def _file(self, name):
+		return os.path.join(self.path, name)
+
+	@property
+	def times(self):
+		"""
+		MJD of the stored maps, memory-mapped
+		"""
+		if self._times is None:
+			self._load()
+		return self._times
+
+	@property
+	def maps(self):
+		"""
+		Binned maps, memory-mapped array of shape (len(self), nalt, naz)
+		"""
+		if self._maps is None:
+			self._load()
+		return self._maps
+
+	def _size(self, name):
+		return os.path.getsize(self._file(name)) if os.path.exists(self._file(name)) else 0
+
+	def _count(self):
+		"""
+		:return: number of complete records, with both their time and their map
+		"""
+		return min(self._size("times.f8") // 8, self._size("maps.f4") // (4 * self.nalt * self.naz))
+
+	def _load(self):
+		n = self._count()
+		if n == 0:
+			self._times = np.zeros(0)
+			self._maps = np.zeros((0, self.nalt, self.naz), dtype=np.float32)
+			return
+		self._times = np.memmap(self._file("times.f8"), dtype=np.float64, mode="r", shape=(n,))
+		self._maps = np.memmap(self._file("maps.f4"), dtype=np.float32, mode="r", shape=(n, self.nalt, self.naz))
+
+	def edges(self):
+		"""
+		:return: arrays of the azimuth and elevation edges of the bins, in radians
+		"""
+		return np.linspace(0., 2. * np.pi, self.naz + 1), np.linspace(0., np.pi / 2., self.nalt + 1)
+
+	def pixel_bins(self, pixelmap):
+		"""
+		:param pixelmap: :class:`~pixelmap.PixelMap` of the station
+		:return: flat array of the bin of each pixel, -1 for the masked pixels and the pixels below the horizon
+		"""
+		if pixelmap.checksum not in self._bins:
+			ialt = np.floor(pixelmap.alt / (np.pi / 2.) * self.nalt).astype(int)
+			iaz = np.floor(pixelmap.az / (2. * np.pi) * self.naz).astype(int) % self.naz
+			bins = np.minimum(ialt, self.nalt - 1) * self.naz + iaz
+			bins[(ialt < 0) | pixelmap.mask] = -1
+			self._bins[pixelmap.checksum] = bins.ravel()
+		return self._bins[pixelmap.checksum]
+
+	def bin_map(self, observability, pixelmap):
+		"""
+		Mean observability in each bin
+
+		:param observability: map of shape (rows, columns), as returned by :meth:`~clouds.Clouds.get_observability_map`
+		:param pixelmap: :class:`~pixelmap.PixelMap` of the station
+
+		:return: float32 array of shape (nalt, naz), NaN for the bins without valid pixels
+		"""
+		bins = self.pixel_bins(pixelmap)
+		values = np.ravel(observability)
+		valid = (bins >= 0) & ~np.isnan(values)
+		nbins = self.nalt * self.naz
+		sums = np.bincount(bins[valid], weights=values[valid], minlength=nbins)
+		counts = np.bincount(bins[valid], minlength=nbins)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			binned = sums / counts
+		return binned.reshape(self.nalt, self.naz).astype(np.float32)
+
+	def append(self, time, binned):
+		"""
+		Adds a binned map at the end of the store
+
+		:param time: Astropy Time object, more recent than the last stored map
+		:param binned: array of shape (nalt, naz), see :meth:`bin_map`
+
+		:return: True if the map was stored, False if it is not more recent than the last one
+		"""
+		mjd = time.mjd if isinstance(time, Time) else float(time)
+		binned = np.asarray(binned, dtype=np.float32)
+		if binned.shape != (self.nalt, self.naz):
+			raise ValueError("Binned map of shape {} instead of {}".format(binned.shape, (self.nalt, self.naz)))
+		if len(self) > 0 and mjd <= self.times[-1]:
+			logger.warning("Cloud map of MJD {} not stored, the last one is more recent".format(mjd))
+			return False
+
+		# drop the memory maps before resizing the files
+		self._times = None
+		self._maps = None
+
+		# the maps first: a map without time is ignored when reading, and cut here so that the new map is stored at the index of its time
+		n = self._count()
+		for name, record in [("maps.f4", binned), ("times.f8", np.float64(mjd))]:
+			with open(self._file(name), "ab") as f:
+				f.truncate(n * record.nbytes)
+				f.write(record.tobytes())
+		return True
+
+	def select(self, start=None, end=None):
+		"""
+		:param start: Astropy Time object, or None for the first map
+		:param end: Astropy Time object, included, or None for the last map
+		:return: slice of the maps in the time range
+		"""
+		times = self.times
+		i0 = 0 if start is None else np.searchsorted(times, start.mjd, side="left")
+		i1 = len(times) if end is None else np.searchsorted(times, end.mjd, side="right")
+		return slice(i0, i1)
+
+	def region(self, az=None, alt=None):
+		"""
+		:param az: tuple (min, max) of azimuths, wrapping through the North if min > max. None for all.
+		:param alt: tuple (min, max) of elevations. None for all.
+		:return: boolean array of shape (nalt, naz), True for the bins whose center is in the region
+		"""
+		azedges, altedges = self.edges()
+		azc = (azedges[1:] + azedges[:-1]) / 2.
+		altc = (altedges[1:] + altedges[:-1]) / 2.
+		inaz = np.ones(self.naz, dtype=bool)
+		if az is not None:
+			azmin, azmax = np.mod(az[0], 2. * np.pi), np.mod(az[1], 2. * np.pi)
+			inaz = (azc >= azmin) & (azc <= azmax) if azmin <= azmax else (azc >= azmin) | (azc <= azmax)
+		inalt = np.ones(self.nalt, dtype=bool)
+		if alt is not None:
+			inalt = (altc >= alt[0]) & (altc <= alt[1])
+		return inalt[:, np.newaxis] & inaz[np.newaxis, :]
+
+	def series(self, start=None, end=None, az=None, alt=None, threshold=0.5):
+		"""
+		Fraction of the clear bins of a sky region, for each map of a time range
+
+		:param start: see :meth:`select`
+		:param end: see :meth:`select`
+		:param az: see :meth:`region`
+		:param alt: see :meth:`region`
+		:param threshold: observability above which a bin is clear
+
+		:return: arrays of the MJDs and the clear fractions, NaN if no bin of the region has data
+		"""
+		selection = self.select(start, end)
+		maps = np.asarray(self.maps[selection])[:, self.region(az, alt)]
+		valid = ~np.isnan(maps)
+		with np.errstate(invalid='ignore', divide='ignore'):
+			fractions = np.sum(valid & (np.nan_to_num(maps) > threshold), axis=1) / np.sum(valid, axis=1)
+		return np.array(self.times[selection]), fractions
+
+	def clear_fraction(self, start=None, end=None, az=None, alt=None, threshold=0.5):
+		"""
+		Fraction of the clear bins of a sky region over a time range, see :meth:`series`
+
+		:return: float, NaN if there is no data
+		"""
+		selection = self.select(start, end)
+		maps = np.asarray(self.maps[selection])[:, self.region(az, alt)]
+		valid = ~np.isnan(maps)
+		if not np.any(valid):
+			return np.nan
+		return float(np.sum(maps[valid] > threshold)) / np.sum(valid)
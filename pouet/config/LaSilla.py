@@ -1,11 +1,10 @@
-import requests
 import numpy as np
-import re
 import os
-import sys, inspect
+import sys
+from astropy.time import Time
 
 sys.path.insert(0, '../pouet')
-import util
+import util, resources, weatherparser
 
 import logging
 logger = logging.getLogger(__name__)
@@ -24,7 +23,10 @@ class WeatherReport():
         :param name: name of the cfg file, only included for completeness.
         """
 
-        self.config = util.readconfig(os.path.join(os.path.dirname(os.path.abspath(inspect.stack()[0][1])), "{}.cfg".format(name)))
+        self.config = resources.station_config(name)
+        self.url = self.config.get("weather", "url")
+        # connect and read timeouts of the download, in seconds
+        self.timeout = (5., 10.)
         
     def get(self, debugmode, FLAG = -9999):
         """
@@ -38,82 +40,94 @@ class WeatherReport():
         .. warning:: Such a method *must* return the following variables in that precise order: wind direction, wind speed, temperature and humidity
         
         """
-        #todo: add a "no connection" message if page is not reachable instead of an error
-        WS=[]
-        WD=[]
-        RH = None
-        Temps = []
+        return self.get_reading(debugmode, FLAG=FLAG)[0]
+    
+    def get_reading(self, debugmode, FLAG = -9999):
+        """
+        Like :meth:`get`, with the time of the report, see :meth:`read`
         
+        :return: tuple of the wind direction, speed, temperature and humidity, and Astropy Time object of the report, None if it cannot be read
+        """
         error_msg = "Cannot download weather data. Either you or the weather server is offline!"
         
         if debugmode:
-            fname = os.path.join(os.path.dirname(os.path.abspath(inspect.stack()[0][1])), "meteoDebugMode.last")
-            fi = open(fname, mode='r')
-            data = ""
-            with fi:
-                line = fi.read()
-                data += line
+            data = resources.read_text("config", "meteoDebugMode.last")
         else:
+            import requests
             try:
-                #data=urllib.request.urlopen(self.location.get("weather", "url")).read()
-                data = requests.get(self.config.get("weather", "url")).content
-            except requests.ConnectionError:
+                data = requests.get(self.url, timeout=self.timeout).content
+            except requests.RequestException:
                 logger.warning(error_msg)
-                return FLAG, FLAG, FLAG, FLAG
+                return (FLAG, FLAG, FLAG, FLAG), None
             
             data = data.decode("utf-8")
             if "404 Not Found" in data:
                 logger.warning(error_msg)
-                return FLAG, FLAG, FLAG, FLAG
+                return (FLAG, FLAG, FLAG, FLAG), None
             
-        data=data.split("\n") # then split it into lines
-        for line in data:
-            if re.match( r'WD', line, re.M|re.I):
-                WD.append(int(line[20:25])) # AVG
-            if re.match( r'WS', line, re.M|re.I):
-                WS.append(float(line[20:25])) # AVG
-            if re.match( r'RH', line, re.M|re.I):
-                RH = float(line[20:25]) # AVG
-            if re.match( r'T ', line, re.M|re.I):
-                Temps.append(float(line[20:25])) # AVG
+        return self.read(data, FLAG=FLAG)
+    
+    def parse(self, data, FLAG = -9999):
+        """
+        Interprets the content of a `meteo.last` report, see :meth:`get`. Used by :class:`~weatherservice.WeatherService` on the reports it downloads.
+        
+        :param data: string, content of the report
+        :param FLAG: what to return for the variables that cannot be read from the report.
+        
+        :return: Wind direction, speed, temperature and humidity
+        """
+        return self.read(data, FLAG=FLAG)[0]
+    
+    def read(self, data, FLAG = -9999):
+        """
+        Like :meth:`parse`, with the time in the header of the report. The same report downloaded several times has the same time, see :class:`~weatherhistory.WeatherHistory`.
+        
+        :param data: string, content of the report
+        :param FLAG: what to return for the variables that cannot be read from the report.
+        
+        :return: tuple of the wind direction, speed, temperature and humidity, and Astropy Time object of the last header of the report, None if there is none
+        """
+        reports, readings = weatherparser.parse(data)
+        
+        times = reports["time"][~np.isnat(reports["time"])]
+        if len(times):
+            reporttime = Time((times[-1] - np.datetime64("1970-01-01T00:00")) / np.timedelta64(1, "s"), format="unix", scale="utc")
+        else:
+            reporttime = None
     
         # Remove out-of-band readings
-        # WD is chosen between station 1 or 2 in EDP pour la Silla.
         # We take average
-        Temps = np.asarray(Temps, dtype=np.float)
+        Temps = weatherparser.select(readings, "T")["ave"]
         Temps = Temps[Temps < 100]
-        Temps = np.mean(Temps)
+        Temps = np.mean(Temps) if len(Temps) else np.nan
     
         # Remove out-of-band readings
         # WD is chosen between station 1 or 2 in EDP pour la Silla.
         # We take average
-        WD = np.asarray(WD, dtype=np.float)
-        WD = WD[WD < 360]
-        WD = WD[WD > 0]
-        WD = np.mean(WD)
+        WD = weatherparser.select(readings, "WD")["ave"]
+        WD = WD[(WD > 0) & (WD < 360)]
+        WD = np.mean(WD) if len(WD) else np.nan
         
-        # WS should be either WS next to 3.6m or max
+        # WS should be either WS next to 3.6m (station 3) or max
         # Remove WS > 99 m/s
-        WS = np.asarray(WS, dtype=np.float)
-        if WS[2] < 99:
-            WS = WS[2]
+        WS = weatherparser.select(readings, "WS", valid=False)
+        WS36 = WS["ave"][WS["station"] == 3]
+        if len(WS36) and WS36[0] < 99:
+            WS = WS36[0]
         else:
             logger.warning("Wind speed from 3.6m unavailable, using other readings in LaSilla")
-            WS = np.asarray(WS, dtype=np.float)
-            WS = WS[WS > 0]
-            WS = WS[WS < 99]
-            WS = np.mean(WS)
-    
-        for var in [WD, WS, Temps, RH]:
-            if not np.isnan(var):
-                var = -9999
+            WS = WS["ave"][(WS["ave"] > 0) & (WS["ave"] < 99)]
+            WS = np.mean(WS) if len(WS) else np.nan
+        
+        RH = weatherparser.select(readings, "RH", valid=False)["ave"]
+        RH = RH[-1] if len(RH) else np.nan
         
         WD = util.check_value(WD, FLAG)
         WS = util.check_value(WS, FLAG)
         Temps = util.check_value(Temps, FLAG)
         RH = util.check_value(RH, FLAG)
         
-        return WD, WS, Temps, RH
+        return (WD, WS, Temps, RH), reporttime
     
 class AllSky():
     """
@@ -156,32 +170,54 @@ class AllSky():
     
     def get_image_coordinates(self, az, elev):
         """
-        Converts the azimuth and elevation of a target in pixel coordinates
+        Converts the azimuth and elevation of targets in pixel coordinates
         
-        :param az: azimuth (in rad)
-        :param elev: elevation (in rad)
+        :param az: azimuth (in rad), float or array
+        :param elev: elevation (in rad), float or array
         
-        :return: x and y position 
+        :return: x and y position, floats or arrays. NaN if the position is outside of the image.
         """
         
         north = self.params['north']
         cx = self.params['cx']
         cy = self.params['cy']
     
-        az *= -1.
-        elev = np.pi/2. - elev
+        az = -np.asarray(az, dtype=np.float64)
+        elev = np.pi/2. - np.asarray(elev, dtype=np.float64)
         
         rr = self.get_radius(elev)
         
         x = np.cos(north + az) * (rr - 2) + cx 
         y = np.sin(north + az) * (rr - 2) + cy
         
-        if x < 0 or y < 0: 
-            x = np.nan
-            y = np.nan 
-    
+        outside = (x < 0) | (y < 0)
+        x = np.where(outside, np.nan, x)
+        y = np.where(outside, np.nan, y)
+        
+        if np.ndim(x) == 0:
+            return float(x), float(y)
         return x, y
     
+    def get_sky_coordinates(self, x, y):
+        """
+        Converts pixel coordinates in azimuth and elevation, inverse of :meth:`get_image_coordinates`
+        
+        :param x: x position (in px), float or array
+        :param y: y position (in px), float or array
+        
+        :return: azimuth in [0, 2 pi[ and elevation (in rad). The elevation is negative outside of the horizon circle.
+        
+        .. note:: :meth:`get_image_coordinates` folds back the last 2 px around the zenith, the inverse is only exact below an elevation of ~89.5 deg.
+        """
+        dx = np.asarray(x, dtype=np.float64) - self.params['cx']
+        dy = np.asarray(y, dtype=np.float64) - self.params['cy']
+        
+        rr = np.hypot(dx, dy) + 2
+        zenith = 2. / self.params["k2"] * np.arctan(rr / (self.params["ff"] * self.params["k1"] * self.params["r0"]))
+        
+        az = np.mod(self.params['north'] - np.arctan2(dy, dx), 2. * np.pi)
+        return az, np.pi/2. - zenith
+    
     def get_mask(self, ar):
         """
         Returns the mask to apply on the AllSky hide unwanted features in the image.
@@ -999,6 +999,10 @@ class Ui_POUET(object):
         self.visibilityMoonAngleValue.setProperty("value", 40)
         self.visibilityMoonAngleValue.setObjectName("visibilityMoonAngleValue")
         self.visibilityLabelsLayout.addWidget(self.visibilityMoonAngleValue)
+        self.visibilityVectorized = QtWidgets.QCheckBox(self.centralwidget)
+        self.visibilityVectorized.setChecked(True)
+        self.visibilityVectorized.setObjectName("visibilityVectorized")
+        self.visibilityLabelsLayout.addWidget(self.visibilityVectorized)
         self.visibilityDraw = QtWidgets.QPushButton(self.centralwidget)
         sizePolicy = QtWidgets.QSizePolicy(QtWidgets.QSizePolicy.Minimum, QtWidgets.QSizePolicy.Fixed)
         sizePolicy.setHorizontalStretch(0)
@@ -1172,6 +1176,8 @@ class Ui_POUET(object):
         self.visibilityLabel.setText(_translate("POUET", "Visibility"))
         self.visibilityAirmassLabel.setText(_translate("POUET", "Airmass:"))
         self.visibilityMoonAngleLabel.setText(_translate("POUET", "Angle to Moon [°]:"))
+        self.visibilityVectorized.setToolTip(_translate("POUET", "Compute the visibility on the whole sky grid at once with numpy instead of one pyephem body per grid point"))
+        self.visibilityVectorized.setText(_translate("POUET", "Fast"))
         self.visibilityDraw.setText(_translate("POUET", "Draw"))
         self.label.setText(_translate("POUET", "Date & Time (UTC)"))
         self.configTime.setDisplayFormat(_translate("POUET", "dd.MM.yyyy HH:mm"))
@@ -0,0 +1,96 @@
+"""
+Conditional downloads of the files that the stations publish at a fixed url, such as the all-sky images
+
+A :class:`~fetcher.Fetcher` keeps one pooled HTTP session and the validators (ETag and Last-Modified headers) of the last download. The next requests send them back as If-None-Match and If-Modified-Since, so the server only sends the file again if it changed. The body is streamed into memory, never written to disk.
+
+:mod:`requests` is only imported on the first download.
+"""
+
+import io
+import hashlib
+
+import logging
+logger = logging.getLogger(__name__)
+
+NEW = "new"
+UNCHANGED = "unchanged"
+FAILED = "failed"
+
+
+class Fetcher:
+	"""
+	Downloads a url, only when its content changed
+	"""
+	def __init__(self, url, timeout=(5., 30.), chunksize=65536):
+		"""
+		:param url: string
+		:param timeout: tuple of floats, connect and read timeouts in seconds
+		:param chunksize: integer, size in bytes of the chunks of the streamed body
+		"""
+		self.url = url
+		self.timeout = timeout
+		self.chunksize = chunksize
+		self.session = None
+		self.etag = None
+		self.last_modified = None
+		self.checksum = None
+		self.content = None
+
+	def headers(self):
+		"""
+		:return: dictionary of the conditional request headers, from the last download
+		"""
+		headers = {}
+		if self.etag is not None:
+			headers["If-None-Match"] = self.etag
+		if self.last_modified is not None:
+			headers["If-Modified-Since"] = self.last_modified
+		return headers
+
+	def fetch(self):
+		"""
+		Downloads the url if it changed since the last call
+
+		:return: NEW, with the body in the content attribute, UNCHANGED if the server answered 304 or sent the same body again, or FAILED. The content of the last successful download is kept in the last two cases.
+		"""
+		import requests
+		if self.session is None:
+			self.session = requests.Session()
+
+		try:
+			with self.session.get(self.url, headers=self.headers(), timeout=self.timeout, stream=True) as response:
+				if response.status_code == 304:
+					logger.debug("{} not modified".format(self.url))
+					return UNCHANGED
+				response.raise_for_status()
+
+				body = io.BytesIO()
+				for chunk in response.iter_content(chunk_size=self.chunksize):
+					body.write(chunk)
+				headers = response.headers
+		except requests.RequestException as e:
+			logger.warning("Cannot download {}: {}".format(self.url, e))
+			return FAILED
+
+		self.etag = headers.get("ETag")
+		self.last_modified = headers.get("Last-Modified")
+
+		# servers that ignore the conditional headers send the same file again
+		content = body.getvalue()
+		checksum = hashlib.sha1(content).hexdigest()
+		if checksum == self.checksum:
+			logger.debug("{} downloaded again, but unchanged".format(self.url))
+			return UNCHANGED
+
+		self.checksum = checksum
+		self.content = content
+		logger.debug("Downloaded {} ({} bytes)".format(self.url, len(content)))
+		return NEW
+
+	def close(self):
+		"""
+		Closes the connections of the session
+		"""
+		if self.session is not None:
+			self.session.close()
+			self.session = None
@@ -9,13 +9,14 @@ Launch the application, link POUET functions to the design
 from PyQt5 import QtCore, QtGui, QtWidgets, uic
 import os, sys
 
-import obs, run, util, plots
+import obs, run, util, plots, skygrid, resources
 
 from astropy import units as u
 from astropy.time import Time, TimeDelta
 from astropy.table import Table
 import astropy.coordinates.angles as angles
 import copy
+import collections
 import ephem
 
 from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
@@ -30,14 +31,13 @@ import numpy as np
 import logging
 mutex = QtCore.QMutex()
 
-import inspect
 import design_scalable as design
 
 # define a bunch of hardcoded global variables (bad!) depending on user config
 
 global SETTINGS  # TKU: I know I did it like this, how to do it better (and stay SIMPLE)
-herepath = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
-SETTINGS = util.readconfig(os.path.join(herepath, "config/settings.cfg"))
+herepath = str(resources.files())
+SETTINGS = resources.settings()
 
 class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 	def __init__(self, parent=None):
@@ -70,6 +70,8 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		self.name_location = 'LaSilla'
 		self.cloudscheck = True
 		self.currentmeteo = run.startup(name=self.name_location, cloudscheck=self.cloudscheck, debugmode=self.allsky_debugmode)
+		if SETTINGS["weather"]["service"] == "True":
+			self.currentmeteo.start_weatherservice()
 		self.set_configTimeNow()
 		self.save_Time2obstime()
 
@@ -146,8 +148,6 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		self.deltaMaxObs.isValid = True
 
 		# testing stuff at startup...
-		herepath = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
-
 		self.load_obs(filepath=os.path.join(herepath, '../cats/example.pouet'))
 		#obs_model = self.listObs.model()
 
@@ -371,10 +371,8 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 			#logging.debug("Not showing coordinates on All Sky, delta time too large")
 			return
 
-		ra = angles.Angle(event.xdata, unit="hour")
-		dec = angles.Angle(event.ydata, unit="deg")
-		azimuth, altitude = self.currentmeteo.get_AzAlt(ra, dec, obs_time=self.currentmeteo.time)
-		xpix, ypix = self.currentmeteo.allsky.station.get_image_coordinates(azimuth.value, altitude.value)
+		azimuth, altitude = self.currentmeteo.get_AzAlt_array(np.deg2rad(event.xdata * 15.), np.deg2rad(event.ydata), obs_times=self.currentmeteo.time)
+		xpix, ypix = self.currentmeteo.allsky.station.get_image_coordinates(float(azimuth), float(altitude))
 		self.allskylayer.show_coordinates(xpix, ypix)
 
 	def print_status(self, msg, color=None):
@@ -437,7 +435,10 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 			self.print_status("Changing to {} mode...".format(mode), color=SETTINGS['color']['warn'])
 
 			self.allsky_debugmode = goto_mode
+			self.currentmeteo.stop_weatherservice()
 			self.currentmeteo = run.startup(name=self.name_location, cloudscheck=self.cloudscheck, debugmode=self.allsky_debugmode)
+			if SETTINGS["weather"]["service"] == "True":
+				self.currentmeteo.start_weatherservice()
 			self.auto_refresh()
 			self.do_update()
 
@@ -672,7 +673,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		model_names = [obs_model.item(i).data(0) for i in range(obs_model.rowCount())]
 
 		# these are the obs we want to display
-		obs_names = [o.name for o in self.observables if o.hidden == False]
+		obs_names = [self.observables.names[i] for i in self.observables.visible()]
 
 		"""
 		3 cases:
@@ -683,11 +684,13 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 
 		"""
 
-		toadd = [n for n in obs_names if not n in model_names]
-		toremove = [n for n in model_names if not n in obs_names]
+		model_names_set = set(model_names)
+		obs_names_set = set(obs_names)
+		toadd = [n for n in obs_names if not n in model_names_set]
+		toremove = [n for n in model_names if not n in obs_names_set]
 
 		# Adding missing obs:
-		for o in [o for o in self.observables if o.name in toadd]:
+		for o in [self.observables[n] for n in toadd]:
 			assert o.hidden is False
 
 			# create the QStandardItem objects
@@ -700,7 +703,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 				logging.debug("Added %s to the model" % o.name)
 
 		# Removing superfluous obs:
-		for o in [o for o in self.observables if o.name in toremove]:
+		for o in [self.observables[n] for n in toremove]:
 			assert o.hidden is True
 
 			# todo: stupid loop, optimize that
@@ -779,15 +782,6 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 				self.print_status("Loading catalog\n{}".format(filepath), color=SETTINGS["color"]["warn"])
 				new_observables = obs.rdbimport(filepath, obsprogram=obsprogram, namecol=namecol, alphacol=alphacol, deltacol=deltacol, obsprogramcol=obsprogramcol)
 
-				# check that names are unique
-				try:
-					logging.debug("Checking unicity of names in catalog...")
-					names = [o.name for o in new_observables]
-					assert(len(names) == len(set(names)))
-				except:
-					logging.error("Names in your catalog are not unique!")
-					return
-
 			else:
 				logging.info("Loading .pouet catalog...")
 				self.print_status("Loading .pouet catalog\n{}".format(filepath), color=SETTINGS["color"]["warn"])
@@ -801,6 +795,16 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 			self.print_status("%s \nWrong formatting: do headers and columns match?\n %s..." % (namecat, str(e)[:50]), SETTINGS['color']['limit'])
 			return
 
+		# check that names are unique, the catalogue refuses duplicates
+		logging.debug("Checking unicity of names in catalog...")
+		counts = collections.Counter(o.name for o in new_observables)
+		duplicates = sorted(n for n, c in counts.items() if c > 1)
+		if duplicates:
+			logging.error("Names in your catalog are not unique: {}".format(duplicates))
+			namecat = filepath.split("/")[-1]
+			self.print_status("%s \nNot loaded: names are not unique\n %s" % (namecat, ", ".join(duplicates)[:50]), SETTINGS['color']['limit'])
+			return
+
 
 
 		if append:
@@ -812,34 +816,29 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 
 		# compute observability for the new obs and create/add them to the self observables
 		if firstload:
-			for o in new_observables:
-				if SETTINGS["misc"]["singletargetlogs"] == "True":
-					logging.debug("Computing observability of {}".format(o.name))
-				o.compute_observability(self.currentmeteo, cloudscheck=self.cloudscheck, verbose=False, cwvalidity=float(SETTINGS['validity']['cloudwindanalysis']))
-			self.observables = new_observables
+			self.observables = obs.Catalogue(new_observables)
+			self.observables.update(self.currentmeteo, cloudscheck=self.cloudscheck, cwvalidity=float(SETTINGS['validity']['cloudwindanalysis']))
 
 
 		else:
 			# add the observable only if not already in the model, otherwise keep the original one and make it visible if it was hidden
-			current_obs_names = [o.name for o in self.observables]
 			unhide_names = []
+			toadd = []
 			for o in new_observables:
 				# handle duplicates by keeping the old ones
-				if o.name in current_obs_names:
+				if o.name in self.observables:
 					unhide_names.append(o.name)
-
 				else:
-					if SETTINGS["misc"]["singletargetlogs"] == "True":
-						logging.debug("Computing observability of {}".format(o.name))
-					o.compute_observability(self.currentmeteo, cloudscheck=self.cloudscheck, verbose=False, cwvalidity=float(SETTINGS['validity']['cloudwindanalysis']))
-					self.observables.append(o)
+					toadd.append(o)
+
+			nold = len(self.observables)
+			self.observables.extend(toadd)
+			self.observables.update(self.currentmeteo, cloudscheck=self.cloudscheck, cwvalidity=float(SETTINGS['validity']['cloudwindanalysis']), rows=np.arange(nold, len(self.observables)))
 
 
 			logging.debug("Duplicate targets that are not loaded: {}".format(unhide_names))
 			# unhide duplicates that are reloaded.
-			for o in self.observables:
-				if o.name in unhide_names:
-					o.hidden = False
+			self.observables.hidden[self.observables.rows(unhide_names)] = False
 
 
 
@@ -918,12 +917,16 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 			delta = self.newTargetDialog.deltaValue.text()
 			obsprogram = self.newTargetDialog.obsprogramValue.currentText()
 
-			# create the observable, compute its observability with respect to the current meteo
-			myobs = obs.Observable(name=name, obsprogram=obsprogram, alpha=alpha, delta=delta)
-			myobs.compute_observability(self.currentmeteo, cloudscheck=self.cloudscheck, verbose=False, cwvalidity=float(SETTINGS['validity']['cloudwindanalysis']))
+			if name in self.observables:
+				msg = "{} is already in the list of targets".format(name)
+				logging.error(msg)
+				self.print_status(msg, color=SETTINGS["color"]["limit"])
+				return
 
-			# add it to the pool of existing targets
+			# create the observable, add it to the pool of existing targets and compute its observability with respect to the current meteo
+			myobs = obs.Observable(name=name, obsprogram=obsprogram, alpha=alpha, delta=delta)
 			self.observables.append(myobs)
+			self.observables.update(self.currentmeteo, cloudscheck=self.cloudscheck, cwvalidity=float(SETTINGS['validity']['cloudwindanalysis']), rows=[len(self.observables) - 1])
 			# update the display model first
 			self.update_and_display_model()
 			# refresh the observability
@@ -941,12 +944,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 
 		logging.debug("Updating observability...")
 		# refresh the observables observability flags that have hidden == False
-		run.refresh_status(self.currentmeteo, self.observables)
-		for o in self.observables:
-			if o.hidden is False:
-				if SETTINGS["misc"]["singletargetlogs"] == "True":
-					logging.debug("Computing observability of {}".format(o.name))
-				o.compute_observability(self.currentmeteo, cloudscheck=self.cloudscheck, verbose=False)
+		run.refresh_status(self.currentmeteo, self.observables, cloudscheck=self.cloudscheck)
 
 		# load the display model and the current header
 		obs_model = self.listObs.model()
@@ -967,7 +965,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		clouds_index = headers.index("C")
 
 		# we use the obs name as a reference to update the model
-		model_names = [obs_model.item(i).data(0) for i in range(obs_model.rowCount())]
+		model_rows = {obs_model.item(i).data(0): i for i in range(obs_model.rowCount())}
 
 		# compute observability and refresh the model
 		for o in self.observables:
@@ -976,7 +974,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 				name, alpha, delta, observability, obsprogram, moondist, sundist, airmass, wind, clouds = self.get_standard_items(o)
 
 				# make sur we update the correct observable in the model...
-				obs_index = model_names.index(o.name)
+				obs_index = model_rows[o.name]
 				obs_model.setItem(obs_index, observability_index, QtGui.QStandardItem(str(o.observability)))
 				obs_model.setItem(obs_index, moondist_index, moondist)
 				obs_model.setItem(obs_index, sundist_index, sundist)
@@ -1070,8 +1068,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		obs_model = self.listObs.model()
 
 		# reset hidden to False for all observables
-		for o in self.observables:
-			o.hidden = False
+		self.observables.unhide()
 
 		# checked/unchecked
 		states, names = self.check_obs_status(obs_model)
@@ -1079,13 +1076,13 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 			for i, s in enumerate(states):
 				if not s:
 					# hide from self
-					self.observables[[o.name for o in self.observables].index(names[i])].hidden = True
+					self.observables[names[i]].hidden = True
 
 		if unchecked:
 			for i, s in enumerate(states):
 				if s:
 					# hide from self
-					self.observables[[o.name for o in self.observables].index(names[i])].hidden = True
+					self.observables[names[i]].hidden = True
 
 		# other criterias
 		criteria = []
@@ -1180,8 +1177,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		Set the hidden flag of all the observables to False
 		"""
 		logging.debug("Reset hidden flag...")
-		for o in self.observables:
-			o.hidden = False
+		self.observables.unhide()
 
 		# ALWAYS update the display after changing the hidden flag
 		self.update_and_display_model()
@@ -1221,28 +1217,15 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		status, names = self.check_obs_status(self.listObs.model())
 		d = [names[i] for i, s in enumerate(status) if s == 1]
 
-		alphas = []
-		deltas = []
-		are_obs = []
-		as_xs = []
-		as_ys = []
-		ord_names = []
-
-		for target in self.observables:
-
-			if target.name not in d:
-				continue
+		# rows in the catalogue order, alphas in hours and deltas in degrees
+		rows = np.sort(self.observables.rows(d))
+		ord_names = [self.observables.names[r] for r in rows]
+		alphas = self.observables.alpha[rows]
+		deltas = self.observables.delta[rows]
 
-			ord_names.append(target.name)
+		azs, elevs = self.currentmeteo.get_AzAlt_array(np.deg2rad(alphas * 15.), np.deg2rad(deltas), self.currentmeteo.time)
 
-			az, elev = self.currentmeteo.get_AzAlt(target.alpha, target.delta, self.currentmeteo.time)
-			as_x, as_y = self.currentmeteo.allsky.station.get_image_coordinates(az.radian, elev.radian)
-
-			alphas.append(target.alpha.value)
-			deltas.append(target.delta.value)
-			as_xs.append(as_x)
-			as_ys.append(as_y)
-			are_obs.append(target.observability)
+		as_xs, as_ys = self.currentmeteo.allsky.station.get_image_coordinates(azs, elevs)
 
 		#-------- Plots on visibility layer
 
@@ -1272,7 +1255,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		Prompts a weather report update and displays the results in the `station` tab.
 		"""
 		logging.debug("Starting weather update...")
-		if not self.currentmeteo.lastest_weatherupdate_time is None and (Time.now() - self.currentmeteo.lastest_weatherupdate_time).to(u.s).value < float(SETTINGS['validity']['weatherreportfrequency']):
+		if not self.currentmeteo.lastest_weatherupdate_time is None and (self.currentmeteo.now() - self.currentmeteo.lastest_weatherupdate_time).to(u.s).value < float(SETTINGS['validity']['weatherreportfrequency']):
 			logging.info("Last weather report was downloaded more recently than {} seconds ago, I don't download it again".format(SETTINGS['validity']['weatherreportfrequency']))
 			draw_wind = False
 		else:
@@ -1282,11 +1265,12 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		self.weather_reached_limit = False
 		self.weather_reached_warn = False
 
-		self.weatherWindSpeedValue.setText(str('{:2.1f}'.format(self.currentmeteo.windspeed)))
-		if float(self.currentmeteo.location.get("weather", "windLimitLevel")) <= self.currentmeteo.windspeed:
+		windspeed = self.currentmeteo.get_windspeed()
+		self.weatherWindSpeedValue.setText(str('{:2.1f}'.format(windspeed)))
+		if float(self.currentmeteo.location.get("weather", "windLimitLevel")) <= windspeed:
 			self.weatherWindSpeedValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['limit']))
 			self.weather_reached_limit = True
-		elif float(self.currentmeteo.location.get("weather", "windWarnLevel")) <= self.currentmeteo.windspeed:
+		elif float(self.currentmeteo.location.get("weather", "windWarnLevel")) <= windspeed:
 			self.weatherWindSpeedValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['warn']))
 			self.weather_reached_warn = True
 		else:
@@ -1322,21 +1306,21 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 
 		obs_time = self.currentmeteo.time
 
-		# Bright objects now
-		sunAz, sunAlt = self.currentmeteo.get_sun(obs_time)
-		sunAlt = sunAlt.to(u.degree).value
-		sunAz = sunAz.to(u.degree).value
+		# Bright objects now and in 10 minutes, interpolated in the ephemerides of the night
+		obs_timep1 = obs_time + TimeDelta(10.0*60., format='sec')
+		eph = self.currentmeteo.get_ephemerides(obs_time).get(obs_time)
+		ephp1 = self.currentmeteo.get_ephemerides(obs_timep1).get(obs_timep1)
 
-		_, sunAltp1 = self.currentmeteo.get_sun(obs_time + TimeDelta(10.0*60., format='sec'))
-		sunAltp1 = sunAltp1.to(u.degree).value
-		sundAlt = sunAltp1 - sunAlt
+		sunAlt = np.rad2deg(eph["sunalt"])
+		sunAz = np.rad2deg(eph["sunaz"])
+		sundAlt = np.rad2deg(ephp1["sunalt"]) - sunAlt
 
 		if sundAlt > 0:
 			sunState = "rising"
 		else:
 			sunState = "declining"
 
-		self.sunCoordinatesValues.setText(str('RA={:s}  DEC={:s}'.format(self.currentmeteo.sun.ra.__str__(), self.currentmeteo.sun.dec.__str__())))
+		self.sunCoordinatesValues.setText(str('RA={:s}  DEC={:s}'.format(angles.Angle(eph["sunra"], unit="radian").to_string(unit=u.hour, sep=':', precision=2), angles.Angle(eph["sundec"], unit="radian").to_string(unit=u.degree, sep=':', precision=1))))
 		self.sunAltazValue.setText(str('{:2.1f}° ({:s})\t{:2.1f}°'.format(sunAlt, sunState, sunAz)))
 
 		self.station_reached_limit = False
@@ -1351,20 +1335,16 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		else:
 			self.sunAltazValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['nominal']))
 
-		moonAz, moonAlt = self.currentmeteo.get_moon(obs_time)
-		moonAlt = moonAlt.to(u.degree).value
-		moonAz = moonAz.to(u.degree).value
-
-		_, moonAltp1 = self.currentmeteo.get_moon(obs_time + TimeDelta(10.0*60., format='sec'))
-		moonAltp1 = moonAltp1.to(u.degree).value
-		moondAlt = moonAltp1 - moonAlt
+		moonAlt = np.rad2deg(eph["moonalt"])
+		moonAz = np.rad2deg(eph["moonaz"])
+		moondAlt = np.rad2deg(ephp1["moonalt"]) - moonAlt
 
 		if moondAlt > 0:
 			moonState = "rising"
 		else:
 			moonState = "declining"
 
-		self.moonCoordinatesValues.setText(str('RA={:s}  DEC={:s}'.format(self.currentmeteo.moon.ra.__str__(), self.currentmeteo.moon.dec.__str__())))
+		self.moonCoordinatesValues.setText(str('RA={:s}  DEC={:s}'.format(angles.Angle(eph["moonra"], unit="radian").to_string(unit=u.hour, sep=':', precision=2), angles.Angle(eph["moondec"], unit="radian").to_string(unit=u.degree, sep=':', precision=1))))
 		self.moonAltazValue.setText(str('{:2.1f}° ({:s})\t{:2.1f}°'.format(moonAlt, moonState, moonAz)))
 
 		self.brightLastUpdateValue.setText("computed for {}".format(str(obs_time).split('.')[0]))
@@ -1450,7 +1430,7 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		else:
 			check_wind = True
 
-		self.visibilitytool.visbility_draw(meteo=self.currentmeteo, airmass=airmass, anglemoon=float(anglemoon), check_wind=check_wind)
+		self.visibilitytool.visbility_draw(meteo=self.currentmeteo, airmass=airmass, anglemoon=float(anglemoon), check_wind=check_wind, vectorized=self.visibilityVectorized.isChecked())
 
 		logging.info("Drawn visibility with airmass={:1.1f}, anglemoon={:d}d".format(airmass, anglemoon))
 
@@ -1478,14 +1458,14 @@ class POUET(QtWidgets.QMainWindow, design.Ui_POUET):
 		if self.configWindAutoRefreshValue.checkState() == 2 and self.configCloudsAutoRefreshValue.checkState() == 0:
 			self.allsky_redisplay()
 
-		if self.currentmeteo.lastest_weatherupdate_time is None or (Time.now() - self.currentmeteo.lastest_weatherupdate_time).to(u.s).value / 60. > float(SETTINGS['validity']['weatherreport']):
+		if self.currentmeteo.lastest_weatherupdate_time is None or (self.currentmeteo.now() - self.currentmeteo.lastest_weatherupdate_time).to(u.s).value / 60. > float(SETTINGS['validity']['weatherreport']):
 			self.allSkyUpdateWindValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['warn']))
 			self.weatherLastUpdateValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['warn']))
 		else:
 			self.allSkyUpdateWindValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['nominal']))
 			self.weatherLastUpdateValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['nominal']))
 
-		if self.currentmeteo.allsky.last_im_refresh is None or (Time.now() - self.currentmeteo.allsky.last_im_refresh).to(u.s).value / 60. > float(SETTINGS['validity']['allsky']):
+		if self.currentmeteo.allsky.last_im_refresh is None or (self.currentmeteo.now() - self.currentmeteo.allsky.last_im_refresh).to(u.s).value / 60. > float(SETTINGS['validity']['allsky']):
 			self.allSkyUpdateValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['warn']))
 		else:
 			self.allSkyUpdateValue.setStyleSheet("QLabel { color : %s; }" % format(SETTINGS['color']['nominal']))
@@ -1657,7 +1637,7 @@ class AllSkyView(FigureCanvas):
 
 		allsky = meteo.allsky
 
-		if meteo.allsky.last_im_refresh is None or (Time.now() - meteo.allsky.last_im_refresh).to(u.s).value / 60. > float(SETTINGS['validity']['allsky']):
+		if meteo.allsky.last_im_refresh is None or (meteo.now() - meteo.allsky.last_im_refresh).to(u.s).value / 60. > float(SETTINGS['validity']['allsky']):
 			self.error_image()
 			logging.warning("No All Sky image, by-passing")
 			return
@@ -1972,6 +1952,8 @@ class VisibilityView(FigureCanvas):
 		self.axis = self.figure.add_subplot(gs[0])
 		self.cax = self.figure.add_subplot(gs[1])
 
+		self.fieldcache = skygrid.FieldCache(maxsize=float(SETTINGS['visibility']['cachesize']), timebucket=float(SETTINGS['visibility']['cachetimebucket']))
+
 		FigureCanvas.__init__(self, self.figure)
 		self.parent = parent
 
@@ -2003,7 +1985,7 @@ class VisibilityView(FigureCanvas):
 			self.axis.annotate('{}'.format(name), xy=(x-0.2, y), color='k',horizontalalignment='left', verticalalignment='center', size=7)
 		self.draw()
 
-	def visbility_draw(self, meteo, airmass, anglemoon, check_wind=True):
+	def visbility_draw(self, meteo, airmass, anglemoon, check_wind=True, vectorized=True):
 		"""
 		Draws the visibility plot
 
@@ -2011,6 +1993,7 @@ class VisibilityView(FigureCanvas):
 		:param airmass: airmass max criterion
 		:param anglemoon: min moon angle allowed
 		:param check_wind: checks in meteo the current wind and compare this to the value in the station setting?
+		:param vectorized: if True, compute the whole sky grid at once with :mod:`skygrid`, otherwise use one pyephem body per grid point. The vectorized sky grids are kept in a :class:`~skygrid.FieldCache`, so that changing only the constraints does not recompute them.
 
 		.. note:: if above wind warning: displays the region 90deg away from the wind in orange. If above limit whole plot in red
 		"""
@@ -2018,21 +2001,79 @@ class VisibilityView(FigureCanvas):
 		self.axis.clear()
 		self.cax.clear()
 
-		ras, decs = util.grid_points()
+		tel_lat, tel_lon, tel_elev = meteo.get_telescope_params()
+		obs_time = meteo.time
+
+		if vectorized:
+			fields = self.fieldcache.get(meteo, obs_time)
+			masks = skygrid.visibility_masks(fields, meteo, airmass, anglemoon, check_wind=check_wind)
+			ras, decs = fields["ras"], fields["decs"]
+		else:
+			ras, decs = util.grid_points()
+			masks = self.visibility_ephem(meteo, ras, decs, airmass, anglemoon, check_wind=check_wind)
+
+		ra_g, dec_g = np.meshgrid(ras, decs)
+		vis, sep, wind = masks["vis"], masks["sep"], masks["wind"]
+		do_plot_contour = not np.all(np.isnan(sep))
+
+		#########################################################
+
+		ra_g = ra_g / 2 / np.pi * 24
+		dec_g = dec_g / np.pi * 180
+		v = np.linspace(anglemoon, 180, 100, endpoint=True)
+		self.axis.contourf(ra_g, dec_g, vis, cmap=plt.get_cmap("Greys"))
+
+		if do_plot_contour:
+			CS = self.axis.contour(ra_g, dec_g, sep, levels=[50, 70, 90], colors=['yellow', 'red', 'k'])
+			self.axis.clabel(CS, fontsize=9, fmt='%d°')
+			CS = self.axis.contourf(ra_g, dec_g, sep, v, )
+
+			t = np.arange(anglemoon, 190, 10)
+			tl = ["{:d}°".format(int(tt)) for tt in t]
+			cbar = self.figure.colorbar(CS, ax=self.axis, cax=self.cax, ticks=t)
+			cbar.ax.set_yticklabels(tl, fontsize=9)
+
+		if masks["windlevel"] is not None:
+			cw = SETTINGS['color'][masks["windlevel"]]
+			cmap = LinearSegmentedColormap.from_list('mycmap', [(0., 'red'),
+																(1, cw)]
+													 )
+
+			cs = self.axis.contourf(ra_g, dec_g, wind, hatches=['//'],
+									cmap=cmap, alpha=0.5)
+			#self.axis.annotate(ct, xy=(12, 75), rotation=0,
+			#                   horizontalalignment='center', verticalalignment='center', color=cw, fontsize=cts)
+
+		for tick in self.axis.get_xticklabels():
+			tick.set_rotation(70)
+		self.axis.set_xlabel('Right ascension', fontsize=9, )
+		self.axis.set_ylabel('Declination', fontsize=9, )
+
+		self.axis.set_title("%s - Moon sep %d deg - max airmass %1.1f" % (str(obs_time).split('.')[0], anglemoon, airmass), fontsize=9)
+
+		self.axis.set_xticks(np.linspace(0, 24, 25))
+		self.axis.set_yticks(np.linspace(-90, 90, 19))
+		self.finish_plot(tel_lat)
+
+	def visibility_ephem(self, meteo, ras, decs, airmass, anglemoon, check_wind=True):
+		"""
+		Computes the visibility masks of :func:`~skygrid.visibility_masks` with one pyephem body per grid point. Slow, kept as a reference for the vectorized version.
+
+		:param meteo: to get the obs_time and the station params
+		:param ras: right ascensions of the grid, see :func:`~util.grid_points`
+		:param decs: declinations of the grid, see :func:`~util.grid_points`
+		:param airmass: airmass max criterion
+		:param anglemoon: min moon angle allowed
+		:param check_wind: checks in meteo the current wind and compare this to the value in the station setting?
+
+		:return: dictionary of vis, sep, wind arrays and windlevel, see :func:`~skygrid.visibility_masks`
+		"""
 		ra_g, dec_g = np.meshgrid(ras, decs)
 		sep = np.zeros_like(ra_g)
 		vis = np.zeros_like(ra_g)
 		wind = np.zeros_like(ra_g) * np.nan
 
-		tel_lat, tel_lon, tel_elev = meteo.get_telescope_params()
-
-		observer = ephem.Observer()
-		obs_time = meteo.time
-		observer.date = obs_time.iso
-		observer.lat = tel_lat.to_string(unit=u.degree, decimal=True)
-		observer.lon = tel_lon.to_string(unit=u.degree, decimal=True)
-
-		observer.elevation = tel_elev
+		observer = meteo.get_observer(meteo.time)
 
 		moon = ephem.Moon()
 		moon.compute(observer)
@@ -2042,7 +2083,7 @@ class VisibilityView(FigureCanvas):
 		WD = meteo.winddirection
 		WS = meteo.windspeed
 
-		do_plot_contour = False
+		windlevel = None
 		for i, ra in enumerate(ras):
 			for j, dec in enumerate(decs):
 				star = ephem.FixedBody()
@@ -2056,16 +2097,14 @@ class VisibilityView(FigureCanvas):
 
 					if np.rad2deg(s) - 0.5 > anglemoon:  # Don't forget that the angular diam of the Moon is ~0.5 deg
 						sep[j, i] = np.rad2deg(s)
-						do_plot_contour = True
-
 					else:
 						sep[j, i] = np.nan
 
 					if check_wind and WS >= wsl:
 						wind[j, i] = 1.
-						cw = SETTINGS['color']['limit']
+						windlevel = "limit"
 					elif check_wind and WS >= wpl:
-						cw = SETTINGS['color']['warn']
+						windlevel = "warn"
 						ws = ephem.separation((star.alt, np.deg2rad(WD)), (star.alt, star.az))
 						if ws < np.pi / 2.:
 							wind[j, i] = 1.
@@ -2075,43 +2114,7 @@ class VisibilityView(FigureCanvas):
 
 			del star
 
-		#########################################################
-
-		ra_g = ra_g / 2 / np.pi * 24
-		dec_g = dec_g / np.pi * 180
-		v = np.linspace(anglemoon, 180, 100, endpoint=True)
-		self.axis.contourf(ra_g, dec_g, vis, cmap=plt.get_cmap("Greys"))
-
-		if do_plot_contour:
-			CS = self.axis.contour(ra_g, dec_g, sep, levels=[50, 70, 90], colors=['yellow', 'red', 'k'])
-			self.axis.clabel(CS, fontsize=9, fmt='%d°')
-			CS = self.axis.contourf(ra_g, dec_g, sep, v, )
-
-			t = np.arange(anglemoon, 190, 10)
-			tl = ["{:d}°".format(int(tt)) for tt in t]
-			cbar = self.figure.colorbar(CS, ax=self.axis, cax=self.cax, ticks=t)
-			cbar.ax.set_yticklabels(tl, fontsize=9)
-
-		if check_wind and WS >= wpl:
-			cmap = LinearSegmentedColormap.from_list('mycmap', [(0., 'red'),
-																(1, cw)]
-													 )
-
-			cs = self.axis.contourf(ra_g, dec_g, wind, hatches=['//'],
-									cmap=cmap, alpha=0.5)
-			#self.axis.annotate(ct, xy=(12, 75), rotation=0,
-			#                   horizontalalignment='center', verticalalignment='center', color=cw, fontsize=cts)
-
-		for tick in self.axis.get_xticklabels():
-			tick.set_rotation(70)
-		self.axis.set_xlabel('Right ascension', fontsize=9, )
-		self.axis.set_ylabel('Declination', fontsize=9, )
-
-		self.axis.set_title("%s - Moon sep %d deg - max airmass %1.1f" % (str(obs_time).split('.')[0], anglemoon, airmass), fontsize=9)
-
-		self.axis.set_xticks(np.linspace(0, 24, 25))
-		self.axis.set_yticks(np.linspace(-90, 90, 19))
-		self.finish_plot(tel_lat)
+		return {"vis": vis, "sep": sep, "wind": wind, "windlevel": windlevel}
 
 	def finish_plot(self, tel_lat):
 		# todo: define what tel_lat is in doc
@@ -15,24 +15,32 @@ from astropy.time import Time
 #import urllib.request, urllib.error, urllib.parse
 import ephem
 import numpy as np
-import os, sys, inspect
+import os, sys
+import copy
+from concurrent.futures import ThreadPoolExecutor
 
 
-import util, clouds
+import util, resources, fetcher, weatherhistory
 
 import logging
 logger = logging.getLogger(__name__)
 
+global SETTINGS
+SETTINGS = resources.settings()
+
 
 #todo: there are a lot of obs_time=Time.now() still in the code, it should be cleared from these!
 
+# ephemerides tables of the last nights computed, see Meteo.get_ephemerides
+_EPHEMERIDES = {}
+
 class Meteo:
     """
     Class to hold the meteorological conditions of the current night and the location of the site
 
     Typically, a Meteo object is created when POUET starts, and then update itself every XX minutes
     """
-    def __init__(self, name='uknsite', time=None, moonaltitude=None, moonazimuth=None, sunaltitude=None, sunazimuth=None, winddirection=-1, windspeed=-1, cloudscheck=True, fimage=None, debugmode=False):
+    def __init__(self, name='uknsite', time=None, moonaltitude=None, moonazimuth=None, sunaltitude=None, sunazimuth=None, winddirection=-1, windspeed=-1, cloudscheck=True, fimage=None, debugmode=False, ephemerisstep=1., minimal=False, provider=None):
         """
         :param name: string, name of the meteo object (typically the site where you are located, i.e. LaSilla. Must correspond to a .cfg file in :file:`config` that contains the location of the site. See :file:`config/LaSilla.cfg` for example.
         :param time: Astropy Time object. If None, use the current time as default
@@ -45,13 +53,15 @@ class Meteo:
         :param cloudscheck: boolean. If True, uses :meth:`clouds.Clouds` to analyze an all-sky image and create a mapping of the clouds in the plane of the sky
         :param fimage: string, name of the filename of the all-sky image to analyse
         :param debugmode: boolean. If True, use dummy values for the wind and all-sky
+        :param ephemerisstep: float, time step in minutes of the Sun and Moon ephemerides table, see :class:`~meteo.EphemerisTable`
+        :param minimal: boolean. If True, the first update only computes the moon and sun position, without fetching the weather report and all-sky image, see :meth:`~meteo.update`
+        :param provider: object providing the weather reports and all-sky images instead of the urls of the station, and their time, e.g. a replay of archives, see :mod:`providers`. Overrides the debugmode.
 
         .. warning:: the moon and sun position, wind speed and angle default values provided at construction will be overwritten by :meth:`~meteo.update`
 
         """
         self.name = name
-        self.location = util.readconfig(os.path.join(os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
-, "config", "{}.cfg".format(name)))
+        self.location = resources.station_config(name)
         self.get_telescope_params()
         
         self.weatherReport = (util.load_station(name)).WeatherReport()
@@ -66,15 +76,40 @@ class Meteo:
         self.temperature = 9999 
         self.humidity = -1
         self.lastest_weatherupdate_time = None
+        # time of the last reading of the weather history, see _set_weather
+        self.weatherreport_time = None
         self.debugmode = debugmode
+        self.weatherservice = None
+        self.provider = provider
+        self.weatherhistory = weatherhistory.WeatherHistory(capacity=int(SETTINGS["weather"]["historysize"]), windows=[float(SETTINGS["weather"]["windwindow"])])
         
         self.cloudscheck = cloudscheck
         self.cloudmap = None
 
+        self.ephemerides = None
+        self.ephemerisstep = ephemerisstep
+        self.moonphase = None
+
+
+        # the all-sky analysis needs scipy, it is only loaded when first used, see allsky
+        self.fimage = fimage
+        self._allsky = None
 
-        self.allsky = clouds.Clouds(name=name, fimage=fimage, debugmode=debugmode)
+        self.update(minimal=minimal)
+
+    @property
+    def allsky(self):
+        """
+        :class:`~clouds.Clouds` object analysing the all-sky images of the site, created on first access
+        """
+        if self._allsky is None:
+            import clouds
+            self._allsky = clouds.Clouds(name=self.name, fimage=self.fimage, debugmode=self.debugmode, provider=self.provider)
+        return self._allsky
 
-        self.update()
+    @allsky.setter
+    def allsky(self, allsky):
+        self._allsky = allsky
 
     def updatemoonpos(self, obs_time=Time.now()):
         """
@@ -83,9 +118,10 @@ class Meteo:
         :param obs_time: Astropy Time object, time at which you want to compute the moon coordinates
         """
         logger.debug("Updating moon position...")
-        Az, Alt = self.get_moon(obs_time=obs_time)
-        self.moonalt = Alt
-        self.moonaz = Az
+        eph = self.get_ephemerides(obs_time).get(obs_time)
+        self.moonalt = angles.Angle(eph["moonalt"], unit="radian")
+        self.moonaz = angles.Angle(eph["moonaz"], unit="radian")
+        self.moonphase = eph["moonphase"]
 
     def updatesunpos(self, obs_time=Time.now()):
         """
@@ -94,30 +130,86 @@ class Meteo:
         :param obs_time: Astropy Time object, time at which you want to compute the Sun coordinates
         """
         logger.debug("Updating Sun position...")
-        Az, Alt = self.get_sun(obs_time=obs_time)
-        self.sunalt = Alt
-        self.sunaz = Az
+        eph = self.get_ephemerides(obs_time).get(obs_time)
+        self.sunalt = angles.Angle(eph["sunalt"], unit="radian")
+        self.sunaz = angles.Angle(eph["sunaz"], unit="radian")
+
+    def get_ephemerides(self, obs_time):
+        """
+        Returns the :class:`~meteo.EphemerisTable` of the night containing obs_time, computing it only if the current one does not cover obs_time.
+
+        The night goes from local noon to the next local noon, local time being estimated from the longitude of the site. If obs_time is an array spanning more than that, the table is extended up to the last time.
+
+        :param obs_time: Astropy Time object, scalar or array
+        :return: :class:`~meteo.EphemerisTable`
+        """
+        if self.ephemerides is not None and self.ephemerides.covers(obs_time):
+            return self.ephemerides
+
+        mjds = np.atleast_1d(obs_time.mjd)
+        lonfrac = self.lon.degree / 360.
+        start = np.floor(np.min(mjds) + lonfrac - 0.5) + 0.5 - lonfrac
+        stop = max(start + 1., np.max(mjds))
+
+        # tables only depend on the location, they are shared between the Meteo objects of a same site
+        key = (self.lat.degree, self.lon.degree, self.elev, start, stop, self.ephemerisstep)
+        if key not in _EPHEMERIDES:
+            if len(_EPHEMERIDES) >= 4:
+                _EPHEMERIDES.pop(next(iter(_EPHEMERIDES)))
+            _EPHEMERIDES[key] = EphemerisTable(self.lat, self.lon, self.elev, Time(start, format='mjd', scale='utc'), Time(stop, format='mjd', scale='utc'), step=self.ephemerisstep)
+        self.ephemerides = _EPHEMERIDES[key]
+        return self.ephemerides
 
     def updateclouds(self):
         """
         Excecutes the clouds code in :meth:`~clouds.Clouds`, if map not available, saves None to cloudmap
         """
         logger.debug("Updating clouds coverage...")
+        self.allsky, self.cloudmap = self._analyse_clouds(self.allsky)
+
+    def _analyse_clouds(self, allsky):
+        """
+        Updates a :class:`~clouds.Clouds` object, without changing the meteo
+
+        :return: the Clouds object and its observability map, None if not available
+        """
         try:
-            self.allsky.update()
-            self.cloudmap = self.allsky.observability_map
+            allsky.update()
+            return allsky, allsky.observability_map
         except:
             logger.warning("Could not retrieve cloud map")
-            self.cloudmap = None
+            return allsky, None
 
-    def update(self, obs_time=Time.now(), minimal=False):
+    def get_cloudmap(self, obs_time=None):
+        """
+        Returns the cloud map to use at a given time: the map predicted by :meth:`~clouds.Clouds.predict` if the nowcast is enabled in the settings and a prediction is available, otherwise the last cloud map
+
+        :param obs_time: Astropy Time object. If None, use the meteo time.
+        :return: map, or None if there is no cloud map
+        """
+        if self.cloudmap is None or self._allsky is None or SETTINGS["clouds"]["nowcast"] != "True":
+            return self.cloudmap
+        # only the maps of the all-sky analysis can be moved along
+        if self.cloudmap is not self._allsky.observability_map:
+            return self.cloudmap
+        predicted = self._allsky.predict(self.time if obs_time is None else obs_time)
+        return self.cloudmap if predicted is None else predicted
+
+    def update(self, obs_time=Time.now(), minimal=False, concurrent=None):
         """
         Update the time-dependent parameters: Sun and moon position, wind speed and direction, cloud coverage map. Wrapper around the :meth:`~meteo.updatemoonpos`, :meth:`~meteo.updatesunpos`, :meth:`~meteo.updateweather` and :meth:`~meteo.updateclouds`
 
         :param obs_time: Astropy Time object. If None, use the current time as default.
         :param minimal: boolean. If True, update only the moon and sun position. Useful for predictions where wind and cloud coverage cannot be estimated.
+        :param concurrent: boolean, if True see :meth:`~meteo.update_concurrent`. If None, use the `concurrentupdate` entry of the settings.
         """
         logger.debug("Starting meteo update...")
+        if concurrent is None:
+            concurrent = SETTINGS["misc"]["concurrentupdate"] == "True"
+        if concurrent and not minimal:
+            self.update_concurrent(obs_time=obs_time)
+            return
+
         self.time=obs_time
         self.updatemoonpos(obs_time=obs_time)
         self.updatesunpos(obs_time=obs_time)
@@ -126,6 +218,33 @@ class Meteo:
             if self.cloudscheck:
                 self.updateclouds()
 
+    def update_concurrent(self, obs_time=Time.now()):
+        """
+        Same as :meth:`~meteo.update`, but the weather report and the all-sky image are downloaded at the same time in two worker threads, the all-sky image being analysed in its worker, while the Sun and moon positions are computed. The update thus takes as long as the slowest of them instead of their sum.
+
+        The workers do not change the meteo: the all-sky analysis runs on a copy of the allsky attribute with its own analysis state, see :meth:`~clouds.Clouds.__copy__`, and all the parameters are set together at the end, from the same update. The copy replaces the allsky attribute, it takes over the downloads and the cloud store.
+
+        :param obs_time: Astropy Time object. If None, use the current time as default.
+        """
+        logger.debug("Starting concurrent meteo update...")
+        with ThreadPoolExecutor(max_workers=2, thread_name_prefix="MeteoUpdate") as pool:
+            weather = pool.submit(self._read_weather)
+            clouds = pool.submit(self._analyse_clouds, copy.copy(self.allsky)) if self.cloudscheck else None
+            eph = self.get_ephemerides(obs_time).get(obs_time)
+            weather = weather.result()
+            if clouds is not None:
+                clouds = clouds.result()
+
+        self.time = obs_time
+        self.moonalt = angles.Angle(eph["moonalt"], unit="radian")
+        self.moonaz = angles.Angle(eph["moonaz"], unit="radian")
+        self.moonphase = eph["moonphase"]
+        self.sunalt = angles.Angle(eph["sunalt"], unit="radian")
+        self.sunaz = angles.Angle(eph["sunaz"], unit="radian")
+        self._set_weather(*weather)
+        if clouds is not None:
+            self.allsky, self.cloudmap = clouds
+
     def __str__(self, obs_time=Time.now()):
         # not very elegant
         msg = "="*30+"\nName:\t\t%s\nDate:\t%s\n" %(self.name, self.time)
@@ -155,23 +274,122 @@ class Meteo:
     def updateweather(self):
         """
         Updates the weather-related parameters from the site weather report.
+
+        If the weather service runs, see :meth:`~meteo.start_weatherservice`, the parameters are those of its latest reading and this does not wait for the weather server.
         """
-        logger.debug("Updating meteo from online weather report...")
-        self.winddirection, self.windspeed, self.temperature, self.humidity = self.weatherReport.get(debugmode=self.debugmode)
-        
+        self._set_weather(*self._read_weather())
+
+    def _read_weather(self):
         """
-        self.winddirection = WD
-        self.windspeed = WS
-        self.temperature = Temps 
-        self.humidity = RH
+        Reads the weather report, without changing the meteo
+
+        :return: tuple of the wind direction, wind speed, temperature and humidity, None if there is no reading from the weather service yet, the Astropy Time of the download, None if it failed, and the Astropy Time of the report, None if the station does not give it
         """
+        if self.weatherservice is not None and self.weatherservice.running:
+            reading = self.weatherservice.latest()
+            if reading is None:
+                logger.debug("No weather report from the weather service yet")
+                return None, None, None
+            return reading
+
+        if self.provider is not None:
+            logger.debug("Updating meteo from {}...".format(self.provider.weather.url))
+            values, reporttime = (-9999, -9999, -9999, -9999), None
+            if self.provider.weather.fetch() != fetcher.FAILED:
+                try:
+                    if hasattr(self.weatherReport, "read"):
+                        values, reporttime = self.weatherReport.read(self.provider.weather.content.decode("utf-8"))
+                    else:
+                        values = self.weatherReport.parse(self.provider.weather.content.decode("utf-8"))
+                except (UnicodeDecodeError, ValueError) as e:
+                    logger.warning("Cannot read the weather report: {}".format(e))
+            now = self.provider.now()
+        else:
+            logger.debug("Updating meteo from online weather report...")
+            if hasattr(self.weatherReport, "get_reading"):
+                values, reporttime = self.weatherReport.get_reading(debugmode=self.debugmode)
+            else:
+                values, reporttime = self.weatherReport.get(debugmode=self.debugmode), None
+            now = Time.now()
         
-        checkvals = np.array([self.winddirection, self.windspeed, self.temperature, self.humidity])
+        checkvals = np.array(values)
         li = np.where(checkvals == -9999)[0]
         
         if not len(li) == len(checkvals):
-            self.lastest_weatherupdate_time = Time.now()
-    
+            return tuple(values), now, reporttime
+        return tuple(values), None, None
+
+    def _set_weather(self, values, time, reporttime=None):
+        """
+        Sets the weather-related parameters read by :meth:`~meteo._read_weather`
+
+        A report is added to the weather history once, at the time of the report if given, at the download time otherwise, however often it is downloaded again.
+        """
+        if values is None:
+            return
+        self.winddirection, self.windspeed, self.temperature, self.humidity = values
+        if time is not None:
+            readtime = time if reporttime is None else reporttime
+            if self.weatherreport_time is None or readtime > self.weatherreport_time:
+                self.weatherhistory.append(readtime, *values)
+                self.weatherreport_time = readtime
+            self.lastest_weatherupdate_time = time
+
+    def now(self):
+        """
+        :return: Astropy Time object, current time of the provider if any, otherwise the current time. The weather and all-sky data are those of this time, e.g. of the replay of archived data, see :mod:`providers`.
+        """
+        if self.provider is not None:
+            return self.provider.now()
+        return Time.now()
+
+    def get_windspeed(self):
+        """
+        Wind speed to compare to the wind levels of the station: the last reading, or its rolling mean or maximum over the last minutes, depending on the `windstatistic` and `windwindow` entries of the settings, see :class:`~weatherhistory.WeatherHistory`
+
+        :return: float, wind speed in m/s. The last reading if there is no valid reading in the window.
+        """
+        statistic = SETTINGS["weather"]["windstatistic"]
+        if statistic == "last":
+            return self.windspeed
+        stats = self.weatherhistory.stats(float(SETTINGS["weather"]["windwindow"]))
+        windspeed = stats["windgust"] if statistic == "gust" else stats["windspeed"]
+        return self.windspeed if np.isnan(windspeed) else windspeed
+
+    def start_weatherservice(self):
+        """
+        Starts downloading the weather report in the background, with the period, timeouts and backoff of the `weather` section of the settings, see :class:`~weatherservice.WeatherService`. Not available in debug mode without provider, where the report is a local file.
+
+        :return: boolean, True if the service runs
+        """
+        if (self.debugmode and self.provider is None) or not hasattr(self.weatherReport, "parse"):
+            return False
+        if self.weatherservice is None:
+            import weatherservice
+            timeout = (float(SETTINGS["weather"]["connecttimeout"]), float(SETTINGS["weather"]["readtimeout"]))
+            self.weatherservice = weatherservice.WeatherService(self.weatherReport, period=float(SETTINGS["validity"]["weatherreportfrequency"]), timeout=timeout, maxbackoff=float(SETTINGS["weather"]["maxbackoff"]), provider=self.provider)
+        self.weatherservice.start()
+        return True
+
+    def stop_weatherservice(self):
+        """
+        Stops the background downloads of the weather report, :meth:`~meteo.updateweather` downloads it again
+        """
+        if self.weatherservice is not None:
+            self.weatherservice.stop()
+            self.weatherservice = None
+
+    def get_observer(self, obs_time=None):
+        """
+        Creates an ephem Observer at the location of the telescope
+
+        :param obs_time: Astropy Time object. If None, the date of the observer is not set.
+        :return: ephem Observer
+
+        .. note:: ephem reads floats as radians and strings as degrees, so the coordinates are given as strings.
+        """
+        return get_observer(self.lat, self.lon, self.elev, obs_time)
+
     def get_moon(self, obs_time=Time.now()):
         """
         Compute the altitude and azimuth of the moon at the given time
@@ -180,9 +398,7 @@ class Meteo:
         :return: altitude and azimuth angles as Astropy Angle objects
         """
         logger.debug("Computing Moon coordinates...")
-        observer = ephem.Observer()
-        observer.date = obs_time.iso
-        observer.lat, observer.lon, observer.elevation = self.lat.degree, self.lon.degree, self.elev
+        observer = self.get_observer(obs_time)
     
         self.moon = ephem.Moon()
         self.moon.compute(observer)
@@ -203,9 +419,7 @@ class Meteo:
         :return: altitude and azimuth angles as Astropy Angle objects
         """
         logger.debug("Computing Sun coordinates...")
-        observer = ephem.Observer()
-        observer.date = obs_time.iso
-        observer.lat, observer.lon, observer.elevation = self.lat.degree, self.lon.degree, self.elev
+        observer = self.get_observer(obs_time)
     
         self.sun = ephem.Sun()
         self.sun.compute(observer)
@@ -263,6 +477,23 @@ class Meteo:
     
         return Az, Alt
     
+    def get_AzAlt_array(self, alphas, deltas, obs_times=None, ref_dir=0, outer=True):
+        """
+        Array version of :meth:`~meteo.Meteo.get_AzAlt`, working on plain floats in radians instead of Astropy Angle objects.
+
+        alphas and deltas must have the same shape (N targets). If obs_times is an array of T times, the output has shape (N, T), otherwise the shape of alphas.
+
+        :param alphas: float or numpy array, right ascensions in radians
+        :param deltas: float or numpy array, declinations in radians
+        :param obs_times: Astropy Time object, scalar or array. If None, use the meteo time.
+        :param ref_dir: float, zero point of the azimuth in degrees. Default is 0, corresponding to North.
+        :param outer: boolean. If False, alphas, deltas and obs_times are broadcasted against each other element-wise instead of giving a targets x times output, e.g. for a body moving along time.
+        :return: azimuths and altitudes in radians, as numpy arrays
+        """
+        if obs_times is None:
+            obs_times = self.time
+        return get_AzAlt_array(self.lat, self.lon, alphas, deltas, obs_times, ref_dir=ref_dir, outer=outer)
+
     def get_telescope_params(self):
         """
         Puts the latitude, longitude and elevation of the telescope from the config file into Astropy Angle objects
@@ -286,6 +517,18 @@ class Meteo:
 
         :return: list of Astropy Time objects, regularly spaced between twilights.
 
+        """
+        return list(self.get_nighttimes(obs_night, twilight=twilight, nhours=nhours))
+
+    def get_nighttimes(self, obs_night, twilight="nautical", nhours=100):
+        """
+        Same as :meth:`~meteo.Meteo.get_nighthours`, but returns a single array-valued Astropy Time object, which can be given as is to the array methods such as :meth:`~meteo.Meteo.get_AzAlt_array`.
+
+        :param obs_night: string formatted as YYYY-MM-DD. Night where the observations start.
+        :param twilight: string, can be "civil", "nautical" or "astronomical", corresponding to Sun elevation of -6, -12 or -18 degree from the horizon, respectively.
+        :param nhours: integer, number of times you want in the array
+
+        :return: Astropy Time object of nhours times, regularly spaced between twilights.
         """
         logger.debug("Determining night hours...")
         sunrise, sunset = self.get_twilights(obs_night, twilight)
@@ -297,9 +540,8 @@ class Meteo:
         sunrise_time = Time('%i-%02i-%02i %i:%i:%.03f' % sunrise, format='iso', scale='utc').mjd
     
         mjds = np.linspace(sunset_time, sunrise_time, num=nhours)
-        times = [Time(mjd, format='mjd', scale='utc') for mjd in mjds]
     
-        return times
+        return Time(mjds, format='mjd', scale='utc')
     
     def get_twilights(self, obs_night, twilight="nautical"):
         """
@@ -342,3 +584,133 @@ class Meteo:
         return sunrise, sunset
 
 #todo: generalize get_sun and get_moon into a single get_distance_to_obj function.
+
+
+def get_observer(lat, lon, elev, obs_time=None):
+    """
+    Creates an ephem Observer at a given location, see :meth:`~meteo.Meteo.get_observer`
+
+    :param lat: Astropy Angle object, latitude of the site
+    :param lon: Astropy Angle object, longitude of the site
+    :param elev: float, elevation of the site in meters
+    :param obs_time: Astropy Time object. If None, the date of the observer is not set.
+    :return: ephem Observer
+    """
+    observer = ephem.Observer()
+    if obs_time is not None:
+        observer.date = obs_time.iso
+    observer.lat = str(lat.degree)
+    observer.lon = str(lon.degree)
+    observer.elevation = elev
+    return observer
+
+
+def get_AzAlt_array(lat, lon, alphas, deltas, obs_times, ref_dir=0, outer=True):
+    """
+    Azimuths and altitudes of targets seen from a given location, see :meth:`~meteo.Meteo.get_AzAlt_array`
+
+    :param lat: Astropy Angle object, latitude of the site
+    :param lon: Astropy Angle object, longitude of the site
+    :param alphas: float or numpy array, right ascensions in radians
+    :param deltas: float or numpy array, declinations in radians
+    :param obs_times: Astropy Time object, scalar or array
+    :param ref_dir: float, zero point of the azimuth in degrees. Default is 0, corresponding to North.
+    :param outer: boolean. If False, alphas, deltas and obs_times are broadcasted against each other element-wise instead of giving a targets x times output.
+    :return: azimuths and altitudes in radians, as numpy arrays
+    """
+    alphas = np.asarray(alphas, dtype=np.float64)
+    deltas = np.asarray(deltas, dtype=np.float64)
+    D = np.asarray(obs_times.jd) - 2451545.0
+    if outer and D.ndim > 0 and alphas.ndim > 0:
+        alphas = alphas[..., np.newaxis]
+        deltas = deltas[..., np.newaxis]
+
+    lat, lon = lat.radian, lon.degree
+
+    GMST = 18.697374558 + 24.06570982441908*D
+    epsilon = np.deg2rad(23.4393 - 0.0000004*D)
+    eqeq = -0.000319*np.sin(np.deg2rad(125.04 - 0.052954*D)) - 0.000024*np.sin(2.*np.deg2rad(280.47 + 0.98565*D))*np.cos(epsilon)
+    GAST = GMST + eqeq
+    GAST -= np.floor(GAST/24.)*24.
+
+    # no need to wrap the hour angle, it only goes through sin and cos
+    LHA = np.deg2rad((GAST - np.rad2deg(alphas)/15.)*15. + lon)
+
+    Alt = np.arcsin(np.cos(LHA)*np.cos(deltas)*np.cos(lat) + np.sin(deltas)*np.sin(lat))
+
+    num = -np.sin(LHA)
+    den = np.tan(deltas)*np.cos(lat) - np.sin(lat)*np.cos(LHA)
+    Az = np.arctan2(num, den) - np.deg2rad(ref_dir)
+    Az = np.where(Az < 0, Az + 2.*np.pi, Az)
+
+    return Az, Alt
+
+
+class EphemerisTable:
+    """
+    Sun and Moon coordinates precomputed with ephem on a regular time grid, typically a whole night with one point per minute.
+
+    Queries interpolate the right ascension, declination and moon phase linearly in time, then compute the altitude and azimuth of the interpolated coordinates with :func:`~meteo.get_AzAlt_array`. This is much cheaper than :meth:`~meteo.Meteo.get_moon` and :meth:`~meteo.Meteo.get_sun` when many times are needed.
+
+    The table only keeps the coordinates of the site, not the :class:`~meteo.Meteo` it was computed for, so that the cached tables do not hold the weather and all-sky data of that Meteo.
+    """
+    def __init__(self, lat, lon, elev, start, stop, step=1.):
+        """
+        :param lat: Astropy Angle object, latitude of the telescope
+        :param lon: Astropy Angle object, longitude of the telescope
+        :param elev: float, elevation of the telescope in meters
+        :param start: Astropy Time object, beginning of the table
+        :param stop: Astropy Time object, end of the table
+        :param step: float, time step in minutes
+        """
+        logger.debug("Computing Sun and Moon ephemerides from {} to {}...".format(start.iso, stop.iso))
+        self.lat, self.lon, self.elev = lat, lon, elev
+        self.mjds = np.arange(start.mjd, stop.mjd + step / 1440., step / 1440.)
+
+        observer = get_observer(lat, lon, elev)
+        sun = ephem.Sun()
+        moon = ephem.Moon()
+
+        coords = np.empty((5, len(self.mjds)))
+        for i, mjd in enumerate(self.mjds):
+            observer.date = ephem.Date(mjd - 15019.5)  # ephem dates are Dublin Julian days
+            sun.compute(observer)
+            moon.compute(observer)
+            coords[:, i] = sun.ra, sun.dec, moon.ra, moon.dec, moon.phase
+
+        # unwrap the right ascensions so that the interpolation does not jump at 2 pi
+        self.sunra = np.unwrap(coords[0])
+        self.sundec = coords[1]
+        self.moonra = np.unwrap(coords[2])
+        self.moondec = coords[3]
+        self.moonphase = coords[4]
+
+        times = Time(self.mjds, format='mjd', scale='utc')
+        self.sunaz, self.sunalt = get_AzAlt_array(lat, lon, self.sunra, self.sundec, times, outer=False)
+        self.moonaz, self.moonalt = get_AzAlt_array(lat, lon, self.moonra, self.moondec, times, outer=False)
+
+    def covers(self, obs_time):
+        """
+        :param obs_time: Astropy Time object, scalar or array
+        :return: True if all the times are within the table
+        """
+        mjd = obs_time.mjd
+        return bool(np.all(mjd >= self.mjds[0]) and np.all(mjd <= self.mjds[-1]))
+
+    def get(self, obs_time):
+        """
+        Interpolates the table at the given time(s)
+
+        :param obs_time: Astropy Time object, scalar or array, within the table
+        :return: dictionary of floats or numpy arrays: sunra, sundec, sunalt, sunaz, moonra, moondec, moonalt, moonaz in radians and moonphase in percent
+        """
+        mjd = obs_time.mjd
+        res = {}
+        for key in ["sunra", "sundec", "moonra", "moondec", "moonphase"]:
+            res[key] = np.interp(mjd, self.mjds, getattr(self, key))
+        res["sunra"] = np.mod(res["sunra"], 2. * np.pi)
+        res["moonra"] = np.mod(res["moonra"], 2. * np.pi)
+
+        res["sunaz"], res["sunalt"] = get_AzAlt_array(self.lat, self.lon, res["sunra"], res["sundec"], obs_time, outer=False)
+        res["moonaz"], res["moonalt"] = get_AzAlt_array(self.lat, self.lon, res["moonra"], res["moondec"], obs_time, outer=False)
+        return res
@@ -0,0 +1,189 @@
+"""
+Short-term prediction of the cloud maps, from the motion of the clouds between the successive maps
+
+:func:`~nowcast.motion_field` cuts the previous observability map in square blocks and finds the displacement of each block in the current map by template matching, computed with FFTs for all the blocks at once. The blocks without enough structure (a clear or uniformly cloudy sky) or sky pixels take the median motion of the others. :func:`~nowcast.advect` then moves the latest map along this motion field to predict the map a few minutes later.
+
+The motion is measured in image pixels: the distortion of the all-sky lens is neglected at the scale of a block.
+"""
+
+import numpy as np
+import scipy.ndimage as ndimage
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def _blocks(image, blocksize):
+	"""
+	:return: array of shape (nblocks, blocksize, blocksize) of the complete blocks of an image, row by row
+	"""
+	gy, gx = image.shape[0] // blocksize, image.shape[1] // blocksize
+	image = image[:gy * blocksize, :gx * blocksize]
+	return image.reshape(gy, blocksize, gx, blocksize).transpose(0, 2, 1, 3).reshape(gy * gx, blocksize, blocksize)
+
+
+def _peak(values):
+	"""
+	:return: sub-pixel offset of the maximum of three values, with a parabola
+	"""
+	with np.errstate(invalid='ignore', divide='ignore'):
+		denominator = values[0] - 2. * values[1] + values[2]
+		offset = np.where(denominator < 0, 0.5 * (values[0] - values[2]) / denominator, 0.)
+	return np.clip(offset, -0.5, 0.5)
+
+
+def motion_field(previous, current, blocksize=64, maxshift=16, minvalid=0.5, minstd=0.05):
+	"""
+	Displacement of the clouds between two maps, block by block
+
+	Each block of the previous map is compared to the current map shifted by up to maxshift px, and the displacement is the shift with the smallest mean squared difference over the sky pixels. The differences of all the shifts of all the blocks are computed at once with FFTs.
+
+	:param previous: observability map, NaN on the masked pixels
+	:param current: observability map of the same shape, a few minutes later
+	:param blocksize: size of the square blocks, in px
+	:param maxshift: largest displacement searched, in px
+	:param minvalid: minimal fraction of sky pixels of a block in both maps
+	:param minstd: minimal standard deviation of the observability in a block in both maps
+
+	:return: arrays of the displacements along the rows and the columns, of shape (rows // blocksize, columns // blocksize), and boolean array of the blocks where it was measured
+	"""
+	gy, gx = current.shape[0] // blocksize, current.shape[1] // blocksize
+	p = _blocks(previous, blocksize)
+	pvalid = ~np.isnan(p)
+	cvalid = ~np.isnan(_blocks(current, blocksize))
+	fraction = (pvalid & cvalid).mean(axis=(1, 2))
+	with np.errstate(invalid='ignore'):
+		measured = (fraction >= minvalid) & (np.nanstd(p, axis=(1, 2)) >= minstd) & (np.nanstd(_blocks(current, blocksize), axis=(1, 2)) >= minstd)
+
+	# search areas of the current map around each block, NaN outside of the map
+	size = blocksize + 2 * maxshift
+	padded = np.pad(current[:gy * blocksize, :gx * blocksize].astype(np.float64), maxshift, mode="constant", constant_values=np.nan)
+	rows = (np.arange(gy) * blocksize)[:, np.newaxis] + np.arange(size)
+	cols = (np.arange(gx) * blocksize)[:, np.newaxis] + np.arange(size)
+	areas = padded[rows[:, np.newaxis, :, np.newaxis], cols[np.newaxis, :, np.newaxis, :]].reshape(gy * gx, size, size)
+	avalid = ~np.isnan(areas)
+	areas = np.where(avalid, areas, 0.)
+	p = np.where(pvalid, p, 0.)
+
+	# correlations r[j] = sum_x t(x) a(x + j), without wrapping for the shifts j <= 2 * maxshift
+	def spectrum(a):
+		return np.fft.rfft2(a, s=(size, size))
+	def correlation(spectra):
+		return np.fft.irfft2(spectra, s=(size, size))[:, :2 * maxshift + 1, :2 * maxshift + 1]
+	fw = spectrum(avalid.astype(np.float64))
+	tw = np.conj(spectrum(pvalid.astype(np.float64)))
+	count = correlation(tw * fw)
+	squares = correlation(np.conj(spectrum(p ** 2)) * fw - 2. * np.conj(spectrum(p)) * spectrum(areas) + tw * spectrum(areas ** 2))
+	with np.errstate(invalid='ignore', divide='ignore'):
+		msd = np.where(count >= minvalid * blocksize ** 2 - 0.5, squares / count, np.inf)
+
+	n = 2 * maxshift + 1
+	imin = np.argmin(msd.reshape(len(msd), -1), axis=1)
+	iy, ix = imin // n, imin % n
+	# the minimum on the border of the searched area is not a minimum
+	measured &= (iy > 0) & (iy < n - 1) & (ix > 0) & (ix < n - 1)
+	iy, ix = np.clip(iy, 1, n - 2), np.clip(ix, 1, n - 2)
+	k = np.arange(len(msd))
+	dy = iy - maxshift + _peak([-msd[k, iy - 1, ix], -msd[k, iy, ix], -msd[k, iy + 1, ix]])
+	dx = ix - maxshift + _peak([-msd[k, iy, ix - 1], -msd[k, iy, ix], -msd[k, iy, ix + 1]])
+	measured &= np.isfinite(dy) & np.isfinite(dx)
+
+	dy = np.where(measured, dy, np.nan).reshape(gy, gx)
+	dx = np.where(measured, dx, np.nan).reshape(gy, gx)
+	return dy, dx, measured.reshape(gy, gx)
+
+
+def regularise(dy, dx, measured):
+	"""
+	Fills the blocks without measurement with the median displacement, and removes the outliers with a median filter
+
+	:return: arrays of the displacements, zero everywhere if no block was measured
+	"""
+	if not np.any(measured):
+		return np.zeros_like(dy), np.zeros_like(dx)
+	dy = np.where(measured, dy, np.median(dy[measured]))
+	dx = np.where(measured, dx, np.median(dx[measured]))
+	return ndimage.median_filter(dy, size=3, mode="nearest"), ndimage.median_filter(dx, size=3, mode="nearest")
+
+
+def advect(current, dy, dx, blocksize):
+	"""
+	Moves a map along a displacement field
+
+	:param current: observability map, NaN on the masked pixels
+	:param dy: displacements along the rows of the blocks, in px, see :func:`~nowcast.motion_field`
+	:param dx: displacements along the columns of the blocks, in px
+	:param blocksize: size of the blocks, in px
+
+	:return: map of the same shape. The pixels coming from outside of the sky keep their current value, and the masked pixels stay NaN.
+	"""
+	rows, cols = np.mgrid[:current.shape[0], :current.shape[1]].astype(np.float64)
+	# coordinates of the pixels on the grid of the block centers
+	grid = [(rows + 0.5) / blocksize - 0.5, (cols + 0.5) / blocksize - 0.5]
+	rows -= ndimage.map_coordinates(dy, grid, order=1, mode="nearest")
+	cols -= ndimage.map_coordinates(dx, grid, order=1, mode="nearest")
+
+	valid = ~np.isnan(current)
+	values = ndimage.map_coordinates(np.where(valid, current, 0.), [rows, cols], order=1, mode="constant", cval=0.)
+	weights = ndimage.map_coordinates(valid.astype(np.float64), [rows, cols], order=1, mode="constant", cval=0.)
+	with np.errstate(invalid='ignore', divide='ignore'):
+		predicted = np.where(weights > 0.5, values / weights, current)
+	predicted[~valid] = np.nan
+	return predicted.astype(current.dtype)
+
+
+class Nowcaster:
+	"""
+	Keeps the latest observability maps and predicts the next ones
+	"""
+	def __init__(self, blocksize=64, maxshift=16, maxtime=30., maxgap=10.):
+		"""
+		:param blocksize: size of the blocks, in px
+		:param maxshift: largest displacement between two maps, in px
+		:param maxtime: predictions further in the future than this, in minutes, are made at this time
+		:param maxgap: no motion is measured between maps further apart than this, in minutes
+		"""
+		self.blocksize = blocksize
+		self.maxshift = maxshift
+		self.maxtime = maxtime
+		self.maxgap = maxgap
+		self.time = None
+		self.map = None
+		self.velocity = None
+		self._prediction = (None, None)
+
+	def add(self, time, observability):
+		"""
+		Adds the latest map, and measures the motion since the previous one
+
+		:param time: Astropy Time object of the map
+		:param observability: map of shape (rows, columns), NaN on the masked pixels
+		"""
+		velocity = None
+		if self.map is not None and self.map.shape == observability.shape:
+			minutes = (time - self.time).to_value("min")
+			if 0 < minutes <= self.maxgap:
+				dy, dx, measured = motion_field(self.map, observability, self.blocksize, self.maxshift)
+				logger.debug("Cloud motion measured in {} of {} blocks".format(measured.sum(), measured.size))
+				dy, dx = regularise(dy, dx, measured)
+				velocity = (dy / minutes, dx / minutes)
+		self.time = time
+		self.map = observability
+		self.velocity = velocity
+		self._prediction = (None, None)
+
+	def predict(self, time):
+		"""
+		:param time: Astropy Time object
+		:return: predicted map of shape (rows, columns), or None if time is not after the latest map or if the motion is unknown
+		"""
+		if self.map is None or self.velocity is None:
+			return None
+		minutes = min((time - self.time).to_value("min"), self.maxtime)
+		if minutes <= 0:
+			return None
+		# one prediction per tenth of a minute
+		key = round(minutes, 1)
+		if self._prediction[0] != key:
+			self._prediction = (key, advect(self.map, self.velocity[0] * key, self.velocity[1] * key, self.blocksize))
+		return self._prediction[1]
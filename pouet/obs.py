@@ -4,21 +4,20 @@ Define the Observable class, the standard object of pouet, and related functions
 
 from numpy import cos, rad2deg, isnan, arange
 import numpy as np
-import os, sys, inspect
+import os, sys
 import copy as pythoncopy
 from astropy.time import Time
 from astropy import units as u
 from astropy.coordinates import angles, angle_utilities, SkyCoord
 import astropy.table
 import importlib
-import util
+import util, batch, resources
 
 import logging
 logger = logging.getLogger(__name__)
 
 global SETTINGS
-herepath = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
-SETTINGS = util.readconfig(os.path.join(herepath, "config/settings.cfg"))
+SETTINGS = resources.settings()
 
 
 class Observable:
@@ -164,9 +163,9 @@ class Observable:
 		"""
 		if SETTINGS["misc"]["singletargetlogs"] == "True":
 			logger.debug("Computing Altitude and Azimuth for {}...".format(self.name))
-		azimuth, altitude = meteo.get_AzAlt(self.alpha, self.delta, obs_time=meteo.time)
-		self.altitude = altitude
-		self.azimuth = azimuth
+		azimuth, altitude = meteo.get_AzAlt_array(self.alpha.radian, self.delta.radian, obs_times=meteo.time)
+		self.altitude = angles.Angle(altitude, unit="radian")
+		self.azimuth = angles.Angle(azimuth, unit="radian")
 
 	def compute_airmass(self, meteo):
 		"""
@@ -197,25 +196,20 @@ class Observable:
 		ERROR_CONN = 2.
 		ERROR_COMPUTE = 3.
 
-		xpix, ypix = meteo.allsky.station.get_image_coordinates(self.azimuth.value, self.altitude.value)
-		
-		if meteo.cloudmap is None:
+		cloudmap = meteo.get_cloudmap()
+		if cloudmap is None:
 			self.cloudfree = ERROR_CONN
 			if SETTINGS["misc"]["singletargetlogs"] == "True":
 				logger.warning("No cloud map in meteo object")
 			return
-		
-		try:
-			xpix = int(np.round(xpix))
-			ypix = int(np.round(ypix))
-		except ValueError:
+
+		# indices in the map, invalid if outside of the image
+		xpix, ypix, valid = meteo.allsky.pixelmap.pixels(self.azimuth.value, self.altitude.value, shape=np.shape(cloudmap))
+
+		if valid[0]:
+			self.cloudfree = np.round(cloudmap[xpix[0], ypix[0]], 3) # Otherwise some 1.0000002 errors arise...
+		else:
 			self.cloudfree = ERROR_COMPUTE
-		
-		if self.cloudfree != ERROR_COMPUTE:
-			try:
-				self.cloudfree = np.round(meteo.cloudmap[xpix, ypix], 3) # Otherwise some 1.0000002 errors arise...
-			except IndexError:
-				self.cloudfree = ERROR_COMPUTE
 
 		if self.cloudfree == ERROR_COMPUTE:
 			if SETTINGS["misc"]["singletargetlogs"] == "True":
@@ -258,7 +252,7 @@ class Observable:
 		self.update(meteo=meteo)
 		observability = 1  # by default, we can observe
 
-		if np.abs(meteo.time - Time.now()).to(u.s).value / 60. > cwvalidity: future=True
+		if np.abs(meteo.time - meteo.now()).to(u.s).value / 60. > cwvalidity: future=True
 
 		# Let's start with a simple yes/no version
 		# We add a small message to display if it's impossible to observe:
@@ -295,16 +289,17 @@ class Observable:
 		# check the wind:
 		self.obs_wind, self.obs_wind_info = True, True
 		if not future:
-			if meteo.windspeed > 0. and meteo.windspeed < 100. and self.angletowind is not None:
-				if self.angletowind.degree < 90 and meteo.windspeed >= float(meteo.location.get("weather", "windWarnLevel")):
+			windspeed = meteo.get_windspeed()
+			if windspeed > 0. and windspeed < 100. and self.angletowind is not None:
+				if self.angletowind.degree < 90 and windspeed >= float(meteo.location.get("weather", "windWarnLevel")):
 					self.obs_wind = False
 					observability = 0
-					msg += '\nWA:%0.1f/WS:%0.1f' % (self.angletowind.degree, meteo.windspeed)
+					msg += '\nWA:%0.1f/WS:%0.1f' % (self.angletowind.degree, windspeed)
 
-				if meteo.windspeed >= float(meteo.location.get("weather", "windLimitLevel")):
+				if windspeed >= float(meteo.location.get("weather", "windLimitLevel")):
 					self.obs_wind = False
 					observability = 0
-					msg += '\nWS:%s' % meteo.windspeed
+					msg += '\nWS:%s' % windspeed
 			else:
 				self.obs_wind_info = False
 				warnings += '\nNo wind info'
@@ -374,6 +369,276 @@ class Observable:
 		self.observability = observability
 
 
+class _Column:
+	"""
+	Descriptor mapping an attribute of an :class:`~obs.ObservableView` to a row of a :class:`~obs.Catalogue` column
+
+	Angles are stored as floats in the column (in the unit given by kind) and handed out as Astropy Angle objects. A NaN value means "not computed yet" and raises an AttributeError, like a missing attribute of an :class:`~obs.Observable` would.
+	"""
+	def __init__(self, column, kind=None, nanvalue=AttributeError):
+		"""
+		:param column: name of the column in the catalogue
+		:param kind: None for plain values, or "hour", "degree", "radian" for Angle columns
+		:param nanvalue: what to return if the value is NaN. By default, raises an AttributeError
+		"""
+		self.column = column
+		self.kind = kind
+		self.nanvalue = nanvalue
+
+	def __get__(self, view, owner):
+		if view is None:
+			return self
+		value = getattr(view._catalogue, self.column)[view._row]
+		if isinstance(value, np.generic):
+			value = value.item()
+		if isinstance(value, float) and isnan(value):
+			if self.nanvalue is AttributeError:
+				raise AttributeError("{} has no {} yet".format(view.name, self.column))
+			return self.nanvalue
+		if self.kind is not None:
+			return angles.Angle(value, unit=self.kind)
+		return value
+
+	def __set__(self, view, value):
+		if self.kind is not None:
+			if value is None:
+				value = np.nan
+			elif isinstance(value, u.Quantity):
+				value = value.to_value(u.hourangle if self.kind == "hour" else self.kind)
+		getattr(view._catalogue, self.column)[view._row] = value
+
+
+class ObservableView(Observable):
+	"""
+	Lightweight :class:`~obs.Observable` backed by a row of a :class:`~obs.Catalogue`
+
+	All the methods of an Observable work on a view; reading or setting the coordinates, constraints, results and hidden flag reads or writes the catalogue columns. Other attributes set on a view are not stored in the catalogue.
+	"""
+	name = _Column("names")
+	obsprogram = _Column("obsprograms")
+	program = _Column("programs")
+	attributes = _Column("attributes")
+	alpha = _Column("alpha", "hour")
+	delta = _Column("delta", "degree")
+	minangletomoon = _Column("minangletomoon")
+	maxairmass = _Column("maxairmass")
+	exptime = _Column("exptime")
+	hidden = _Column("hidden")
+
+	altitude = _Column("altitude", "radian")
+	azimuth = _Column("azimuth", "radian")
+	angletomoon = _Column("angletomoon", "radian")
+	angletosun = _Column("angletosun", "radian")
+	angletowind = _Column("angletowind", "radian", nanvalue=None)
+	airmass = _Column("airmass")
+	observability = _Column("observability")
+	cloudfree = _Column("cloudfree", nanvalue=None)
+	cloudcover = _Column("cloudcover")
+
+	obs_moondist = _Column("obs_moondist")
+	obs_highairmass = _Column("obs_highairmass")
+	obs_airmass = _Column("obs_airmass")
+	obs_wind = _Column("obs_wind")
+	obs_wind_info = _Column("obs_wind_info")
+	obs_clouds = _Column("obs_clouds")
+	obs_clouds_info = _Column("obs_clouds_info")
+
+	def __init__(self, catalogue, row):
+		"""
+		:param catalogue: the :class:`~obs.Catalogue` holding the data
+		:param row: integer, row of the observable in the catalogue
+		"""
+		self._catalogue = catalogue
+		self._row = row
+
+	def copy(self):
+		"""
+		:return: a standalone :class:`~obs.Observable` with the same values as the view
+		"""
+		observable = Observable(name=self.name, obsprogram=None, attributes=pythoncopy.deepcopy(self.attributes), alpha=self.alpha.hour, delta=self.delta.degree, minangletomoon=self.minangletomoon, maxairmass=self.maxairmass, exptime=self.exptime)
+		observable.obsprogram = self.obsprogram
+		observable.program = self.program
+		observable.hidden = self.hidden
+		return observable
+
+
+class Catalogue:
+	"""
+	Columnar container of observables
+
+	The coordinates, constraints and results of the observability computation of all the targets are stored in numpy arrays, one row per target. Lookups by name go through a dictionary, and the observability of the whole catalogue is computed at once with :meth:`~batch.compute_observability`.
+
+	Iterating over a catalogue, or indexing it by name or row, returns :class:`~obs.ObservableView` objects that behave like :class:`~obs.Observable`.
+	"""
+
+	_floatcolumns = ["alpha", "delta", "minangletomoon", "maxairmass", "exptime", "altitude", "azimuth", "angletomoon", "angletosun", "angletowind", "airmass", "observability", "cloudfree", "cloudcover"]
+	_boolcolumns = ["hidden", "obs_moondist", "obs_highairmass", "obs_airmass", "obs_wind", "obs_wind_info", "obs_clouds", "obs_clouds_info"]
+	_listcolumns = ["names", "obsprograms", "programs", "attributes"]
+
+	def __init__(self, observables=None):
+		"""
+		:param observables: list of :class:`~obs.Observable` to store in the catalogue
+		"""
+		for col in self._floatcolumns:
+			setattr(self, col, np.empty(0, dtype=np.float64))
+		for col in self._boolcolumns:
+			setattr(self, col, np.empty(0, dtype=bool))
+		for col in self._listcolumns:
+			setattr(self, col, [])
+		self.index = {}
+
+		if observables is not None:
+			self.extend(observables)
+
+	def __len__(self):
+		return len(self.names)
+
+	def __contains__(self, name):
+		return name in self.index
+
+	def __iter__(self):
+		for row in range(len(self)):
+			yield ObservableView(self, row)
+
+	def __getitem__(self, key):
+		"""
+		:param key: name of the observable, or integer row
+		:return: :class:`~obs.ObservableView`
+		"""
+		if isinstance(key, str):
+			return ObservableView(self, self.index[key])
+		if key < 0:
+			key += len(self)
+		if not 0 <= key < len(self):
+			raise IndexError("Catalogue index out of range")
+		return ObservableView(self, key)
+
+	def find(self, name):
+		"""
+		:param name: string, name of the observable
+		:return: row of the observable in the catalogue
+		"""
+		return self.index[name]
+
+	def rows(self, names):
+		"""
+		:param names: list of names of observables
+		:return: numpy array of their rows in the catalogue
+		"""
+		return np.array([self.index[n] for n in names], dtype=int)
+
+	def append(self, observable):
+		"""
+		Adds an observable at the end of the catalogue
+
+		:param observable: :class:`~obs.Observable`
+		"""
+		self.extend([observable])
+
+	def extend(self, observables):
+		"""
+		Adds a list of observables at the end of the catalogue
+
+		:param observables: list of :class:`~obs.Observable`
+
+		.. note:: names must be unique, a ValueError is raised otherwise.
+		"""
+		observables = list(observables)
+		names = [o.name for o in observables]
+		if len(set(names)) != len(names) or any(n in self.index for n in names):
+			raise ValueError("Names in a catalogue must be unique")
+
+		n = len(observables)
+		nan = np.ones(n) * np.nan
+
+		def get(attr):
+			return np.array([getattr(o, attr, np.nan) for o in observables], dtype=np.float64)
+
+		values = {
+			"alpha": np.array([o.alpha.hour for o in observables], dtype=np.float64),
+			"delta": np.array([o.delta.degree for o in observables], dtype=np.float64),
+			"minangletomoon": get("minangletomoon"),
+			"maxairmass": get("maxairmass"),
+			"exptime": get("exptime"),
+			"hidden": np.array([o.hidden for o in observables], dtype=bool),
+		}
+		for col in self._floatcolumns:
+			if col not in values:
+				values[col] = nan
+		for col in self._boolcolumns:
+			if col not in values:
+				values[col] = np.ones(n, dtype=bool)
+
+		for col, value in values.items():
+			setattr(self, col, np.concatenate([getattr(self, col), value]))
+
+		for row, o in enumerate(observables, start=len(self)):
+			self.index[o.name] = row
+		self.names += names
+		self.obsprograms += [o.obsprogram for o in observables]
+		self.programs += [getattr(o, "program", None) for o in observables]
+		self.attributes += [o.attributes for o in observables]
+
+	def visible(self):
+		"""
+		:return: numpy array of the rows of the observables that are not hidden
+		"""
+		return np.where(~self.hidden)[0]
+
+	def hide(self, rows):
+		"""
+		Hides the observables
+
+		:param rows: row indexes or boolean mask of the observables to hide
+		"""
+		self.hidden[rows] = True
+
+	def unhide(self):
+		"""
+		Sets the hidden flag of all the observables to False
+		"""
+		self.hidden[:] = False
+
+	def update(self, meteo, cwvalidity=30, cloudscheck=True, future=False, rows=None):
+		"""
+		Computes the observability of the non-hidden observables in one vectorized pass and stores the results in the columns, see :meth:`~batch.compute_observability`.
+
+		:param meteo: a Meteo object, whose time attribute has been actualized beforehand
+		:param cwvalidity: float, current weather validity in minutes, see :meth:`~obs.Observable.compute_observability`
+		:param cloudscheck: boolean, if set to True then use the cloud coverage in the observability computation.
+		:param future: boolean, if set to True then cloud coverage and wind are note taken into account in the observability.
+		:param rows: rows of the observables to update. If None, update all the non-hidden ones.
+		"""
+		if rows is None:
+			rows = self.visible()
+		else:
+			rows = np.asarray(rows, dtype=int)
+			rows = rows[~self.hidden[rows]]
+		if len(rows) == 0:
+			return
+
+		res = batch.compute_observability(meteo, np.deg2rad(self.alpha[rows] * 15.), np.deg2rad(self.delta[rows]), self.minangletomoon[rows], self.maxairmass[rows], cwvalidity=cwvalidity, cloudscheck=cloudscheck, future=future)
+
+		for col in ["altitude", "azimuth", "angletomoon", "angletosun", "angletowind", "airmass", "observability"] + self._boolcolumns[1:]:
+			getattr(self, col)[rows] = res[col]
+
+		computed = ~np.isnan(res["cloudfree"])
+		self.cloudfree[rows[computed]] = res["cloudfree"][computed]
+		valid = computed & (res["cloudfree"] != batch.ERROR_CONN) & (res["cloudfree"] != batch.ERROR_COMPUTE)
+		self.cloudcover[rows[valid]] = 1. - np.floor(res["cloudfree"][valid] * 10.) / 10.
+
+		# program-specific conditions are python functions, so they are called one target at a time
+		for row in rows:
+			program = self.programs[row]
+			if program is None:
+				continue
+			pobs, _, _ = program.observability(self.attributes[row], meteo.time)
+			if pobs == 0:
+				self.observability[row] = 0
+
+		logger.debug("Observability of {} targets of the catalogue computed".format(len(rows)))
+
+
 def showstatus(observables, meteo, displayall=True, cloudscheck=True):
 	"""
 	print the observability of a list of observables according to a given meteo.
@@ -0,0 +1,148 @@
+"""
+Lookup tables between the pixels of the all-sky images and the sky, built once per station
+
+A :class:`~pixelmap.PixelMap` holds the static mask of the station (see the `get_mask` method of the station AllSky class) and the azimuth and elevation of every pixel. It is built from the station calibration `params`, saved next to the station config file and reused by all the image loads, until the `params` change.
+
+The direction from the sky to the pixels is given by the `get_image_coordinates` method of the station, which works on arrays: :meth:`~pixelmap.PixelMap.pixels` rounds its output to the indices of the cloud map, so that the cloud coverage of many targets is read in one indexing operation.
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+
+import resources
+
+import logging
+logger = logging.getLogger(__name__)
+
+_pixelmaps = {}
+
+
+class PixelMap:
+	"""
+	Pixel to (azimuth, elevation) table and mask of the all-sky images of a station
+	"""
+	def __init__(self, station, mask, az, alt, checksum):
+		"""
+		:param station: AllSky object of the station, see the station config files
+		:param mask: boolean array of shape (ny, nx), True on the pixels hidden by :meth:`get_mask`
+		:param az: float array of shape (ny, nx), azimuth of each pixel in radians
+		:param alt: float array of shape (ny, nx), elevation of each pixel in radians
+		:param checksum: string, see :func:`~pixelmap.checksum`
+		"""
+		self.station = station
+		self.mask = mask
+		self.az = az
+		self.alt = alt
+		self.checksum = checksum
+
+	@property
+	def shape(self):
+		return self.mask.shape
+
+	@classmethod
+	def build(cls, station):
+		"""
+		Computes the tables from the station parameters
+
+		:param station: AllSky object of the station
+		"""
+		shape = (station.params["image_y_size"], station.params["image_x_size"])
+		logger.debug("Building the pixel map of a {}x{} all-sky...".format(shape[1], shape[0]))
+		y, x = np.mgrid[:shape[0], :shape[1]]
+		az, alt = station.get_sky_coordinates(x, y)
+		mask = np.asarray(station.get_mask(np.empty(shape)), dtype=bool)
+		return cls(station, mask, az.astype(np.float32), alt.astype(np.float32), checksum(station))
+
+	def get_mask(self, ar):
+		"""
+		Mask of an image, from the table if the image has the expected size
+
+		:param ar: image
+		:return: boolean array, True on the pixels to hide
+		"""
+		if np.shape(ar)[:2] == self.shape:
+			return self.mask
+		logger.warning("All-sky image of shape {} instead of {}, recomputing the mask".format(np.shape(ar), self.shape))
+		return self.station.get_mask(ar)
+
+	def pixels(self, az, alt, shape=None):
+		"""
+		Indices of the pixels in the direction of targets, in the (x, y) order of the cloud maps
+
+		:param az: array of azimuths in radians
+		:param alt: array of elevations in radians
+		:param shape: (nx, ny) shape of the map to index. If None, the transposed image shape.
+
+		:return: integer arrays of the x and y indices and boolean array of the valid positions. The indices of invalid positions are 0.
+		"""
+		if shape is None:
+			shape = self.shape[::-1]
+		x, y = self.station.get_image_coordinates(np.asarray(az, dtype=np.float64), np.asarray(alt, dtype=np.float64))
+		x = np.round(np.atleast_1d(x))
+		y = np.round(np.atleast_1d(y))
+		valid = np.isfinite(x) & np.isfinite(y)
+		valid[valid] = (x[valid] < shape[0]) & (y[valid] < shape[1])
+		xi = np.where(valid, x, 0).astype(int)
+		yi = np.where(valid, y, 0).astype(int)
+		return xi, yi, valid
+
+	def save(self, filepath):
+		np.savez(filepath, mask=self.mask, az=self.az, alt=self.alt, checksum=self.checksum)
+
+
+def checksum(station):
+	"""
+	:param station: AllSky object of the station
+	:return: string identifying the calibration parameters and the class of the station
+	"""
+	params = json.dumps(station.params, sort_keys=True, default=str)
+	description = "{}.{}:{}".format(type(station).__module__, type(station).__name__, params)
+	return hashlib.sha1(description.encode("utf-8")).hexdigest()
+
+
+def filepath(name):
+	"""
+	:param name: string, name of the station
+	:return: path of the saved tables, next to the station config
+	"""
+	return resources.path("config", "{}.pixelmap.npz".format(name))
+
+
+def load(name, station, persist=True):
+	"""
+	Returns the pixel map of a station, from memory, from disk, or built and saved if the parameters changed
+
+	:param name: string, name of the station
+	:param station: AllSky object of the station
+	:param persist: boolean, if True read and write the tables on disk
+
+	:return: :class:`~pixelmap.PixelMap`
+	"""
+	key = checksum(station)
+	if (name, key) in _pixelmaps:
+		return _pixelmaps[(name, key)]
+
+	pixelmap = None
+	fpath = filepath(name)
+	if persist and os.path.exists(fpath):
+		try:
+			with np.load(fpath) as data:
+				if str(data["checksum"]) == key:
+					pixelmap = PixelMap(station, data["mask"], data["az"], data["alt"], key)
+				else:
+					logger.info("Parameters of the {} all-sky changed, rebuilding the pixel map".format(name))
+		except (OSError, KeyError, ValueError) as e:
+			logger.warning("Could not read the pixel map {}: {}".format(fpath, e))
+
+	if pixelmap is None:
+		pixelmap = PixelMap.build(station)
+		if persist:
+			try:
+				pixelmap.save(fpath)
+			except OSError as e:
+				logger.warning("Could not save the pixel map {}: {}".format(fpath, e))
+
+	_pixelmaps[(name, key)] = pixelmap
+	return pixelmap
@@ -2,7 +2,6 @@ import matplotlib.pyplot as plt
 import matplotlib as mpl
 import astropy.units as u
 from astropy.time import Time
-from astropy.wcs import WCS
 import numpy as np
 import os, sys
 import urllib
@@ -10,7 +9,7 @@ import urllib
 import logging
 logger = logging.getLogger(__name__)
 
-import util
+import util, batch
 
 def plot_airmass_on_sky(target, meteo, ax=None):
 	"""
@@ -35,25 +34,13 @@ def plot_airmass_on_sky(target, meteo, ax=None):
 	plt.subplots_adjust(right=0.98)
 	plt.subplots_adjust(left=0.02)
 
-	airmasses = []
-	azimuths = []
-	altitudes = []
-	times = []
+	azimuths, altitudes = meteo.get_AzAlt_array(target.alpha.radian, target.delta.radian, obs_times=obs_times)
+	airmasses = util.elev2airmass(altitudes, meteo.elev)
 
-	for currenttime in obs_times:
-
-		azimuth, altitude = meteo.get_AzAlt(target.alpha, target.delta, obs_time=currenttime)
-
-		if altitude.degree > 0:
-			azimuths.append(azimuth.radian)
-			altitudes.append(90. - altitude.degree)
-			airmasses.append(util.elev2airmass(altitude.value, meteo.elev))
-			times.append(currenttime)
-		else:
-			azimuths.append(np.nan)
-			altitudes.append(np.nan)
-			airmasses.append(np.nan)
-			times.append(np.nan)
+	below = altitudes <= 0
+	altitudes = 90. - np.rad2deg(altitudes)
+	for arr in [azimuths, altitudes, airmasses]:
+		arr[below] = np.nan
 
 	# More axes set-up.
 	# Position of azimuth = 0 (data, not label).
@@ -125,22 +112,15 @@ def shownightobs(observable, meteo, obs_night=None, savefig=False, dirpath=None,
 		obs_night.format = 'iso'
 		obs_night = obs_night.value.split()[0]
 
-	# list of times between nautical twilights
-	times = meteo.get_nighthours(obs_night)
-
-	#mymeteo = pythoncopy.deepcopy(meteo) # as we don't want to affect the current meteo, we make a copy that we update with the time
-
-	mymeteo = meteo
-	obss = []
-	moonseps = []
-	airmasses = []
-	for time in times:
-		mymeteo.update(obs_time=time, minimal=True)
-		observable.compute_observability(meteo=mymeteo, displayall=True, cloudscheck=False, verbose=verbose)
-		observable.compute_airmass(mymeteo)
-		obss.append(observable.observability)
-		moonseps.append(observable.angletomoon.degree)
-		airmasses.append(observable.airmass)
+	# observability at regularly spaced times between nautical twilights, computed in one pass without touching the meteo
+	night = batch.night_observables([observable], meteo, obs_night)
+	times = list(night["times"])
+	obss = list(night["observability"][0])
+	moonseps = list(np.rad2deg(night["angletomoon"][0]))
+	airmasses = list(night["airmass"][0])
+	if verbose:
+		for time, o, moonsep, airmass in zip(times, obss, moonseps, airmasses):
+			print("%s | %s | observability=%.2f, moonsep=%.1f, airmass=%.2f" % (observable.name, time.iso, o, moonsep, airmass))
 
 	# create the x ticks labels every hour
 	Time('%s 05:00:00' % obs_night, format='iso', scale='utc')
@@ -254,6 +234,7 @@ def plot_target_on_sky(target, figure=None, northisup=True, eastisright=False, b
 	logger.debug("Retrieving finding chart for {}".format(target.name))
 	from astroquery.skyview import SkyView
 	from astropy.coordinates import SkyCoord
+	from astropy.wcs import WCS
 
 	skycoord = SkyCoord(target.alpha, target.delta)
 	position = skycoord.icrs
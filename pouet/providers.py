@@ -0,0 +1,171 @@
+"""
+Sources of the weather reports and all-sky images of a station
+
+A provider has two channels, `weather` and `allsky`, with the interface of :class:`~fetcher.Fetcher` (`url`, `fetch`, `content` and `close`), and a `now` method giving the time of the data. :class:`~meteo.Meteo` and :class:`~clouds.Clouds` read through a provider instead of the urls of the station modules when one is given.
+
+- :class:`~providers.LiveProvider` downloads from the urls of the station, like POUET without provider.
+- :class:`~providers.ReplayProvider` streams archived weather reports and all-sky frames, following the time of a :class:`~providers.ReplayClock`: in real time, accelerated, or frame by frame. The full refresh pipeline can then be load tested and benchmarked offline and reproducibly, without touching the servers of the station.
+"""
+
+import os
+import time
+
+import numpy as np
+from astropy.time import Time
+
+import fetcher, util, weatherparser
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class LiveProvider:
+	"""
+	Downloads the weather report and the all-sky image from the urls of the station
+	"""
+	def __init__(self, name, timeout=(5., 30.)):
+		"""
+		:param name: string, name of the station module, see :func:`~util.load_station`
+		:param timeout: tuple of floats, connect and read timeouts of the downloads in seconds
+		"""
+		station = util.load_station(name)
+		self.weather = fetcher.Fetcher(station.WeatherReport().url, timeout=timeout)
+		self.allsky = fetcher.Fetcher(station.AllSky().params['url'], timeout=timeout)
+
+	def now(self):
+		return Time.now()
+
+	def close(self):
+		self.weather.close()
+		self.allsky.close()
+
+
+class ReplayClock:
+	"""
+	Time of a replay, running from a start time at a given speed, or set by hand
+	"""
+	def __init__(self, start, speed=1.):
+		"""
+		:param start: float, unix time of the start of the replay
+		:param speed: float, replayed seconds per second, 0 to only move the clock with :meth:`set`
+		"""
+		self.speed = speed
+		self.set(start)
+
+	def set(self, t):
+		"""
+		:param t: float, unix time of the replay from now on
+		"""
+		self.origin = t
+		self.wall = time.time()
+
+	def unix(self):
+		"""
+		:return: float, unix time of the replay
+		"""
+		return self.origin + (time.time() - self.wall) * self.speed
+
+
+class ReplayChannel:
+	"""
+	Replays frames, with the interface of :class:`~fetcher.Fetcher`: :meth:`fetch` gives the latest frame at the time of the clock
+	"""
+	def __init__(self, name, times, frames, clock):
+		"""
+		:param name: string, shown as the url of the channel
+		:param times: array of unix times of the frames, sorted
+		:param frames: list of the frames, bytes or paths of files
+		:param clock: :class:`~providers.ReplayClock`
+		"""
+		self.url = "replay:{}".format(name)
+		self.times = np.asarray(times, dtype=np.float64)
+		self.frames = frames
+		self.clock = clock
+		self.index = -1
+		self.content = None
+
+	def __len__(self):
+		return len(self.frames)
+
+	def fetch(self):
+		"""
+		:return: NEW, with the frame in the content attribute, if the latest frame at the time of the clock changed since the last call, UNCHANGED if not, or FAILED before the first frame
+		"""
+		index = np.searchsorted(self.times, self.clock.unix(), side="right") - 1
+		if index < 0:
+			logger.debug("{}: no frame before the replay time".format(self.url))
+			return fetcher.FAILED
+		if index == self.index:
+			return fetcher.UNCHANGED
+
+		frame = self.frames[index]
+		if isinstance(frame, bytes):
+			self.content = frame
+		else:
+			with open(frame, "rb") as f:
+				self.content = f.read()
+		self.index = index
+		return fetcher.NEW
+
+	def close(self):
+		pass
+
+
+class ReplayProvider:
+	"""
+	Replays archived weather reports and all-sky frames
+	"""
+	def __init__(self, weatherfiles=(), allskyfiles=(), allskytimes=None, speed=1., start=None):
+		"""
+		:param weatherfiles: list of strings, paths of weather reports, each holding one or several reports, see :func:`~weatherparser.split`. The reports are replayed at the time of their header.
+		:param allskyfiles: list of strings, paths of all-sky images
+		:param allskytimes: Astropy Time array of the all-sky images. If None, use the modification times of the files.
+		:param speed: float, replayed seconds per second, 0 to move from frame to frame with :meth:`advance`
+		:param start: Astropy Time object of the start of the replay. If None, the time of the first frame.
+		"""
+		times, reports = [], []
+		for path in weatherfiles:
+			with open(path, mode="r") as f:
+				for t, report in weatherparser.split(f.read()):
+					times.append((t - np.datetime64("1970-01-01T00:00")) / np.timedelta64(1, "s"))
+					reports.append(report.encode("utf-8"))
+		order = np.argsort(times, kind="stable")
+		weathertimes = np.array(times, dtype=np.float64)[order]
+
+		allskyfiles = list(allskyfiles)
+		if allskytimes is None:
+			allskytimes = np.array([os.path.getmtime(path) for path in allskyfiles], dtype=np.float64)
+		else:
+			allskytimes = np.atleast_1d(allskytimes.unix).astype(np.float64)
+		allskyorder = np.argsort(allskytimes, kind="stable")
+
+		if start is None:
+			start = min(np.concatenate([weathertimes[:1], allskytimes[allskyorder][:1]]), default=time.time())
+		else:
+			start = start.unix
+		self.clock = ReplayClock(start, speed=speed)
+		self.weather = ReplayChannel("weather", weathertimes, [reports[i] for i in order], self.clock)
+		self.allsky = ReplayChannel("allsky", allskytimes[allskyorder], [allskyfiles[i] for i in allskyorder], self.clock)
+		logger.info("Replaying {} weather reports and {} all-sky frames".format(len(self.weather), len(self.allsky)))
+
+	def now(self):
+		"""
+		:return: Astropy Time object of the replay
+		"""
+		return Time(self.clock.unix(), format="unix", scale="utc")
+
+	def advance(self):
+		"""
+		Moves the clock to the next frame of any channel
+
+		:return: Astropy Time object of the frame, or None at the end of the replay
+		"""
+		t = self.clock.unix()
+		following = [channel.times[np.searchsorted(channel.times, t, side="right")] for channel in [self.weather, self.allsky] if len(channel) and channel.times[-1] > t]
+		if not following:
+			return None
+		self.clock.set(min(following))
+		return self.now()
+
+	def close(self):
+		pass
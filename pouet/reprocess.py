@@ -0,0 +1,185 @@
+"""
+Reprocessing of archived all-sky images, distributed over a pool of processes
+
+Each frame goes through the same analysis as the live images (:func:`~clouds.loadallsky`, :meth:`~clouds.Clouds.detect_stars` and :meth:`~clouds.Clouds.get_observability_map`). The results are written in the output folder as compressed NumPy shards of a fixed number of frames, see :func:`~reprocess.write_shard`, and as a `summary.tsv` table with one line per frame. Example::
+
+    python pouet/reprocess.py "archive/2018-*/*.jpg" --output reprocessed --processes 8
+"""
+
+import os, sys
+import argparse
+import csv
+import glob
+import multiprocessing
+import numpy as np
+import logging
+
+import clouds
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONS = (".jpg", ".jpeg", ".png")
+SUMMARY = ["file", "status", "nstars", "clearfraction", "meanobservability"]
+
+OK = 0
+FAILED = 1
+
+_allsky = None
+
+
+def find_frames(patterns):
+    """
+    :param patterns: list of folders, files or glob patterns
+    :return: sorted list of the image files, without duplicates
+    """
+    frames = set()
+    for pattern in patterns:
+        if os.path.isdir(pattern):
+            frames.update(os.path.join(pattern, f) for f in os.listdir(pattern) if f.lower().endswith(EXTENSIONS))
+        else:
+            frames.update(f for f in glob.glob(pattern) if os.path.isfile(f))
+    return sorted(frames)
+
+
+def _init_worker(station):
+    """
+    Creates the Clouds object of a worker process, reused for all its frames
+    """
+    global _allsky
+    _allsky = clouds.Clouds(name=station)
+
+
+def analyse_frame(filepath):
+    """
+    Analyses one archived image, in a worker process
+
+    :param filepath: path of the image
+    :return: dictionary with the file, status, stars x and y, observability map (rows, columns) and the summary statistics of SUMMARY
+    """
+    result = {"file": filepath, "status": FAILED, "x": np.zeros(0), "y": np.zeros(0), "map": None, "nstars": 0, "clearfraction": np.nan, "meanobservability": np.nan}
+    try:
+        masked, original = clouds.loadallsky(filepath, station=_allsky.station, return_complete=True, pixelmap=_allsky.pixelmap)
+        if masked is None:
+            return result
+        _allsky.im_masked, _allsky.im_original = masked, original
+        x, y = _allsky.detect_stars()
+        if x is None or y is None:
+            return result
+        observability = _allsky.get_observability_map(x, y)
+    except Exception as e:
+        logger.warning("Could not analyse {}: {}".format(filepath, e))
+        return result
+
+    sky = observability[~np.isnan(observability)]
+    result.update({"status": OK, "x": np.array(x), "y": np.array(y), "map": observability, "nstars": len(x)})
+    if sky.size > 0:
+        result["clearfraction"] = float(np.mean(sky > 0.5))
+        result["meanobservability"] = float(np.mean(sky))
+    return result
+
+
+def write_shard(filepath, results, shape):
+    """
+    Writes the results of consecutive frames in a compressed NumPy file
+
+    The maps are stored in float16, NaN on the masked pixels and for the failed frames. The stars of frame i are x[offsets[i]:offsets[i+1]] and y[offsets[i]:offsets[i+1]].
+
+    :param filepath: path of the .npz file
+    :param results: list of dictionaries, see :func:`~reprocess.analyse_frame`
+    :param shape: shape of the maps
+    """
+    maps = np.ones((len(results),) + tuple(shape), dtype=np.float16) * np.nan
+    for i, result in enumerate(results):
+        if result["map"] is not None and result["map"].shape == tuple(shape):
+            maps[i] = result["map"]
+    offsets = np.cumsum([0] + [len(result["x"]) for result in results])
+    np.savez_compressed(filepath,
+        files=np.array([result["file"] for result in results]),
+        status=np.array([result["status"] for result in results], dtype=np.int8),
+        nstars=np.array([result["nstars"] for result in results], dtype=np.int32),
+        clearfraction=np.array([result["clearfraction"] for result in results], dtype=np.float32),
+        meanobservability=np.array([result["meanobservability"] for result in results], dtype=np.float32),
+        x=np.concatenate([result["x"] for result in results]).astype(np.float32),
+        y=np.concatenate([result["y"] for result in results]).astype(np.float32),
+        offsets=offsets,
+        maps=maps)
+
+
+def read_shard(filepath):
+    """
+    :param filepath: path of a file written by :func:`~reprocess.write_shard`
+    :return: dictionary of arrays
+    """
+    with np.load(filepath) as data:
+        return {key: data[key] for key in data.files}
+
+
+def reprocess(frames, outdir, station="LaSilla", processes=None, shardsize=100, chunksize=4):
+    """
+    Analyses archived images in parallel and writes the results, see the module documentation
+
+    :param frames: list of image files
+    :param outdir: output folder, created if needed
+    :param station: name of the station
+    :param processes: number of worker processes. If None, the number of CPUs.
+    :param shardsize: number of frames per output file
+    :param chunksize: number of frames sent at once to a worker
+
+    :return: list of the shard files
+    """
+    if not os.path.isdir(outdir):
+        os.makedirs(outdir)
+    # built and saved once here, instead of concurrently by the workers
+    allsky = clouds.Clouds(name=station)
+    shape = allsky.pixelmap.shape
+
+    logger.info("Reprocessing {} frames with {} processes...".format(len(frames), processes or multiprocessing.cpu_count()))
+    shards = []
+    with open(os.path.join(outdir, "summary.tsv"), "w") as f, multiprocessing.Pool(processes, initializer=_init_worker, initargs=(station,)) as pool:
+        writer = csv.DictWriter(f, fieldnames=SUMMARY, delimiter="\t", lineterminator="\n", extrasaction="ignore")
+        writer.writeheader()
+        results = []
+        for result in pool.imap(analyse_frame, frames, chunksize=chunksize):
+            writer.writerow(result)
+            results.append(result)
+            if len(results) == shardsize:
+                shards.append(os.path.join(outdir, "frames_{:06d}.npz".format(len(shards))))
+                write_shard(shards[-1], results, shape)
+                logger.info("Wrote {}".format(shards[-1]))
+                results = []
+                f.flush()
+        if len(results) > 0:
+            shards.append(os.path.join(outdir, "frames_{:06d}.npz".format(len(shards))))
+            write_shard(shards[-1], results, shape)
+    return shards
+
+
+def main(argv=None):
+    """
+    Entry point of the reprocessing
+
+    :param argv: list of command-line arguments. If None, use sys.argv
+    :return: exit status
+    """
+    parser = argparse.ArgumentParser(description="Reprocess archived all-sky images in parallel.")
+    parser.add_argument("frames", nargs="+", help="folders, files or glob patterns of the images")
+    parser.add_argument("--output", required=True, help="output folder")
+    parser.add_argument("--station", default="LaSilla", help="name of the station (default: %(default)s)")
+    parser.add_argument("--processes", type=int, default=None, help="number of worker processes (default: number of CPUs)")
+    parser.add_argument("--shardsize", type=int, default=100, help="number of frames per output file (default: %(default)s)")
+    parser.add_argument("-v", "--verbose", action="count", default=0, help="log to stderr, -vv for debug logs")
+    args = parser.parse_args(argv)
+
+    level = [logging.WARNING, logging.INFO, logging.DEBUG][min(args.verbose, 2)]
+    logging.basicConfig(format='PID %(process)06d | %(asctime)s | %(levelname)s: %(name)s(%(funcName)s): %(message)s', level=level, stream=sys.stderr)
+
+    frames = find_frames(args.frames)
+    if len(frames) == 0:
+        parser.error("no image found")
+    reprocess(frames, args.output, station=args.station, processes=args.processes, shardsize=args.shardsize)
+    return 0
+
+
+if __name__ == "__main__":
+
+    sys.exit(main())
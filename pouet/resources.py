@@ -0,0 +1,77 @@
+"""
+Location of the files shipped with POUET: settings and station configs, debug data, Qt designs, catalogues and obsprograms
+
+The paths are resolved once from the location of this module, instead of inspecting the call stack in each module. The functions mimic :mod:`importlib.resources`, with packages given as folder names relative to the pouet folder (e.g. "config" or "obsprogram", "" for the pouet folder itself).
+"""
+
+import os
+import pathlib
+
+import util
+
+import logging
+logger = logging.getLogger(__name__)
+
+ROOT = pathlib.Path(__file__).resolve().parent
+
+_settings = None
+
+
+def files(package=""):
+	"""
+	:param package: string, folder relative to the pouet folder
+	:return: pathlib.Path of the folder
+	"""
+	return ROOT / package
+
+
+def path(package, resource):
+	"""
+	:param package: string, folder relative to the pouet folder
+	:param resource: string, name of the file
+	:return: string, absolute path of the file
+	"""
+	return str(files(package) / resource)
+
+
+def contents(package=""):
+	"""
+	:param package: string, folder relative to the pouet folder
+	:return: sorted list of the names of the files in the folder
+	"""
+	return sorted(os.listdir(str(files(package))))
+
+
+def read_text(package, resource):
+	"""
+	:param package: string, folder relative to the pouet folder
+	:param resource: string, name of the file
+	:return: string, content of the file
+	"""
+	with open(path(package, resource), mode='r') as f:
+		return f.read()
+
+
+def settings():
+	"""
+	:return: configuration of :file:`config/settings.cfg`, read once and shared by all the modules
+	"""
+	global _settings
+	if _settings is None:
+		_settings = util.readconfig(path("config", "settings.cfg"))
+	return _settings
+
+
+def station_config(name):
+	"""
+	:param name: string, name of the station
+	:return: configuration of :file:`config/<name>.cfg`
+	"""
+	return util.readconfig(path("config", "{}.cfg".format(name)))
+
+
+def obsprograms():
+	"""
+	:return: list of the names of the available obsprograms, i.e. the `prog<name>.py` files of the obsprogram folder
+	"""
+	return [f[len("prog"):-len(".py")] for f in contents("obsprogram") if f.startswith("prog") and f.endswith(".py")]
@@ -3,36 +3,40 @@ High-level functions around meteo and obs
 Running the script should provide a minimal text output
 """
 
-import os, sys, inspect
+import os, sys
 from astropy.time import Time
-import obs, meteo, plots, util
+import obs, meteo, util, batch, resources
 import importlib
+import numpy as np
 import logging
 
 global SETTINGS
-herepath = os.path.dirname(os.path.abspath(inspect.stack()[0][1]))
-SETTINGS = util.readconfig(os.path.join(herepath, "config/settings.cfg"))
+SETTINGS = resources.settings()
 
 logger = logging.getLogger(__name__)
 
-def startup(name='LaSilla', cloudscheck=True, debugmode=False):
+def startup(name='LaSilla', cloudscheck=True, debugmode=False, minimal=False, provider=None):
     """
     Initialize meteo
+
+    :param minimal: boolean. If True, do not fetch the weather report and all-sky image at startup
+    :param provider: object providing the weather reports and all-sky images, see :mod:`providers`. If None, use the urls of the station.
     :return: Meteo object
     """
     logger.debug("Loading a new meteo...")
-    currentmeteo = meteo.Meteo(name=name, cloudscheck=cloudscheck, debugmode=debugmode)
+    currentmeteo = meteo.Meteo(name=name, cloudscheck=cloudscheck, debugmode=debugmode, minimal=minimal, provider=provider)
 
     return currentmeteo
 
 
-def refresh_status(meteo, observables=None, minimal=False, obs_time=None):
+def refresh_status(meteo, observables=None, minimal=False, obs_time=None, cloudscheck=True, cwvalidity=30):
     """
-    Refresh the status
+    Refresh the status: updates the meteo and computes the observability of all the non-hidden observables in one vectorized pass, see :meth:`~batch.update_observables`
 
-    :param observables:
-    :param obs_time:
-    :return:
+    :param observables: list of :meth:`~obs.Observable` or :class:`~obs.Catalogue`
+    :param obs_time: Astropy Time object. If None, use the meteo time.
+    :param cloudscheck: boolean, if set to True then use the cloud coverage in the observability computation.
+    :param cwvalidity: float, current weather validity in minutes, see :meth:`~obs.Observable.compute_observability`
     """
     logger.debug("Refreshing the observables status...")
     # update meteo
@@ -41,39 +45,66 @@ def refresh_status(meteo, observables=None, minimal=False, obs_time=None):
 
     meteo.update(obs_time, minimal=minimal)
 
-    if observables:
-        #todo: does using a tuple instead of a list speed up the update process? we should find out !!
-        [obs.update(meteo) for obs in observables if obs.hidden == False]
+    if isinstance(observables, obs.Catalogue):
+        observables.update(meteo, cwvalidity=cwvalidity, cloudscheck=cloudscheck)
+    elif observables:
+        batch.update_observables(observables, meteo, cwvalidity=cwvalidity, cloudscheck=cloudscheck)
 
 
 def retrieve_obsprogramlist():
     """
-    Return a list of existing obsprogram in the obsprogram folder, minus the default obsprogram
+    Return a list of existing obsprogram in the obsprogram folder, see :func:`~resources.obsprograms`
     :return: list of exising obsprogram, including the default one (new in 0.5)
-
-    .. warning:: path to obsprogram folder is hardcoded. This is wrong and should be changed!
     """
     logger.debug("Revrieving obsprograms...")
     obsprogramlist = []
-    #todo: obsprogram path is hardcoded, this is wrong!
-    files = [f for f in os.listdir(os.path.join(herepath,'obsprogram')) if 'prog' in f and '.py'in f and not 'pyc' in f] #and not "default" in f]
-    for f in files:
-        name = f.split('prog')[1].split('.py')[0]
+    for name in resources.obsprograms():
         program = importlib.import_module("obsprogram.prog{}".format(name), package=None)
         obsprogramlist.append({"name": name, "program": program})
 
     return obsprogramlist
 
 
+def _hide_catalogue(catalogue, criteria):
+    """
+    Hide the observables of a catalogue using the numerical criteria, on whole columns
+
+    :param catalogue: :class:`~obs.Catalogue`
+    :param criteria: list of dictionnaries, see :meth:`~run.hide_observables`
+
+    :return: list of the criteria that are not numerical and still need to be applied
+    """
+    others = []
+    for c in criteria:
+        if c["id"] == "airmass":
+            catalogue.hide(catalogue.airmass > c["max"])
+        elif c["id"] == "moondist":
+            catalogue.hide(np.rad2deg(catalogue.angletomoon) < c["min"])
+        elif c["id"] == "sundist":
+            catalogue.hide(np.rad2deg(catalogue.angletosun) < c["min"])
+        elif c["id"] == "windangle":
+            catalogue.hide(np.rad2deg(catalogue.angletowind) < c["min"])
+        elif c["id"] == "observability":
+            catalogue.hide(catalogue.observability <= c["min"])
+        elif c["id"] == "clouds":
+            catalogue.hide(np.isnan(catalogue.cloudfree) | (catalogue.cloudfree <= c["min"]))
+        else:
+            others.append(c)
+    return others
+
+
 def hide_observables(observables, criteria):
     """
     Hide the observables not matching the given criteria
 
-    :param observables: list of :meth:`~obs.Observable`
+    :param observables: list of :meth:`~obs.Observable` or :class:`~obs.Catalogue`
     :param criteria: list of dictionnaries. Each dict contains an "id" and associated keywords used for the hiding. See :meth:'~main.hide_observables'.
 
+    .. note:: for a :class:`~obs.Catalogue`, the criteria on the airmass, angles and observability are applied on whole columns at once.
     """
     logger.debug("Hiding observables...")
+    if isinstance(observables, obs.Catalogue):
+        criteria = _hide_catalogue(observables, criteria)
     for c in criteria:
         for o in observables:
             if c["id"] == "matchname":
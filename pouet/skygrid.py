@@ -0,0 +1,138 @@
+"""
+Vectorized visibility of the whole sky, on the right ascension / declination grid of :func:`~util.grid_points`
+
+The computation is split in two steps: :func:`~skygrid.compute_fields` computes the altitude, airmass and moon separation of every grid point at a given time, which is the expensive part, and :func:`~skygrid.visibility_masks` thresholds these fields with the airmass, moon and wind constraints. Changing only the constraints does not require computing the fields again, and :class:`~skygrid.FieldCache` keeps the fields of the last time steps for that purpose.
+
+.. note:: like in :mod:`batch`, all the angles are in radians, except the moon angle constraint which is in degrees.
+"""
+
+import numpy as np
+from collections import OrderedDict
+
+import util
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+def compute_fields(meteo, obs_time=None, res_x=400, res_y=200):
+	"""
+	Computes the position, airmass and moon separation of all the points of the sky grid
+
+	:param meteo: a Meteo object
+	:param obs_time: Astropy Time object. If None, use the meteo time.
+	:param res_x: integer, number of points in right ascension
+	:param res_y: integer, number of points in declination
+
+	:return: dictionary with ras and decs, the 1d grid coordinates, and the 2d fields of shape (res_y, res_x): azimuth, altitude, airmass and moonsep
+	"""
+	if obs_time is None:
+		obs_time = meteo.time
+	logger.debug("Computing sky grid fields for {}...".format(obs_time.iso))
+
+	ras, decs = util.grid_points(res_x=res_x, res_y=res_y)
+	ra_g, dec_g = np.meshgrid(ras, decs)
+
+	az, alt = meteo.get_AzAlt_array(ra_g, dec_g, obs_time)
+	eph = meteo.get_ephemerides(obs_time).get(obs_time)
+
+	fields = {"ras": ras, "decs": decs, "azimuth": az, "altitude": alt}
+	fields["airmass"] = util.elev2airmass(alt, meteo.elev)
+	fields["moonsep"] = util.angular_separation(eph["moonra"], eph["moondec"], ra_g, dec_g)
+	return fields
+
+
+def visibility_masks(fields, meteo, airmass, anglemoon, check_wind=True):
+	"""
+	Thresholds the sky grid fields with the observing constraints
+
+	:param fields: dictionary returned by :func:`~skygrid.compute_fields`
+	:param meteo: a Meteo object, for the wind speed, direction and the station wind levels
+	:param airmass: float, maximum airmass
+	:param anglemoon: float, minimum angle to the moon in degrees
+	:param check_wind: boolean, if True take the current wind into account
+
+	:return: dictionary of 2d arrays vis (1 if below the maximum airmass), sep (moon separation in degrees where allowed) and wind (1 where the wind is a problem), NaN elsewhere. windlevel is None, "warn" or "limit".
+	"""
+	visible = fields["airmass"] < airmass
+	moonsep = np.rad2deg(fields["moonsep"])
+
+	vis = np.where(visible, 1., np.nan)
+	# Don't forget that the angular diam of the Moon is ~0.5 deg
+	sep = np.where(visible & (moonsep - 0.5 > anglemoon), moonsep, np.nan)
+	wind = np.ones_like(vis) * np.nan
+
+	windlevel = None
+	if check_wind:
+		windspeed = meteo.get_windspeed()
+		if windspeed >= float(meteo.location.get("weather", "windLimitLevel")):
+			windlevel = "limit"
+			wind[visible] = 1.
+		elif windspeed >= float(meteo.location.get("weather", "windWarnLevel")):
+			windlevel = "warn"
+			towind = util.angular_separation(np.deg2rad(meteo.winddirection), 0., fields["azimuth"], 0.)
+			wind[visible & (towind < np.pi / 2.)] = 1.
+
+	return {"vis": vis, "sep": sep, "wind": wind, "windlevel": windlevel}
+
+
+class FieldCache:
+	"""
+	Least-recently-used cache of the sky grid fields of :func:`~skygrid.compute_fields`
+
+	Fields are keyed by (station, time bucket, resolution): all the times falling in the same bucket share the fields computed for the first of them. The least recently used fields are evicted when the total size of the cached arrays exceeds the memory budget.
+	"""
+	def __init__(self, maxsize=50., timebucket=60.):
+		"""
+		:param maxsize: float, memory budget in MB
+		:param timebucket: float, width of the time buckets in seconds
+		"""
+		self.maxbytes = maxsize * 1024 ** 2
+		self.timebucket = timebucket
+		self.entries = OrderedDict()
+		self.nbytes = 0
+		self.hits = 0
+		self.misses = 0
+
+	def __len__(self):
+		return len(self.entries)
+
+	def key(self, meteo, obs_time, res_x, res_y):
+		"""
+		:return: the cache key of the fields of a station at a given time and resolution
+		"""
+		bucket = int(np.floor(obs_time.mjd * 86400. / self.timebucket))
+		return (meteo.name, bucket, res_x, res_y)
+
+	def get(self, meteo, obs_time=None, res_x=400, res_y=200):
+		"""
+		Returns the fields from the cache, computing and storing them if needed. Same parameters as :func:`~skygrid.compute_fields`.
+
+		:return: dictionary of fields, see :func:`~skygrid.compute_fields`. It is shared with the cache and must not be modified.
+		"""
+		if obs_time is None:
+			obs_time = meteo.time
+		key = self.key(meteo, obs_time, res_x, res_y)
+
+		if key in self.entries:
+			self.hits += 1
+			self.entries.move_to_end(key)
+			return self.entries[key]
+
+		self.misses += 1
+		fields = compute_fields(meteo, obs_time=obs_time, res_x=res_x, res_y=res_y)
+		size = sum(value.nbytes for value in fields.values())
+		if size <= self.maxbytes:
+			self.entries[key] = fields
+			self.nbytes += size
+			while self.nbytes > self.maxbytes:
+				_, evicted = self.entries.popitem(last=False)
+				self.nbytes -= sum(value.nbytes for value in evicted.values())
+		return fields
+
+	def clear(self):
+		"""
+		Empties the cache
+		"""
+		self.entries.clear()
+		self.nbytes = 0
@@ -170,11 +170,11 @@ def elev2airmass(el, alt, threshold=10.):
 	"""
 	Converts the elevation to airmass.
 
-	:param el: float, elevation in radians
+	:param el: float or numpy array, elevation in radians
 	:param alt: float, altitude of the observer in meters
 	:param threshold: maximum allowed airmass, will be returned if actual airmass exceeds the threshold
 
-	:return: airmass
+	:return: airmass, with the same shape as el
 
 	.. note:: This is the code used for the Euler EDP at La Silla."""
 
@@ -182,13 +182,41 @@ def elev2airmass(el, alt, threshold=10.):
 
 	cosz = np.cos(np.pi/2.-el)
 
-	if(cosz< 0.1): # we do not compute Airmass for small value of cosz
+	if np.ndim(cosz) > 0:
+		with np.errstate(divide='ignore', invalid='ignore'):
+			airmass = (1.0 + altitudeFactor - altitudeFactor / (cosz * cosz)) / cosz
+		airmass[cosz < 0.1] = threshold
+	elif(cosz< 0.1): # we do not compute Airmass for small value of cosz
 		airmass = threshold
 	else:
 		airmass = (1.0 + altitudeFactor - altitudeFactor / (cosz * cosz)) / cosz
 
 	return airmass
 
+def angular_separation(lon1, lat1, lon2, lat2):
+	"""
+	Angular separation between two points on a sphere, using the Vincenty formula (same as astropy's angular_separation, but working on plain numpy arrays)
+
+	:param lon1: float or numpy array, longitude (or azimuth, right ascension) of the first point, in radians
+	:param lat1: float or numpy array, latitude (or altitude, declination) of the first point, in radians
+	:param lon2: float or numpy array, longitude of the second point, in radians
+	:param lat2: float or numpy array, latitude of the second point, in radians
+
+	:return: separation in radians, broadcasted over the inputs
+	"""
+	sdlon = np.sin(lon2 - lon1)
+	cdlon = np.cos(lon2 - lon1)
+	slat1 = np.sin(lat1)
+	slat2 = np.sin(lat2)
+	clat1 = np.cos(lat1)
+	clat2 = np.cos(lat2)
+
+	num1 = clat2 * sdlon
+	num2 = clat1 * slat2 - slat1 * clat2 * cdlon
+	denominator = slat1 * slat2 + clat1 * clat2 * cdlon
+
+	return np.arctan2(np.hypot(num1, num2), denominator)
+
 def check_value(var, flag):
 	"""
 	Check that a value is NaN, replace it with a given flag if True
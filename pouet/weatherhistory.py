@@ -0,0 +1,163 @@
+"""
+Recent weather readings, in a fixed-size ring buffer, with rolling statistics
+
+A :class:`~weatherhistory.WeatherHistory` keeps the last readings of the weather report in preallocated numpy arrays: its memory does not grow, however long POUET runs. The rolling statistics are kept up to date over a few time windows given at construction, for the limits of the observability (e.g. the mean wind speed and the gusts of the last 10 minutes). Each window keeps running sums and monotonic queues of the maxima, updated in constant time per reading instead of reading all the readings of the window.
+
+The missing values of the weather report (the -9999 flags) are stored as NaN and ignored by the statistics.
+"""
+
+import collections
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+FIELDS = ["winddirection", "windspeed", "temperature", "humidity"]
+
+# valid ranges of the readings, the others are flags of the weather report
+_RANGES = {"winddirection": (0., 360.), "windspeed": (0., 100.), "temperature": (-100., 100.), "humidity": (0., 100.)}
+
+# readings averaged and readings whose maxima are kept
+_MEANS = ["windspeed", "temperature", "humidity"]
+_MAXIMA = ["windspeed", "humidity"]
+
+
+class _Window:
+	"""
+	Running sums and maxima of the readings of the last length seconds
+	"""
+	def __init__(self, length):
+		self.length = length
+		self.start = 0
+		self.sums = dict.fromkeys(_MEANS + ["windx", "windy"], 0.)
+		self.counts = dict.fromkeys(_MEANS + ["winddirection"], 0)
+		# indices of the readings that can still be the maximum of the window, of decreasing values
+		self.maxima = {name: collections.deque() for name in _MAXIMA}
+
+	def add(self, index, values):
+		for name in _MEANS:
+			if not np.isnan(values[name]):
+				self.sums[name] += values[name]
+				self.counts[name] += 1
+		if not np.isnan(values["winddirection"]):
+			# direction averaged on the circle, 350 and 10 deg give 0 deg
+			self.sums["windx"] += np.cos(np.deg2rad(values["winddirection"]))
+			self.sums["windy"] += np.sin(np.deg2rad(values["winddirection"]))
+			self.counts["winddirection"] += 1
+		for name in _MAXIMA:
+			if np.isnan(values[name]):
+				continue
+			queue = self.maxima[name]
+			while queue and queue[-1][1] <= values[name]:
+				queue.pop()
+			queue.append((index, values[name]))
+
+	def remove(self, index, values):
+		for name in _MEANS:
+			if not np.isnan(values[name]):
+				self.counts[name] -= 1
+				# no rounding residuals once the window is empty
+				self.sums[name] = self.sums[name] - values[name] if self.counts[name] > 0 else 0.
+		if not np.isnan(values["winddirection"]):
+			self.counts["winddirection"] -= 1
+			empty = self.counts["winddirection"] == 0
+			self.sums["windx"] = 0. if empty else self.sums["windx"] - np.cos(np.deg2rad(values["winddirection"]))
+			self.sums["windy"] = 0. if empty else self.sums["windy"] - np.sin(np.deg2rad(values["winddirection"]))
+		for name in _MAXIMA:
+			queue = self.maxima[name]
+			if queue and queue[0][0] == index:
+				queue.popleft()
+		self.start = index + 1
+
+	def stats(self):
+		res = {}
+		for name in _MEANS:
+			res[name] = self.sums[name] / self.counts[name] if self.counts[name] > 0 else np.nan
+		if self.counts["winddirection"] > 0:
+			res["winddirection"] = np.mod(np.rad2deg(np.arctan2(self.sums["windy"], self.sums["windx"])), 360.)
+		else:
+			res["winddirection"] = np.nan
+		res["windgust"] = self.maxima["windspeed"][0][1] if self.maxima["windspeed"] else np.nan
+		res["humiditymax"] = self.maxima["humidity"][0][1] if self.maxima["humidity"] else np.nan
+		return res
+
+
+class WeatherHistory:
+	"""
+	Ring buffer of the last weather readings, with rolling statistics over fixed time windows
+	"""
+	def __init__(self, capacity=2880, windows=(10.,)):
+		"""
+		:param capacity: integer, number of readings kept. The oldest are overwritten.
+		:param windows: list of floats, lengths of the windows of the rolling statistics, in minutes
+		"""
+		self.capacity = capacity
+		self.times = np.full(capacity, np.nan)
+		self.values = {name: np.full(capacity, np.nan) for name in FIELDS}
+		# total number of readings appended, the slot of reading i is i % capacity
+		self.count = 0
+		self.windows = {float(length): _Window(float(length) * 60.) for length in windows}
+
+	def __len__(self):
+		return min(self.count, self.capacity)
+
+	def _reading(self, index):
+		slot = index % self.capacity
+		return {name: self.values[name][slot] for name in FIELDS}
+
+	def _evict(self, now, oldest):
+		"""
+		Removes from the windows the readings older than their length, or older than the reading oldest
+		"""
+		for window in self.windows.values():
+			while window.start < self.count and (window.start < oldest or self.times[window.start % self.capacity] < now - window.length):
+				window.remove(window.start, self._reading(window.start))
+
+	def append(self, time, winddirection, windspeed, temperature, humidity):
+		"""
+		Adds a reading, in constant time
+
+		:param time: Astropy Time object of the reading, not before the last one
+		:param winddirection: float, in degrees
+		:param windspeed: float, in m/s
+		:param temperature: float, in degrees Celsius
+		:param humidity: float, in %
+		"""
+		t = time.unix
+		if self.count > 0 and t < self.times[(self.count - 1) % self.capacity]:
+			logger.warning("Weather reading older than the last one, not kept")
+			return
+
+		# the reading overwritten by this one leaves the windows first
+		self._evict(t, self.count + 1 - self.capacity)
+
+		slot = self.count % self.capacity
+		self.times[slot] = t
+		for name, value in zip(FIELDS, [winddirection, windspeed, temperature, humidity]):
+			vmin, vmax = _RANGES[name]
+			self.values[name][slot] = value if value is not None and vmin <= value <= vmax else np.nan
+		for window in self.windows.values():
+			window.add(self.count, self._reading(self.count))
+		self.count += 1
+
+	def stats(self, window):
+		"""
+		Rolling statistics of the readings of a window ending at the last reading, in constant time
+
+		:param window: float, length of the window in minutes, one of those given at construction
+		:return: dictionary of the mean windspeed, winddirection, temperature and humidity, the windgust and humiditymax maxima, NaN without valid reading, and the count of readings in the window
+		"""
+		if float(window) not in self.windows:
+			raise KeyError("No rolling window of {} minutes, only {}".format(window, sorted(self.windows)))
+		window = self.windows[float(window)]
+		res = window.stats()
+		res["count"] = self.count - window.start
+		return res
+
+	def series(self):
+		"""
+		:return: array of the times of the readings in unix seconds, and dictionary of the arrays of their values, from the oldest to the latest
+		"""
+		indices = np.arange(self.count - len(self), self.count) % self.capacity
+		return self.times[indices], {name: self.values[name][indices] for name in FIELDS}
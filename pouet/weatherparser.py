@@ -0,0 +1,133 @@
+"""
+Parser of the fixed-width weather reports of the ESO sites, such as the La Silla `meteo.last`
+
+A report is a header with the date, time and name of the site, followed by one line per sensor::
+
+	2018-02-08  16:36 LASILLA1
+	       INTV   INST    AVE    MAX    MIN    DEV
+	T 1 C   03H   15.6   15.6   15.6   14.7    0.0
+	RH  %   03H     60     60     64     59    0.0
+	WS1 M/S 10M    2.7    2.7    2.7    2.7    0.0
+
+:func:`~weatherparser.parse` reads the headers and the sensor lines of a text in a single pass of one precompiled pattern, and returns them as numpy structured arrays, see :data:`REPORT` and :data:`READING`. A text can hold any number of reports, so that the archived histories are parsed like the live report, see :func:`~weatherparser.parse_files`.
+"""
+
+import re
+
+import numpy as np
+
+import logging
+logger = logging.getLogger(__name__)
+
+# the sensors write this when they have no reading
+MISSING = 9999.
+
+# one report: date and time of the header, and name of the site
+REPORT = np.dtype([("time", "M8[m]"), ("site", "U16")])
+
+# one sensor line: index of its report, sensor name and number (0 if the name has none), unit, averaging interval, the five values, and whether the average is a reading
+READING = np.dtype([("report", "i4"), ("sensor", "U4"), ("station", "i1"), ("unit", "U4"), ("interval", "U4"),
+	("inst", "f8"), ("ave", "f8"), ("max", "f8"), ("min", "f8"), ("dev", "f8"), ("valid", "?")])
+
+_VALUES = ["inst", "ave", "max", "min", "dev"]
+
+_PATTERN = re.compile(r"""
+	^(?:
+		(?P<date>\d{4}-\d\d-\d\d)\s+(?P<time>\d\d:\d\d)\s+(?P<site>\S+)
+	|
+		(?P<sensor>[A-Z]+)\ ?(?P<station>\d)?\s+(?P<unit>\S+)\s+(?P<interval>\d+[A-Z]+)
+		\s+(?P<inst>\S+)\s+(?P<ave>\S+)\s+(?P<max>\S+)\s+(?P<min>\S+)\s+(?P<dev>\S+)
+	)[ \t]*\r?$
+	""", re.M | re.X)
+
+_HEADER = re.compile(r"^(\d{4}-\d\d-\d\d)\s+(\d\d:\d\d)\s+\S+", re.M)
+
+
+def split(text):
+	"""
+	Cuts a text of concatenated reports into single reports
+
+	:param text: string, content of one or several reports
+	:return: list of (numpy datetime64 of the header, string of the report), in the order of the text. The lines before the first header are dropped.
+	"""
+	headers = list(_HEADER.finditer(text))
+	ends = [header.start() for header in headers[1:]] + [len(text)]
+	return [(np.datetime64("{}T{}".format(*header.groups()), "m"), text[header.start():end]) for header, end in zip(headers, ends)]
+
+
+def parse(text):
+	"""
+	Reads all the reports of a text
+
+	:param text: string, content of one or several concatenated reports
+	:return: array of :data:`REPORT`, and array of :data:`READING` in the order of the text. The readings before the first header belong to a report without time (NaT) nor site.
+	:raise ValueError: if a value of a sensor line is not a number
+	"""
+	headers = []
+	lines = []
+	for match in _PATTERN.finditer(text):
+		if match.group("date") is not None:
+			headers.append(("{}T{}".format(match.group("date"), match.group("time")), match.group("site")))
+			continue
+		if not headers:
+			headers.append(("NaT", ""))
+		lines.append((len(headers) - 1,) + match.group("sensor", "station", "unit", "interval", "inst", "ave", "max", "min", "dev"))
+
+	reports = np.array(headers, dtype=REPORT)
+	readings = np.empty(len(lines), dtype=READING)
+	if not lines:
+		return reports, readings
+
+	columns = list(zip(*lines))
+	readings["report"] = columns[0]
+	readings["sensor"] = columns[1]
+	readings["station"] = [0 if station is None else int(station) for station in columns[2]]
+	readings["unit"] = columns[3]
+	readings["interval"] = columns[4]
+	# a single conversion of all the values, the strings of the whole text
+	values = np.array(columns[5:], dtype="U16").astype(np.float64)
+	for name, value in zip(_VALUES, values):
+		readings[name] = value
+	readings["valid"] = np.abs(readings["ave"]) < MISSING
+	return reports, readings
+
+
+def parse_files(paths, encoding="utf-8"):
+	"""
+	Reads all the reports of several files, such as an archive of `meteo.last` reports
+
+	:param paths: list of strings, paths of the files, read in this order
+	:param encoding: string, encoding of the files
+	:return: arrays of :data:`REPORT` and :data:`READING` of all the files, like :func:`~weatherparser.parse`. The report indices refer to the concatenated reports.
+	"""
+	allreports = []
+	allreadings = []
+	nreports = 0
+	for path in paths:
+		with open(path, mode="r", encoding=encoding) as f:
+			try:
+				reports, readings = parse(f.read())
+			except ValueError as e:
+				logger.warning("Cannot read the weather reports of {}: {}".format(path, e))
+				continue
+		readings["report"] += nreports
+		nreports += len(reports)
+		allreports.append(reports)
+		allreadings.append(readings)
+
+	if not allreadings:
+		return np.empty(0, dtype=REPORT), np.empty(0, dtype=READING)
+	return np.concatenate(allreports), np.concatenate(allreadings)
+
+
+def select(readings, sensor, valid=True):
+	"""
+	:param readings: array of :data:`READING`
+	:param sensor: string, name of the sensor, without its number
+	:param valid: boolean, if True only keep the readings whose average is not missing
+	:return: the readings of this sensor, in the order of the report
+	"""
+	mask = readings["sensor"] == sensor
+	if valid:
+		mask &= readings["valid"]
+	return readings[mask]
@@ -0,0 +1,141 @@
+"""
+Background download of the weather report, so that the callers never wait for the weather server
+
+A :class:`~weatherservice.WeatherService` runs a worker thread that downloads the report of a station every few seconds with a :class:`~fetcher.Fetcher` (one pooled session, connect and read timeouts, conditional requests), and parses it with the `parse` method of the station :class:`WeatherReport`. The latest reading is published under a lock: :meth:`~weatherservice.WeatherService.latest` returns immediately, with the last reading or None.
+
+After a failed download, the next one is delayed exponentially, up to a maximal delay, and back to the normal period after a success.
+"""
+
+import threading
+import time
+
+from astropy.time import Time
+
+import fetcher
+
+import logging
+logger = logging.getLogger(__name__)
+
+
+class WeatherService:
+	"""
+	Downloads and parses the weather report of a station in a worker thread
+	"""
+	def __init__(self, report, url=None, period=30., timeout=(5., 10.), maxbackoff=600., FLAG=-9999, provider=None):
+		"""
+		:param report: station WeatherReport object, with a `parse` method, see :file:`config/LaSilla.py`
+		:param url: string, url of the report. If None, use the url attribute of the report
+		:param period: float, time between two downloads, in seconds
+		:param timeout: tuple of floats, connect and read timeouts in seconds
+		:param maxbackoff: float, longest time between two downloads after failures, in seconds
+		:param FLAG: placeholder of the values that cannot be read, see :meth:`~meteo.Meteo.updateweather`
+		:param provider: object providing the reports instead of the url, and their time, see :mod:`providers`
+		"""
+		self.report = report
+		if provider is None:
+			self.fetcher = fetcher.Fetcher(report.url if url is None else url, timeout=timeout)
+			self.now = Time.now
+		else:
+			self.fetcher = provider.weather
+			self.now = provider.now
+		self.period = period
+		self.maxbackoff = maxbackoff
+		self.FLAG = FLAG
+		self.failures = 0
+		self._reading = None
+		self._lock = threading.Lock()
+		self._wakeup = threading.Event()
+		self._stopped = threading.Event()
+		self._thread = None
+
+	def start(self):
+		"""
+		Starts the worker thread, the first download is immediate
+		"""
+		if self.running:
+			return
+		self._stopped.clear()
+		self._thread = threading.Thread(target=self._run, name="WeatherService", daemon=True)
+		self._thread.start()
+		logger.debug("Weather service started for {}".format(self.fetcher.url))
+
+	def stop(self, timeout=None):
+		"""
+		Stops the worker thread after the download in progress, if any
+
+		:param timeout: float, longest wait for the thread, in seconds
+		"""
+		self._stopped.set()
+		self._wakeup.set()
+		if self._thread is not None:
+			self._thread.join(timeout)
+			self._thread = None
+		self.fetcher.close()
+
+	@property
+	def running(self):
+		return self._thread is not None and self._thread.is_alive()
+
+	def refresh(self):
+		"""
+		Asks for a download now instead of at the end of the current period, without waiting for it
+		"""
+		self._wakeup.set()
+
+	def latest(self):
+		"""
+		:return: tuple of the wind direction, wind speed, temperature and humidity, the Astropy Time of the last download, and the Astropy Time of the reading, or None if no report was read yet. The reading time is the one in the header of the report if the station gives it, see the `read` method of :file:`config/LaSilla.py`, the time of the download that changed the report otherwise: it does not change while the report is the same.
+		"""
+		with self._lock:
+			return self._reading
+
+	def delay(self):
+		"""
+		:return: time until the next download, in seconds: the period, doubled after each consecutive failure up to maxbackoff
+		"""
+		if self.failures == 0:
+			return self.period
+		return min(self.period * 2 ** self.failures, self.maxbackoff)
+
+	def poll(self):
+		"""
+		Downloads and parses the report once, and publishes the reading if the download succeeded
+
+		:return: status of the download, see :meth:`~fetcher.Fetcher.fetch`
+		"""
+		status = self.fetcher.fetch()
+		if status == fetcher.NEW:
+			now = self.now()
+			try:
+				if hasattr(self.report, "read"):
+					values, readtime = self.report.read(self.fetcher.content.decode("utf-8"), FLAG=self.FLAG)
+				else:
+					values, readtime = self.report.parse(self.fetcher.content.decode("utf-8"), FLAG=self.FLAG), None
+			except (UnicodeDecodeError, ValueError, IndexError) as e:
+				logger.warning("Cannot read the weather report: {}".format(e))
+				status = fetcher.FAILED
+			else:
+				with self._lock:
+					self._reading = (tuple(values), now, now if readtime is None else readtime)
+		elif status == fetcher.UNCHANGED:
+			# the report is still the current one: only the time of the download changes, not the one of the reading
+			with self._lock:
+				if self._reading is not None:
+					self._reading = (self._reading[0], self.now(), self._reading[2])
+
+		self.failures = self.failures + 1 if status == fetcher.FAILED else 0
+		return status
+
+	def _run(self):
+		while not self._stopped.is_set():
+			t0 = time.time()
+			try:
+				self.poll()
+			except Exception as e:
+				# the thread must outlive any error of a report
+				logger.warning("Weather service error: {}".format(e))
+				self.failures += 1
+			if self.failures > 0:
+				logger.info("Next weather report download in {:.0f} s".format(self.delay()))
+			self._wakeup.wait(max(self.delay() - (time.time() - t0), 0.))
+			self._wakeup.clear()
@@ -4,6 +4,7 @@ setup(
 	name='POUET',
 	version='0.4',
 	description='Programming Observation Usefully at the Euler Telescope ',
-	packages=["pouet", "pouet.obsprogram", "pouet.config"]
+	packages=["pouet", "pouet.obsprogram", "pouet.config"],
+	scripts=["scripts/pouet"]
 )
 
@@ -0,0 +1,120 @@
+"""
+Testing script for the vectorized observability, compared against the Observable methods
+"""
+
+import os, sys
+import unittest
+import numpy as np
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import batch, meteo, obs
+
+
+class BatchTest(unittest.TestCase):
+	'''Compare the batch observability with the scalar one'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.meteo = meteo.Meteo(name='LaSilla', cloudscheck=False, debugmode=True)
+		cls.catpath = os.path.join(path, "../cats/example.pouet")
+
+	def compare(self, cloudscheck=False):
+		scalar = obs.rdbimport(self.catpath, obsprogram='lens')
+		vectorized = obs.rdbimport(self.catpath, obsprogram='lens')
+
+		for o in scalar:
+			o.compute_observability(self.meteo, cloudscheck=cloudscheck, verbose=False)
+		batch.update_observables(vectorized, self.meteo, cloudscheck=cloudscheck)
+
+		for s, v in zip(scalar, vectorized):
+			for attr in ["altitude", "azimuth", "angletomoon", "angletosun"]:
+				self.assertAlmostEqual(getattr(s, attr).radian, getattr(v, attr).radian, places=9)
+			for attr in ["airmass", "observability"]:
+				self.assertAlmostEqual(getattr(s, attr), getattr(v, attr), places=9)
+			for attr in ["obs_moondist", "obs_highairmass", "obs_airmass", "obs_wind", "obs_wind_info", "obs_clouds", "obs_clouds_info"]:
+				self.assertEqual(getattr(s, attr), getattr(v, attr), msg="{} {}".format(s.name, attr))
+			if cloudscheck and not (np.isnan(s.cloudfree) and np.isnan(v.cloudfree)):
+				self.assertAlmostEqual(s.cloudfree, v.cloudfree)
+
+	def test_catalogue(self):
+		scalar = obs.rdbimport(self.catpath, obsprogram='lens')
+		catalogue = obs.Catalogue(obs.rdbimport(self.catpath, obsprogram='lens'))
+		catalogue[0].hidden = True
+
+		for o in scalar:
+			o.compute_observability(self.meteo, cloudscheck=False, verbose=False)
+		catalogue.update(self.meteo, cloudscheck=False)
+
+		self.assertRaises(AttributeError, getattr, catalogue[0], "observability")
+		for s in scalar[1:]:
+			v = catalogue[s.name]
+			self.assertIs(v.hidden, False)
+			self.assertEqual(s.alpha.to_string(sep=":", pad=True), v.alpha.to_string(sep=":", pad=True))
+			self.assertAlmostEqual(s.angletomoon.degree, v.angletomoon.degree, places=6)
+			self.assertAlmostEqual(s.observability, v.observability, places=9)
+			self.assertEqual(s.obs_airmass, v.obs_airmass)
+
+		self.assertRaises(ValueError, catalogue.append, scalar[0])
+
+	def test_night(self):
+		observables = obs.rdbimport(self.catpath, obsprogram='lens')
+		night = batch.night_observables(observables, self.meteo, "2018-02-12", nhours=8)
+		self.assertEqual(night["observability"].shape, (len(observables), 8))
+
+		time = self.meteo.time
+		for j, t in enumerate(night["times"]):
+			self.meteo.update(obs_time=t, minimal=True)
+			for i, o in enumerate(observables):
+				o.compute_observability(self.meteo, cloudscheck=False, verbose=False)
+				self.assertAlmostEqual(o.altitude.radian, night["altitude"][i, j], places=9)
+				self.assertAlmostEqual(o.airmass, night["airmass"][i, j], places=9)
+				# the Moon is interpolated in the ephemerides table
+				self.assertAlmostEqual(o.angletomoon.degree, np.rad2deg(night["angletomoon"][i, j]), places=4)
+				self.assertAlmostEqual(o.observability, night["observability"][i, j], places=9)
+		self.meteo.update(obs_time=time, minimal=True)
+
+	def test_observability(self):
+		self.compare()
+
+	def test_wind(self):
+		windspeed = self.meteo.windspeed
+		for ws in [16., 25.]:
+			self.meteo.windspeed = ws
+			self.compare()
+		self.meteo.windspeed = windspeed
+
+	def test_clouds(self):
+		cloudmap = self.meteo.cloudmap
+		self.meteo.cloudmap = np.random.RandomState(0).choice([0., 0.3, 0.7, 0.95, 1., np.nan], size=(640, 480))
+		self.compare(cloudscheck=True)
+		self.meteo.cloudmap = None
+		self.compare(cloudscheck=True)
+		self.meteo.cloudmap = cloudmap
+
+	def test_cloudfree(self):
+		rs = np.random.RandomState(1)
+		azimuths = rs.uniform(0, 2*np.pi, 5000)
+		altitudes = rs.uniform(-np.pi/2, np.pi/2, 5000)
+		cloudmap = self.meteo.cloudmap
+		self.meteo.cloudmap = None
+		self.assertTrue(np.all(batch.compute_cloudfree(self.meteo, azimuths, altitudes) == batch.ERROR_CONN))
+
+		# smaller than the image, so that some targets fall outside on both sides
+		self.meteo.cloudmap = rs.uniform(0, 1, (500, 400))
+		cloudfree = batch.compute_cloudfree(self.meteo, azimuths, altitudes)
+		self.assertTrue(np.any(cloudfree == batch.ERROR_COMPUTE) and np.any(cloudfree < 1.))
+		for az, alt, cf in zip(azimuths, altitudes, cloudfree):
+			xpix, ypix = self.meteo.allsky.station.get_image_coordinates(az, alt)
+			try:
+				expected = np.round(self.meteo.cloudmap[int(np.round(xpix)), int(np.round(ypix))], 3)
+			except (ValueError, IndexError):
+				expected = batch.ERROR_COMPUTE
+			self.assertEqual(cf, expected)
+		self.meteo.cloudmap = cloudmap
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,66 @@
+"""
+Testing script for the headless command-line interface
+"""
+
+import os, sys
+import io
+import csv
+import json
+import tempfile
+import unittest
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import cli, obs
+
+
+class CliTest(unittest.TestCase):
+	'''Run the command-line interface on the example catalogue'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.catpath = os.path.join(path, "../cats/example.pouet")
+		cls.ntargets = len(obs.rdbimport(cls.catpath))
+
+	def run_cli(self, *argv):
+		stream = io.StringIO()
+		self.assertEqual(cli.main([self.catpath] + list(argv) + ["--debugmode"], stream=stream), 0)
+		return stream.getvalue().splitlines()
+
+	def test_range(self):
+		lines = self.run_cli("--start", "2018-02-12 00:00:00", "--end", "2018-02-12 02:00:00", "--step", "60", "--format", "csv")
+		rows = list(csv.DictReader(lines))
+		self.assertEqual(len(rows), 3 * self.ntargets)
+		self.assertEqual(sorted(set(r["time"] for r in rows)), ["2018-02-12 00:00:00.000", "2018-02-12 01:00:00.000", "2018-02-12 02:00:00.000"])
+		for r in rows:
+			self.assertTrue(0 <= float(r["observability"]) <= 1)
+			self.assertEqual(r["angletowind"], "")
+
+	def test_json(self):
+		lines = self.run_cli("--night", "2018-02-12", "--nsteps", "4", "--format", "json", "--observable")
+		rows = [json.loads(l) for l in lines]
+		self.assertTrue(len(rows) > 0)
+		self.assertTrue(all(r["observability"] > 0 for r in rows))
+		self.assertEqual(set(rows[0].keys()), set(cli.COLUMNS))
+
+	def test_duplicates(self):
+		lines = self.run_cli(self.catpath, "--start", "2018-02-12 00:00:00")
+		self.assertEqual(lines[0].split("\t"), cli.COLUMNS)
+		self.assertEqual(len(lines), 1 + self.ntargets)
+
+		# a catalogue repeating its own targets
+		with open(self.catpath) as f:
+			text = f.read().rstrip("\n").split("\n")
+		with tempfile.TemporaryDirectory() as tmpdir:
+			catpath = os.path.join(tmpdir, "repeated.pouet")
+			with open(catpath, "w") as f:
+				f.write("\n".join(text + text[2:]) + "\n")
+			self.assertEqual(len(cli.load_catalogue([catpath])), self.ntargets)
+			lines = self.run_cli(catpath, "--start", "2018-02-12 00:00:00")
+			self.assertEqual(len(lines), 1 + self.ntargets)
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,178 @@
+"""
+Testing script for the all-sky analysis
+"""
+
+import os, sys
+import unittest
+import numpy as np
+from scipy.spatial import cKDTree
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import clouds
+
+
+class CloudsTest(unittest.TestCase):
+	'''All-sky analysis on synthetic images'''
+
+	@classmethod
+	def setUpClass(cls):
+		rs = np.random.RandomState(1)
+		cls.allsky = clouds.Clouds(name="LaSilla", debugmode=True)
+		image = rs.uniform(0, 200, (480, 640))
+		cls.allsky.im_masked = image
+		cls.allsky.im_masked[cls.allsky.station.get_mask(image)] = np.nan
+		# star centers can fall between two pixels
+		cls.x = rs.randint(0, 640, 300) + rs.choice([0., 0.5], 300)
+		cls.y = rs.randint(0, 480, 300) + rs.choice([0., 0.5], 300)
+
+	def test_count_neighbours(self):
+		counts = clouds.count_neighbours((480, 640), self.x, self.y, 40)
+		tree = cKDTree(np.array([self.x, self.y]).T)
+		rows, cols = np.mgrid[:480, :640]
+		expected = tree.query_ball_point(np.column_stack([cols.ravel(), rows.ravel()]), 40, return_length=True)
+		self.assertTrue(np.array_equal(counts.ravel(), expected))
+
+	def test_observability_map(self):
+		observability = self.allsky.get_observability_map(self.x, self.y, filter_sigma=0)
+
+		# per-pixel classification of the stars around each unmasked pixel
+		tree = cKDTree(np.array([self.x, self.y]).T)
+		rs = np.random.RandomState(2)
+		rows, cols = np.where(~np.isnan(self.allsky.im_masked))
+		for i in rs.choice(len(rows), 2000):
+			n = len(tree.query_ball_point((cols[i], rows[i]), 40))
+			expected = 1. if n > 2 else 0.5 if n >= 1 else 0.
+			# the blurred noise image is far below max_pxval, so no pixel is set to 0 because of its brightness
+			self.assertEqual(observability[rows[i], cols[i]], expected)
+		self.assertTrue(np.array_equal(self.allsky.observability_map, observability.T, equal_nan=True))
+
+	def test_measure_fwhm(self):
+		rs = np.random.RandomState(3)
+		shape = (200, 300)
+		x = np.array([40., 100.5, 160., 220.5, 60., 250., 5.])
+		y = np.array([40., 60., 100.5, 150., 150., 40., 100.])
+		stds = np.array([1., 1.5, 2., 2.5, 3., 6., 2.])
+		rows, cols = np.mgrid[:shape[0], :shape[1]]
+		image = 20. + rs.normal(0, 1., shape)
+		for xc, yc, std in zip(x, y, stds):
+			image += 500. * np.exp(-0.5 * ((cols - xc) ** 2 + (rows - yc) ** 2) / std ** 2)
+		expected = stds * 2. * np.sqrt(2. * np.log(2.))
+
+		f = clouds.measure_fwhm(image, x, y, 18)
+		refined = clouds.measure_fwhm(image, x, y, 18, refine=True)
+		legacy = np.array([clouds.fwhm(image, xc, yc, 18) for xc, yc in zip(x, y)])
+		# the last star is too close to the edge
+		self.assertTrue(np.isnan(f[-1]) and np.isnan(refined[-1]) and np.isnan(legacy[-1]))
+		np.testing.assert_allclose(f[:4], expected[:4], rtol=0.05)
+		# the wider objects are truncated by the stamp, but still rejected as stars
+		self.assertTrue(np.all(f[4:-1] > 5))
+		# seeded by the moments, the fit also converges for the widest star, unlike the legacy guess
+		np.testing.assert_allclose(refined[:5], np.abs(legacy[:5]), rtol=1e-3)
+		np.testing.assert_allclose(refined[:-1], expected[:-1], rtol=0.02)
+
+		image[int(y[0]), int(x[0])] = np.nan
+		self.assertTrue(np.isnan(clouds.measure_fwhm(image, x[:1], y[:1], 18)[0]))
+
+	def test_maxcandidates(self):
+		rs = np.random.RandomState(4)
+		allsky = clouds.Clouds(name="LaSilla", debugmode=True)
+		rows, cols = np.mgrid[:480, :640]
+		image = 20. + rs.normal(0, 0.1, (480, 640))
+		x = np.arange(200, 440, 40)
+		for i, xc in enumerate(x):
+			image += (100. + 50. * i) * np.exp(-0.5 * ((cols - xc) ** 2 + (rows - 240) ** 2) / 1.5 ** 2)
+		allsky.im_original = image
+		allsky.im_masked = image.copy()
+
+		sx, sy = allsky.detect_stars(threshold=0.5, maxcandidates=100, refine=False)
+		self.assertEqual(sorted(sx), list(x))
+		self.assertEqual(list(sy), [240] * len(x))
+		# only the brightest stars are measured
+		sx, sy = allsky.detect_stars(threshold=0.5, maxcandidates=2, refine=False)
+		self.assertEqual(sorted(sx), list(x[-2:]))
+
+	def test_frame(self):
+		rgb = np.random.RandomState(5).randint(0, 256, (48, 64, 3)).astype(np.uint8)
+		gray = clouds.rgb2gray(rgb, dtype=np.float32)
+		self.assertEqual(gray.dtype, np.float32)
+		self.assertTrue(np.allclose(gray, 0.299 * rgb[:, :, 0] + 0.587 * rgb[:, :, 1] + 0.144 * rgb[:, :, 2], rtol=1e-6))
+
+		masked = gray.copy()
+		masked[:5] = np.nan
+		frame = clouds.Frame(gray, masked)
+		background = frame.background
+		self.assertIs(frame.background, background)
+		self.assertIs(frame.normalised, frame.normalised)
+		self.assertEqual(background.dtype, np.float32)
+		self.assertTrue(np.allclose(frame.normalised, masked / background, equal_nan=True))
+
+		window = frame.window((slice(10, 20), slice(0, 30)))
+		self.assertTrue(np.shares_memory(window.background, background))
+		self.assertEqual(window.masked.shape, (10, 30))
+
+		# the frame is rebuilt when the images change
+		allsky = clouds.Clouds(name="LaSilla", debugmode=True)
+		allsky.im_original, allsky.im_masked = gray, masked
+		self.assertIs(allsky.frame, allsky.frame)
+		first = allsky.frame
+		allsky.im_masked = masked.copy()
+		self.assertIsNot(allsky.frame, first)
+
+	def test_changed_blocks(self):
+		previous = np.zeros((70, 100))
+		current = previous.copy()
+		current[65, 99] = 30.
+		current[0:4, 0:4] = 1.
+		changed = clouds.changed_blocks(previous, current, 32, 0.5)
+		self.assertEqual(changed.shape, (3, 4))
+		# the last block is only 6x4 px
+		self.assertEqual(list(zip(*np.where(changed))), [(2, 3)])
+		self.assertTrue(clouds.changed_blocks(previous, current, 32, 0.01)[0, 0])
+
+	def test_incremental(self):
+		allsky = clouds.Clouds(name="LaSilla", debugmode=True)
+		allsky.update()
+		previous = allsky.observability_map
+		self.assertTrue(np.array_equal(allsky.update_incremental(), previous.T, equal_nan=True))
+
+		# a cloud and two stars appear
+		image = allsky.im_original.copy()
+		image[100:180, 300:400] = image[100:180, 300:400] * 0.3 + 40
+		rows, cols = np.mgrid[:480, :640]
+		for xc, yc in [(200., 300.), (220., 330.)]:
+			image += 120 * np.exp(-0.5 * ((cols - xc) ** 2 + (rows - yc) ** 2) / 1.2 ** 2)
+		masked = image.copy()
+		masked[allsky.pixelmap.mask] = np.nan
+
+		reference = clouds.Clouds(name="LaSilla", debugmode=True)
+		reference.im_original, reference.im_masked = image, masked.copy()
+		x, y = reference.detect_stars()
+		expected = reference.get_observability_map(x, y)
+
+		allsky.im_original, allsky.im_masked = image, masked
+		observability = allsky.update_incremental(diff_threshold=0.5)
+		self.assertEqual(set(zip(x, y)), set(zip(*allsky.stars)))
+		self.assertTrue(np.allclose(observability, expected, equal_nan=True, atol=1e-12))
+		self.assertTrue(np.array_equal(allsky.observability_map, observability.T, equal_nan=True))
+
+		allsky.im_original = image * 0.5
+		self.assertIsNone(allsky.update_incremental())
+
+	def test_incremental_update(self):
+		allsky = clouds.Clouds(name="LaSilla", debugmode=True)
+		clouds.SETTINGS["clouds"]["incremental"] = "True"
+		try:
+			observability = allsky.update(donotdownloadtime=0)
+			stars = allsky.stars
+			self.assertTrue(np.array_equal(allsky.update(donotdownloadtime=0), observability, equal_nan=True))
+			# the stars were not detected again
+			self.assertIs(allsky.stars, stars)
+		finally:
+			clouds.SETTINGS["clouds"]["incremental"] = "False"
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,118 @@
+"""
+Testing script for the time series of binned cloud maps
+"""
+
+import os, sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from astropy.time import Time
+from astropy import units as u
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import clouds, cloudstore
+
+
+class CloudStoreTest(unittest.TestCase):
+	'''Store synthetic and debug cloud maps'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.allsky = clouds.Clouds(name="LaSilla", debugmode=True)
+		cls.pixelmap = cls.allsky.pixelmap
+
+	def setUp(self):
+		self.tmpdir = tempfile.mkdtemp()
+
+	def tearDown(self):
+		shutil.rmtree(self.tmpdir)
+
+	def test_bin_map(self):
+		store = cloudstore.CloudStore(self.tmpdir, naz=12, nalt=6)
+		observability = self.allsky.update()
+		binned = store.bin_map(observability, self.pixelmap)
+		self.assertEqual(binned.shape, (6, 12))
+
+		az, alt = self.pixelmap.az, self.pixelmap.alt
+		for ialt in range(6):
+			for iaz in range(12):
+				inside = (alt >= ialt * np.pi / 12.) & (alt < (ialt + 1) * np.pi / 12.) & (az >= iaz * np.pi / 6.) & (az < (iaz + 1) * np.pi / 6.)
+				values = observability[inside & ~self.pixelmap.mask]
+				values = values[~np.isnan(values)]
+				if len(values) == 0:
+					self.assertTrue(np.isnan(binned[ialt, iaz]))
+				else:
+					self.assertAlmostEqual(binned[ialt, iaz], np.mean(values), places=5)
+
+	def test_queries(self):
+		store = cloudstore.CloudStore(self.tmpdir, naz=4, nalt=2)
+		t0 = Time("2018-02-12 00:00:00", scale="utc")
+		# the eastern half clears up after 10 minutes, the rest stays cloudy
+		for i in range(20):
+			binned = np.zeros((2, 4))
+			if i >= 10:
+				binned[:, 1] = 1.
+			binned[0, 3] = np.nan
+			self.assertTrue(store.append(t0 + i * u.min, binned))
+		self.assertFalse(store.append(t0 + 5 * u.min, binned))
+		self.assertRaises(ValueError, store.append, t0 + 30 * u.min, np.zeros((4, 2)))
+
+		# reopened from disk, the grid of the folder is kept
+		store = cloudstore.CloudStore(self.tmpdir)
+		self.assertEqual((len(store), store.nalt, store.naz), (20, 2, 4))
+		self.assertIsInstance(store.maps, np.memmap)
+
+		# the bin centered on 135 deg
+		east = (np.deg2rad(100), np.deg2rad(170))
+		self.assertEqual(store.select(t0 + 10 * u.min, t0 + 14 * u.min), slice(10, 15))
+		self.assertEqual(store.clear_fraction(t0 + 10 * u.min, az=east), 1.)
+		self.assertEqual(store.clear_fraction(t0, t0 + 9 * u.min, az=east), 0.)
+		self.assertEqual(store.clear_fraction(t0 + 10 * u.min), 2. / 7.)
+		self.assertTrue(np.isnan(store.clear_fraction(t0 + 1 * u.day)))
+		# through the North, only the bins centered on 315 and 45 deg
+		self.assertEqual(store.clear_fraction(az=(np.deg2rad(300), np.deg2rad(60)), alt=(0, np.pi / 4.)), 0.)
+
+		times, fractions = store.series(az=(0., np.pi), alt=(np.pi / 4., np.pi / 2.))
+		self.assertTrue(np.allclose(times, t0.mjd + np.arange(20) / 1440.))
+		self.assertTrue(np.array_equal(fractions, [0.] * 10 + [0.5] * 10))
+
+	def test_interrupted(self):
+		store = cloudstore.CloudStore(self.tmpdir, naz=4, nalt=2)
+		t0 = Time("2018-02-12 00:00:00", scale="utc")
+		for i in range(3):
+			store.append(t0 + i * u.min, np.full((2, 4), i))
+
+		# an append interrupted after its map, and in the middle of its time
+		with open(os.path.join(self.tmpdir, "maps.f4"), "ab") as f:
+			f.write(np.full((2, 4), -1, dtype=np.float32).tobytes())
+		with open(os.path.join(self.tmpdir, "times.f8"), "ab") as f:
+			f.write(b"\0\0\0")
+		store = cloudstore.CloudStore(self.tmpdir)
+		self.assertEqual(len(store), 3)
+		self.assertEqual(store.maps.shape, (3, 2, 4))
+
+		for i in range(3, 5):
+			self.assertTrue(store.append(t0 + i * u.min, np.full((2, 4), i)))
+		self.assertEqual(len(store), 5)
+		self.assertEqual(os.path.getsize(os.path.join(self.tmpdir, "maps.f4")), 5 * 2 * 4 * 4)
+		self.assertTrue(np.array_equal(store.maps[:, 0, 0], np.arange(5)))
+		self.assertTrue(np.allclose(store.times, t0.mjd + np.arange(5) / 1440.))
+
+	def test_record(self):
+		clouds.SETTINGS["clouds"]["store"] = self.tmpdir
+		try:
+			allsky = clouds.Clouds(name="LaSilla", debugmode=True)
+			observability = allsky.update()
+			self.assertEqual(len(allsky.store), 1)
+			self.assertTrue(np.allclose(allsky.store.maps[0], allsky.store.bin_map(observability, allsky.pixelmap), equal_nan=True))
+			self.assertAlmostEqual(allsky.store.times[0], allsky.last_im_refresh.mjd)
+		finally:
+			clouds.SETTINGS["clouds"]["store"] = ""
+
+
+if __name__ == "__main__":
+
+	unittest.main()
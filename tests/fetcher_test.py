@@ -0,0 +1,119 @@
+"""
+Testing script for the conditional downloads, against a local HTTP server
+"""
+
+import os, sys
+import time
+import unittest
+import numpy as np
+from http.server import BaseHTTPRequestHandler
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import clouds, fetcher, resources
+import httpstub
+
+
+class Handler(BaseHTTPRequestHandler):
+	'''Serves the debug all-sky image with validators, like a web server serving a static file'''
+
+	def do_GET(self):
+		server = self.server
+		server.requests.append(dict(self.headers))
+		if self.path == "/slow":
+			time.sleep(2)
+		if server.honour_conditional and self.headers.get("If-None-Match") == server.etag:
+			self.send_response(304)
+			self.end_headers()
+			return
+		self.send_response(200)
+		self.send_header("Content-Type", "image/jpeg")
+		self.send_header("Content-Length", str(len(server.content)))
+		self.send_header("ETag", server.etag)
+		self.send_header("Last-Modified", "Wed, 14 Feb 2018 01:00:00 GMT")
+		self.end_headers()
+		try:
+			self.wfile.write(server.content)
+		except (BrokenPipeError, ConnectionResetError):
+			# the client timed out
+			pass
+
+	def log_message(self, *args):
+		pass
+
+
+class FetcherTest(unittest.TestCase):
+	'''Download the all-sky image from a local server'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.server = httpstub.start(Handler, "allsky.jpg")
+		with open(resources.path("config", "AllSkyDebugMode.jpg"), "rb") as f:
+			cls.server.content = f.read()
+		cls.url = cls.server.url
+
+	@classmethod
+	def tearDownClass(cls):
+		httpstub.stop(cls.server)
+
+	def setUp(self):
+		self.server.requests = []
+		self.server.etag = '"v1"'
+		self.server.honour_conditional = True
+
+	def test_conditional(self):
+		f = fetcher.Fetcher(self.url)
+		self.assertEqual(f.fetch(), fetcher.NEW)
+		self.assertEqual(f.content, self.server.content)
+		self.assertNotIn("If-None-Match", self.server.requests[0])
+
+		self.assertEqual(f.fetch(), fetcher.UNCHANGED)
+		self.assertEqual(self.server.requests[1]["If-None-Match"], '"v1"')
+		self.assertEqual(self.server.requests[1]["If-Modified-Since"], "Wed, 14 Feb 2018 01:00:00 GMT")
+		self.assertEqual(f.content, self.server.content)
+
+		# same body from a server ignoring the validators
+		self.server.honour_conditional = False
+		self.assertEqual(f.fetch(), fetcher.UNCHANGED)
+
+		self.server.content = self.server.content + b"\0"
+		self.server.etag = '"v2"'
+		self.assertEqual(f.fetch(), fetcher.NEW)
+		self.assertEqual(f.etag, '"v2"')
+		self.server.content = self.server.content[:-1]
+		f.close()
+
+	def test_failures(self):
+		f = fetcher.Fetcher(self.url.replace("allsky.jpg", "slow"), timeout=(1., 0.5))
+		t0 = time.time()
+		self.assertEqual(f.fetch(), fetcher.FAILED)
+		self.assertLess(time.time() - t0, 1.5)
+		self.assertIsNone(f.content)
+
+		self.assertEqual(fetcher.Fetcher(httpstub.closed_url(), timeout=(1., 1.)).fetch(), fetcher.FAILED)
+
+	def test_allsky(self):
+		allsky = clouds.Clouds(name="LaSilla")
+		allsky.fetcher.url = self.url
+		self.assertIsNotNone(allsky.update(donotdownloadtime=0))
+		observability = allsky.observability_map
+		self.assertEqual(observability.shape, (640, 480))
+
+		# the same image is not analysed again
+		self.assertIs(allsky.update(donotdownloadtime=0), observability)
+		self.assertIs(allsky.observability_map, observability)
+		self.assertEqual(len(self.server.requests), 2)
+
+		debug = clouds.Clouds(name="LaSilla", debugmode=True)
+		debug.update()
+		self.assertTrue(np.array_equal(debug.observability_map, observability, equal_nan=True))
+
+		allsky.fetcher.url = httpstub.closed_url()
+		self.assertIsNone(allsky.update(donotdownloadtime=0))
+		self.assertTrue(allsky.failed_connection)
+
+
+if __name__ == "__main__":
+
+	unittest.main()
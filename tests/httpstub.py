@@ -0,0 +1,42 @@
+"""
+Local HTTP server for the testing scripts of the downloads, see :file:`fetcher_test.py` and :file:`weatherservice_test.py`
+"""
+
+import threading
+import socketserver
+from http.server import HTTPServer, BaseHTTPRequestHandler
+
+
+class ThreadingHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+	'''Answers each request in its own thread, like http.server.ThreadingHTTPServer, which only exists from Python 3.7'''
+
+	daemon_threads = True
+
+
+def start(handler, path=""):
+	"""
+	Serves in a background thread on a free local port
+
+	:param handler: BaseHTTPRequestHandler class
+	:param path: string, path of the url attribute of the server
+	:return: the server, with its url attribute
+	"""
+	server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+	server.url = "http://127.0.0.1:{}/{}".format(server.server_address[1], path)
+	threading.Thread(target=server.serve_forever, daemon=True).start()
+	return server
+
+
+def stop(server):
+	server.shutdown()
+	server.server_close()
+
+
+def closed_url():
+	"""
+	:return: url of a port where nothing listens, the one of a closed server
+	"""
+	server = HTTPServer(("127.0.0.1", 0), BaseHTTPRequestHandler)
+	port = server.server_address[1]
+	server.server_close()
+	return "http://127.0.0.1:{}/".format(port)
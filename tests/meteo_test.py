@@ -0,0 +1,131 @@
+"""
+Testing script for the array computations of the meteo, compared against the Angle-based methods
+"""
+
+import os, sys
+import copy
+import gc
+import time
+import weakref
+import unittest
+import numpy as np
+from astropy.time import Time
+from astropy import units as u
+import astropy.coordinates.angles as angles
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import meteo
+
+
+class MeteoTest(unittest.TestCase):
+	'''Compare the array methods with the scalar ones'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.meteo = meteo.Meteo(name='LaSilla', cloudscheck=False, debugmode=True)
+		rs = np.random.RandomState(42)
+		cls.alphas = rs.uniform(0, 2*np.pi, 20)
+		cls.deltas = rs.uniform(-np.pi/2, np.pi/2, 20)
+		cls.times = Time("2018-02-12 01:00:00", scale="utc") + np.linspace(-6, 6, 7) * u.hour
+
+	def test_AzAlt_scalar(self):
+		for alpha, delta in zip(self.alphas, self.deltas):
+			az, alt = self.meteo.get_AzAlt(angles.Angle(alpha, unit="radian"), angles.Angle(delta, unit="radian"), obs_time=self.times[0])
+			aaz, aalt = self.meteo.get_AzAlt_array(alpha, delta, obs_times=self.times[0])
+			self.assertAlmostEqual(az.radian, float(aaz), places=9)
+			self.assertAlmostEqual(alt.radian, float(aalt), places=9)
+
+	def test_AzAlt_broadcast(self):
+		azs, alts = self.meteo.get_AzAlt_array(self.alphas, self.deltas, obs_times=self.times)
+		self.assertEqual(azs.shape, (len(self.alphas), len(self.times)))
+
+		for i, (alpha, delta) in enumerate(zip(self.alphas, self.deltas)):
+			for j, time in enumerate(self.times):
+				az, alt = self.meteo.get_AzAlt(angles.Angle(alpha, unit="radian"), angles.Angle(delta, unit="radian"), obs_time=time)
+				self.assertAlmostEqual(az.radian, azs[i, j], places=9)
+				self.assertAlmostEqual(alt.radian, alts[i, j], places=9)
+
+	def test_AzAlt_times(self):
+		azs, alts = self.meteo.get_AzAlt_array(self.alphas[0], self.deltas[0], obs_times=self.times)
+		self.assertEqual(azs.shape, (len(self.times),))
+		self.assertTrue(np.all(azs >= 0) and np.all(azs < 2*np.pi))
+
+	def test_ephemerides(self):
+		table = self.meteo.get_ephemerides(self.times[3])
+		self.assertTrue(table.covers(self.times))
+		self.assertIs(self.meteo.get_ephemerides(self.times[-1]), table)
+
+		eph = table.get(self.times + 30 * u.s)
+		for i, time in enumerate(self.times + 30 * u.s):
+			moonaz, moonalt = self.meteo.get_moon(obs_time=time)
+			sunaz, sunalt = self.meteo.get_sun(obs_time=time)
+			# interpolation on a one-minute grid: errors well below an arcsecond
+			self.assertAlmostEqual(moonalt.radian, eph["moonalt"][i], places=6)
+			self.assertAlmostEqual(moonaz.radian, eph["moonaz"][i], places=5)
+			self.assertAlmostEqual(sunalt.radian, eph["sunalt"][i], places=6)
+			self.assertAlmostEqual(sunaz.radian, eph["sunaz"][i], places=5)
+			self.assertAlmostEqual(self.meteo.moon.phase, eph["moonphase"][i], places=3)
+
+		later = self.times[0] + 2 * u.day
+		self.assertFalse(table.covers(later))
+		self.assertTrue(self.meteo.get_ephemerides(later).covers(later))
+
+		# the cached tables are shared between Meteo objects, and do not keep them alive
+		other = meteo.Meteo(name='LaSilla', cloudscheck=False, debugmode=True, minimal=True)
+		self.assertIs(other.get_ephemerides(self.times[3]), table)
+		other = weakref.ref(other)
+		gc.collect()
+		self.assertIsNone(other())
+
+	def test_concurrent_update(self):
+		obs_time = Time("2018-02-12 03:00:00", scale="utc")
+		sequential = meteo.Meteo(name='LaSilla', cloudscheck=True, debugmode=True, minimal=True)
+		sequential.update(obs_time, concurrent=False)
+		concurrent = meteo.Meteo(name='LaSilla', cloudscheck=True, debugmode=True, minimal=True)
+		allsky = concurrent.allsky
+		concurrent.update(obs_time, concurrent=True)
+
+		self.assertEqual(concurrent.time, obs_time)
+		for attr in ["moonalt", "moonaz", "sunalt", "sunaz"]:
+			self.assertAlmostEqual(getattr(concurrent, attr).radian, getattr(sequential, attr).radian, places=12)
+		for attr in ["winddirection", "windspeed", "temperature", "humidity", "moonphase"]:
+			self.assertEqual(getattr(concurrent, attr), getattr(sequential, attr))
+		self.assertIsNotNone(concurrent.lastest_weatherupdate_time)
+		self.assertTrue(np.array_equal(concurrent.cloudmap, sequential.cloudmap, equal_nan=True))
+		# the analysis ran on a copy, committed at the end
+		self.assertIsNot(concurrent.allsky, allsky)
+		self.assertIs(concurrent.cloudmap, concurrent.allsky.observability_map)
+
+		# the state changed in place by the next analysis is not shared with the copy
+		analysed = concurrent.allsky
+		duplicate = copy.copy(analysed)
+		self.assertIsNot(duplicate.analysed_image, analysed.analysed_image)
+		self.assertTrue(np.array_equal(duplicate.analysed_image, analysed.analysed_image))
+		self.assertIsNot(duplicate.nowcaster, analysed.nowcaster)
+		self.assertIs(duplicate.fetcher, analysed.fetcher)
+
+	def test_concurrent_latency(self):
+		currentmeteo = meteo.Meteo(name='LaSilla', cloudscheck=False, debugmode=True, minimal=True)
+		get = currentmeteo.weatherReport.get_reading
+		def slow_get(*args, **kwargs):
+			time.sleep(0.5)
+			return get(*args, **kwargs)
+		currentmeteo.weatherReport.get_reading = slow_get
+		ephemerides = currentmeteo.get_ephemerides
+		ephemerides(self.times[3])
+		def slow_ephemerides(obs_time):
+			time.sleep(0.5)
+			return ephemerides(obs_time)
+		currentmeteo.get_ephemerides = slow_ephemerides
+
+		t0 = time.time()
+		currentmeteo.update(self.times[3], concurrent=True)
+		self.assertLess(time.time() - t0, 0.9)
+		self.assertNotEqual(currentmeteo.windspeed, -1)
+
+
+if __name__ == "__main__":
+
+	unittest.main()
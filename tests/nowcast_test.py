@@ -0,0 +1,102 @@
+"""
+Testing script for the cloud motion nowcast
+"""
+
+import os, sys
+import unittest
+import numpy as np
+import scipy.ndimage as ndimage
+from astropy.time import Time
+from astropy import units as u
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import nowcast
+
+
+def cloudfield(shape, seed=0):
+	"""
+	Smooth random observability map between 0 and 1
+	"""
+	rs = np.random.RandomState(seed)
+	field = ndimage.gaussian_filter(rs.uniform(0, 1, shape), 6, mode="wrap")
+	return (field - field.min()) / (field.max() - field.min())
+
+
+class NowcastTest(unittest.TestCase):
+	'''Recover known translations of synthetic cloud fields'''
+
+	def setUp(self):
+		self.shape = (256, 320)
+		self.field = cloudfield((self.shape[0] + 64, self.shape[1] + 64))
+
+	def shifted(self, dy, dx):
+		"""
+		:return: the map seen through the window moved by (-dy, -dx), i.e. the clouds moved by (dy, dx)
+		"""
+		return self.field[32 - dy:32 - dy + self.shape[0], 32 - dx:32 - dx + self.shape[1]].copy()
+
+	def test_motion_field(self):
+		previous, current = self.shifted(0, 0), self.shifted(3, -5)
+		dy, dx, measured = nowcast.motion_field(previous, current, blocksize=64, maxshift=8)
+		self.assertEqual(dy.shape, (4, 5))
+		self.assertTrue(np.all(measured))
+		np.testing.assert_allclose(dy, 3., atol=0.3)
+		np.testing.assert_allclose(dx, -5., atol=0.3)
+
+	def test_masked_blocks(self):
+		previous, current = self.shifted(0, 0), self.shifted(2, 2)
+		previous[:64, :64] = np.nan
+		current[:64, :64] = np.nan
+		# a clear sky has no motion
+		previous[-64:, -64:] = 1.
+		current[-64:, -64:] = 1.
+		dy, dx, measured = nowcast.motion_field(previous, current, blocksize=64, maxshift=8)
+		self.assertFalse(measured[0, 0])
+		self.assertFalse(measured[-1, -1])
+		self.assertEqual(measured.sum(), measured.size - 2)
+
+		dy, dx = nowcast.regularise(dy, dx, measured)
+		self.assertFalse(np.any(np.isnan(dy)) or np.any(np.isnan(dx)))
+		np.testing.assert_allclose(dy, 2., atol=0.3)
+		np.testing.assert_allclose(dx, 2., atol=0.3)
+
+		dy, dx = nowcast.regularise(dy, dx, np.zeros_like(measured))
+		self.assertTrue(np.all(dy == 0) and np.all(dx == 0))
+
+	def test_advect(self):
+		current = self.shifted(0, 0)
+		current[:10, :10] = np.nan
+		dy, dx = np.full((4, 5), 4.), np.full((4, 5), -2.)
+		predicted = nowcast.advect(current, dy, dx, blocksize=64)
+		self.assertEqual(predicted.shape, current.shape)
+		self.assertTrue(np.all(np.isnan(predicted[:10, :10])))
+		expected = self.shifted(4, -2)
+		np.testing.assert_allclose(predicted[20:-20, 20:-20], expected[20:-20, 20:-20], atol=1e-6)
+
+	def test_nowcaster(self):
+		t0 = Time("2018-03-01 03:00:00")
+		nowcaster = nowcast.Nowcaster(blocksize=64, maxshift=8, maxtime=20.)
+		nowcaster.add(t0, self.shifted(0, 0))
+		self.assertIsNone(nowcaster.predict(t0 + 5 * u.min))
+
+		# 2 px per minute along the rows
+		nowcaster.add(t0 + 2 * u.min, self.shifted(4, 0))
+		self.assertIsNone(nowcaster.predict(t0 + 1 * u.min))
+		predicted = nowcaster.predict(t0 + 4 * u.min)
+		np.testing.assert_allclose(predicted[20:-20, 20:-20], self.shifted(8, 0)[20:-20, 20:-20], atol=0.05)
+		self.assertIs(nowcaster.predict(t0 + 4 * u.min), predicted)
+
+		# beyond maxtime, the prediction stops moving
+		far = nowcaster.predict(t0 + 60 * u.min)
+		self.assertIs(nowcaster.predict(t0 + 22 * u.min), far)
+
+		# no motion across a gap in the images
+		nowcaster.add(t0 + 30 * u.min, self.shifted(4, 0))
+		self.assertIsNone(nowcaster.predict(t0 + 35 * u.min))
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,85 @@
+"""
+Testing script for the all-sky lookup tables
+"""
+
+import os, sys
+import copy
+import unittest
+import numpy as np
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import pixelmap, util
+
+
+class PixelMapTest(unittest.TestCase):
+	'''Compare the lookup tables with the station methods'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.station = util.load_station("LaSilla").AllSky()
+		rs = np.random.RandomState(0)
+		cls.az = rs.uniform(0, 2 * np.pi, 500)
+		cls.alt = rs.uniform(-0.2, np.pi / 2, 500)
+
+	def test_image_coordinates(self):
+		xs, ys = self.station.get_image_coordinates(self.az, self.alt)
+		for az, alt, x, y in zip(self.az, self.alt, xs, ys):
+			sx, sy = self.station.get_image_coordinates(az, alt)
+			self.assertTrue(np.isnan(sx) if np.isnan(x) else sx == x)
+			self.assertTrue(np.isnan(sy) if np.isnan(y) else sy == y)
+
+		# the pixels are in the directions they are computed from
+		az, alt = self.station.get_sky_coordinates(xs, ys)
+		# the projection folds around the zenith
+		inside = ~np.isnan(xs) & (self.alt < np.deg2rad(89.))
+		np.testing.assert_allclose(np.cos(az[inside] - self.az[inside]), 1., atol=1e-12)
+		np.testing.assert_allclose(alt[inside], self.alt[inside], atol=1e-12)
+
+	def test_pixels(self):
+		table = pixelmap.PixelMap.build(self.station)
+		self.assertEqual(table.shape, (480, 640))
+		self.assertTrue(np.array_equal(table.mask, self.station.get_mask(np.empty((480, 640)))))
+
+		for shape in [(640, 480), (300, 200)]:
+			xi, yi, valid = table.pixels(self.az, self.alt, shape=shape)
+			for i, (az, alt) in enumerate(zip(self.az, self.alt)):
+				x, y = self.station.get_image_coordinates(az, alt)
+				try:
+					x, y = int(np.round(x)), int(np.round(y))
+					expected = x < shape[0] and y < shape[1]
+				except ValueError:
+					expected = False
+				self.assertEqual(valid[i], expected)
+				if expected:
+					self.assertEqual((xi[i], yi[i]), (x, y))
+
+	def test_persistence(self):
+		fpath = pixelmap.filepath("LaSilla")
+		table = pixelmap.load("LaSilla", self.station)
+		self.assertTrue(os.path.exists(fpath))
+		self.assertIs(pixelmap.load("LaSilla", self.station), table)
+
+		pixelmap._pixelmaps.clear()
+		loaded = pixelmap.load("LaSilla", self.station)
+		self.assertIsNot(loaded, table)
+		self.assertTrue(np.array_equal(loaded.alt, table.alt))
+
+		# a new calibration invalidates the saved tables
+		station = copy.deepcopy(self.station)
+		station.params["cx"] += 10
+		moved = pixelmap.load("LaSilla", station)
+		self.assertNotEqual(moved.checksum, table.checksum)
+		self.assertTrue(np.array_equal(moved.mask, table.mask))
+		self.assertFalse(np.allclose(moved.az, table.az))
+		with np.load(fpath) as data:
+			self.assertEqual(str(data["checksum"]), moved.checksum)
+
+		pixelmap._pixelmaps.clear()
+		self.assertEqual(pixelmap.load("LaSilla", self.station).checksum, table.checksum)
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,133 @@
+"""
+Testing script for the replay of archived weather reports and all-sky images
+"""
+
+import os, sys
+import io
+import re
+import json
+import time
+import shutil
+import tempfile
+import unittest
+import numpy as np
+from astropy.time import Time
+from astropy import units as u
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import cli, fetcher, meteo, providers, resources
+
+
+class ReplayTest(unittest.TestCase):
+	'''Replay an archive made of the debug report and image'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.tmpdir = tempfile.mkdtemp()
+		text = resources.read_text("config", "meteoDebugMode.last")
+
+		# one history of 10 reports a minute apart, with an increasing wind speed
+		cls.t0 = Time("2018-02-08 16:30:00", scale="utc")
+		history = ""
+		for i in range(10):
+			report = text.replace("2018-02-08  16:36", (cls.t0 + i * u.min).strftime("%Y-%m-%d  %H:%M"))
+			history += report.replace("WS1 M/S 10M    2.7    2.7", "WS1 M/S 10M    2.7    {:3.1f}".format(2. + i))
+		cls.weatherfile = os.path.join(cls.tmpdir, "meteo.last")
+		with open(cls.weatherfile, "w") as f:
+			f.write(history)
+
+		# 3 frames, at 16:31, 16:34 and 16:37
+		cls.allskyfiles = []
+		for i in range(3):
+			cls.allskyfiles.append(os.path.join(cls.tmpdir, "allsky{}.jpg".format(i)))
+			shutil.copyfile(resources.path("config", "AllSkyDebugMode.jpg"), cls.allskyfiles[-1])
+			t = (cls.t0 + (1 + 3 * i) * u.min).unix
+			os.utime(cls.allskyfiles[-1], (t, t))
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.tmpdir)
+
+	def test_channels(self):
+		replay = providers.ReplayProvider([self.weatherfile], self.allskyfiles[::-1], speed=0.)
+		self.assertEqual(len(replay.weather), 10)
+		self.assertEqual(len(replay.allsky), 3)
+		self.assertAlmostEqual(replay.now().unix, self.t0.unix, places=3)
+
+		self.assertEqual(replay.allsky.fetch(), fetcher.FAILED)
+		self.assertEqual(replay.weather.fetch(), fetcher.NEW)
+		self.assertIn(b"16:30", replay.weather.content)
+		self.assertEqual(replay.weather.fetch(), fetcher.UNCHANGED)
+
+		times = []
+		while True:
+			t = replay.advance()
+			if t is None:
+				break
+			times.append(int(round((t - self.t0).to_value("min"))))
+		self.assertEqual(times, list(range(1, 10)))
+		self.assertEqual(replay.weather.fetch(), fetcher.NEW)
+		self.assertIn(b"16:39", replay.weather.content)
+		self.assertEqual(replay.allsky.fetch(), fetcher.NEW)
+		self.assertEqual(replay.allsky.index, 2)
+
+	def test_speed(self):
+		replay = providers.ReplayProvider([self.weatherfile], speed=600., start=self.t0 + 30 * u.s)
+		self.assertEqual(replay.weather.fetch(), fetcher.NEW)
+		self.assertEqual(replay.weather.index, 0)
+		# 10 replayed minutes per second
+		time.sleep(0.2)
+		self.assertEqual(replay.weather.fetch(), fetcher.NEW)
+		self.assertGreaterEqual(replay.weather.index, 2)
+
+	def test_meteo(self):
+		replay = providers.ReplayProvider([self.weatherfile], self.allskyfiles, speed=0., start=self.t0 + 1 * u.min)
+		currentmeteo = meteo.Meteo(name='LaSilla', cloudscheck=True, debugmode=True, minimal=True, provider=replay)
+		self.assertIs(currentmeteo.allsky.fetcher, replay.allsky)
+
+		windspeeds = []
+		while True:
+			currentmeteo.update(replay.now(), concurrent=True)
+			self.assertEqual(currentmeteo.lastest_weatherupdate_time, replay.now())
+			self.assertIsNotNone(currentmeteo.cloudmap)
+			# the image is not downloaded again within 1.5 min, see Clouds.update
+			self.assertLess((replay.now() - currentmeteo.allsky.last_im_refresh).to_value("min"), 1.5)
+			windspeeds.append(currentmeteo.windspeed)
+			if replay.advance() is None:
+				break
+		# the 3.6m anemometer is flagged, the speed is the mean of the two others
+		np.testing.assert_allclose(windspeeds, (2.7 + np.arange(3., 12.)) / 2.)
+		self.assertEqual(len(currentmeteo.weatherhistory), 9)
+
+	def run_cli(self, *argv):
+		catpath = os.path.join(path, "../cats/example.pouet")
+		stream = io.StringIO()
+		self.assertEqual(cli.main([catpath, "--start", "2018-02-08 16:35:00", "--format", "json"] + list(argv), stream=stream), 0)
+		return [json.loads(line) for line in stream.getvalue().splitlines()]
+
+	def test_cli(self):
+		# without weather nor all-sky
+		rows = self.run_cli()
+		self.assertTrue(any(r["observability"] > 0 for r in rows))
+		self.assertTrue(all(r["cloudcover"] is None for r in rows))
+
+		# the replayed reports are used at the replay time: above the closing wind level, nothing is observable
+		windy = os.path.join(self.tmpdir, "windy.last")
+		with open(self.weatherfile) as f:
+			text = f.read()
+		with open(windy, "w") as f:
+			f.write(re.sub(r"^(WS[12] M/S 10M) .*$", r"\1   25.0   25.0   25.0   25.0    0.0", text, flags=re.M))
+		windyrows = self.run_cli("--weather", "--replay-weather", windy)
+		self.assertEqual([r["name"] for r in windyrows], [r["name"] for r in rows])
+		self.assertTrue(all(r["observability"] == 0 for r in windyrows))
+
+		# and so is the replayed all-sky image
+		cloudrows = self.run_cli("--clouds", "--replay-weather", self.weatherfile, "--replay-allsky", *self.allskyfiles)
+		self.assertTrue(any(r["cloudcover"] is not None for r in cloudrows))
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,73 @@
+"""
+Testing script for the parallel reprocessing of archived all-sky images
+"""
+
+import os, sys
+import csv
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import clouds, reprocess, resources
+
+
+class ReprocessTest(unittest.TestCase):
+	'''Reprocess copies of the debug all-sky image'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.tmpdir = tempfile.mkdtemp()
+		cls.archive = os.path.join(cls.tmpdir, "archive")
+		os.makedirs(cls.archive)
+		for i in range(4):
+			shutil.copy(resources.path("config", "AllSkyDebugMode.jpg"), os.path.join(cls.archive, "frame{}.jpg".format(i)))
+		with open(os.path.join(cls.archive, "broken.jpg"), "wb") as f:
+			f.write(b"not an image")
+		with open(os.path.join(cls.archive, "notes.txt"), "w") as f:
+			f.write("not a frame")
+
+	@classmethod
+	def tearDownClass(cls):
+		shutil.rmtree(cls.tmpdir)
+
+	def test_find_frames(self):
+		frames = reprocess.find_frames([self.archive, os.path.join(self.archive, "frame*.jpg")])
+		self.assertEqual([os.path.basename(f) for f in frames], ["broken.jpg", "frame0.jpg", "frame1.jpg", "frame2.jpg", "frame3.jpg"])
+
+	def test_reprocess(self):
+		frames = reprocess.find_frames([self.archive])
+		outdir = os.path.join(self.tmpdir, "out")
+		shards = reprocess.reprocess(frames, outdir, processes=2, shardsize=2)
+		self.assertEqual(len(shards), 3)
+
+		allsky = clouds.Clouds(name="LaSilla", debugmode=True)
+		expected = allsky.update()
+
+		results = [reprocess.read_shard(shard) for shard in shards]
+		self.assertEqual(list(np.concatenate([r["files"] for r in results])), frames)
+		status = np.concatenate([r["status"] for r in results])
+		self.assertEqual(list(status), [reprocess.FAILED] + [reprocess.OK] * 4)
+		self.assertTrue(np.all(np.isnan(results[0]["maps"][0])))
+
+		last = results[-1]
+		self.assertEqual(last["maps"].shape, (1, 480, 640))
+		self.assertTrue(np.allclose(last["maps"][0], expected, atol=1e-3, equal_nan=True))
+		x = last["x"][last["offsets"][0]:last["offsets"][1]]
+		self.assertEqual(len(x), len(allsky.stars[0]))
+		self.assertEqual(last["nstars"][0], len(x))
+
+		with open(os.path.join(outdir, "summary.tsv")) as f:
+			rows = list(csv.DictReader(f, delimiter="\t"))
+		self.assertEqual(len(rows), len(frames))
+		sky = expected[~np.isnan(expected)]
+		self.assertAlmostEqual(float(rows[-1]["clearfraction"]), np.mean(sky > 0.5), places=6)
+		self.assertEqual(rows[0]["status"], str(reprocess.FAILED))
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,49 @@
+"""
+Testing script for the location of the files shipped with POUET
+"""
+
+import os, sys
+import inspect
+import unittest
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import resources, meteo, run
+
+
+class ResourcesTest(unittest.TestCase):
+	'''Resolve the config files, debug data and obsprograms'''
+
+	def test_files(self):
+		self.assertEqual(os.path.realpath(str(resources.files())), os.path.realpath(path))
+		self.assertTrue(os.path.isfile(resources.path("config", "AllSkyDebugMode.jpg")))
+		self.assertIn("LaSilla.cfg", resources.contents("config"))
+		self.assertIn("[weather]", resources.read_text("config", "LaSilla.cfg"))
+
+	def test_config(self):
+		self.assertIs(resources.settings(), resources.settings())
+		self.assertEqual(resources.station_config("LaSilla").get("location", "elevation"), meteo.Meteo(name="LaSilla", cloudscheck=False, debugmode=True, minimal=True).location.get("location", "elevation"))
+
+	def test_obsprograms(self):
+		names = resources.obsprograms()
+		self.assertIn("default", names)
+		self.assertIn("lens", names)
+		self.assertEqual(sorted(p["name"] for p in run.retrieve_obsprogramlist()), names)
+
+	def test_no_stack_inspection(self):
+		# building a Meteo must not walk the call stack
+		stack = inspect.stack
+		def fail(*args, **kwargs):
+			raise AssertionError("inspect.stack called")
+		inspect.stack = fail
+		try:
+			currentmeteo = meteo.Meteo(name="LaSilla", cloudscheck=True, debugmode=True)
+			currentmeteo.allsky
+		finally:
+			inspect.stack = stack
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,92 @@
+"""
+Testing script for the vectorized sky grid, compared against one pyephem body per grid point
+"""
+
+import os, sys
+import unittest
+import numpy as np
+import ephem
+from astropy.time import Time
+from astropy import units as u
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import meteo, skygrid, util
+
+
+class SkygridTest(unittest.TestCase):
+	'''Compare the vectorized sky grid with pyephem'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.meteo = meteo.Meteo(name='LaSilla', cloudscheck=False, debugmode=True)
+		cls.meteo.update(obs_time=Time("2018-02-12 03:00:00", scale="utc"), minimal=True)
+		cls.fields = skygrid.compute_fields(cls.meteo, res_x=80, res_y=40)
+
+	def test_fields(self):
+		ras, decs = self.fields["ras"], self.fields["decs"]
+		self.assertEqual(self.fields["airmass"].shape, (len(decs), len(ras)))
+
+		observer = self.meteo.get_observer(self.meteo.time)
+		moon = ephem.Moon()
+		moon.compute(observer)
+		altdiff = []
+		for i, ra in enumerate(ras):
+			for j, dec in enumerate(decs):
+				star = ephem.FixedBody()
+				star._ra = ra
+				star._dec = dec
+				star.compute(observer)
+				if star.alt > np.deg2rad(10.):
+					altdiff.append(np.abs(star.alt - self.fields["altitude"][j, i]))
+				self.assertAlmostEqual(ephem.separation((moon.ra, moon.dec), (ra, dec)), self.fields["moonsep"][j, i], places=5)
+		# pyephem includes the refraction and precession, not the simple formula of Meteo.get_AzAlt
+		self.assertLess(np.max(altdiff), np.deg2rad(1.))
+
+	def test_masks(self):
+		masks = skygrid.visibility_masks(self.fields, self.meteo, 1.5, 30., check_wind=False)
+		visible = self.fields["airmass"] < 1.5
+		self.assertTrue(np.all(masks["vis"][visible] == 1))
+		self.assertTrue(np.all(np.isnan(masks["vis"][~visible])))
+		self.assertTrue(np.all(np.isnan(masks["sep"][~visible])))
+		self.assertTrue(np.all(masks["sep"][~np.isnan(masks["sep"])] > 30.))
+		self.assertIsNone(masks["windlevel"])
+
+		windspeed, winddirection = self.meteo.windspeed, self.meteo.winddirection
+		self.meteo.windspeed, self.meteo.winddirection = 16., 90.
+		masks = skygrid.visibility_masks(self.fields, self.meteo, 1.5, 30.)
+		self.assertEqual(masks["windlevel"], "warn")
+		towind = np.rad2deg(util.angular_separation(np.pi / 2., 0., self.fields["azimuth"], 0.))
+		self.assertTrue(np.all(towind[visible & (masks["wind"] == 1)] < 90))
+
+		self.meteo.windspeed = 25.
+		masks = skygrid.visibility_masks(self.fields, self.meteo, 1.5, 30.)
+		self.assertEqual(masks["windlevel"], "limit")
+		self.assertTrue(np.all(masks["wind"][visible] == 1))
+		self.meteo.windspeed, self.meteo.winddirection = windspeed, winddirection
+
+	def test_cache(self):
+		cache = skygrid.FieldCache(maxsize=1., timebucket=60.)
+		time = Time("2018-02-12 03:00:10", scale="utc")
+		fields = cache.get(self.meteo, time, res_x=80, res_y=40)
+		self.assertIs(cache.get(self.meteo, time + 30 * u.s, res_x=80, res_y=40), fields)
+		self.assertIsNot(cache.get(self.meteo, time + 60 * u.s, res_x=80, res_y=40), fields)
+		self.assertIsNot(cache.get(self.meteo, time, res_x=40, res_y=20), fields)
+		self.assertEqual((cache.hits, cache.misses), (1, 3))
+
+		# a 80 x 40 grid takes about 100 kB, the oldest ones are evicted to stay within 1 MB
+		for minute in range(20):
+			cache.get(self.meteo, time + minute * u.min, res_x=80, res_y=40)
+		self.assertLessEqual(cache.nbytes, cache.maxbytes)
+		self.assertLess(len(cache), 20)
+		self.assertNotIn(cache.key(self.meteo, time, 80, 40), cache.entries)
+		self.assertIn(cache.key(self.meteo, time + 19 * u.min, 80, 40), cache.entries)
+
+		cache.clear()
+		self.assertEqual((len(cache), cache.nbytes), (0, 0))
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,56 @@
+"""
+Startup-time benchmark: wall time of `import pouet` and `run.startup`, each measured in a fresh interpreter
+
+The light core (coordinates, airmass, observability) must not import the heavy modules, which are loaded only when cloud analysis, plotting or finding charts are used.
+"""
+
+import os, sys
+import json
+import subprocess
+import unittest
+
+rootpath = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '..')
+
+HEAVY = ["scipy", "requests", "matplotlib", "PyQt5", "astroquery", "clouds", "plots"]
+
+BENCHMARK = """
+import sys, time, json
+sys.path.insert(0, {rootpath!r})
+t0 = time.time()
+import pouet
+t1 = time.time()
+import run
+t2 = time.time()
+currentmeteo = run.startup(name='LaSilla', cloudscheck=False, debugmode=True, minimal=True)
+t3 = time.time()
+heavy = [m for m in {heavy!r} if m in sys.modules]
+print(json.dumps({{"import pouet": t1 - t0, "import run": t2 - t1, "run.startup": t3 - t2, "heavy": heavy}}))
+"""
+
+
+def benchmark(repeat=3):
+	"""
+	:param repeat: number of fresh interpreters to start
+	:return: list of dictionaries of wall times in seconds, and the heavy modules that were imported
+	"""
+	results = []
+	for _ in range(repeat):
+		out = subprocess.check_output([sys.executable, "-c", BENCHMARK.format(rootpath=rootpath, heavy=HEAVY)], stderr=subprocess.DEVNULL)
+		results.append(json.loads(out.decode().strip().splitlines()[-1]))
+	return results
+
+
+class StartupTest(unittest.TestCase):
+	'''Track the startup time of the core library'''
+
+	def test_startup(self):
+		results = benchmark()
+		for key in ["import pouet", "import run", "run.startup"]:
+			print("{:>14s}: best {:.3f} s".format(key, min(r[key] for r in results)))
+		for r in results:
+			self.assertEqual(r["heavy"], [])
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,119 @@
+"""
+Testing script for the ring buffer of the weather readings, compared against the statistics of all the readings
+"""
+
+import os, sys
+import unittest
+import numpy as np
+from astropy.time import Time
+from astropy import units as u
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import meteo, resources, weatherhistory
+
+
+class WeatherHistoryTest(unittest.TestCase):
+	'''Rolling statistics of a random stream of readings'''
+
+	def setUp(self):
+		rs = np.random.RandomState(3)
+		n = 500
+		self.t0 = Time("2018-02-12 01:00:00", scale="utc")
+		# irregular readings, about every 30 s
+		self.minutes = np.cumsum(rs.uniform(0.1, 1., n))
+		self.readings = np.column_stack([rs.uniform(0, 360, n), rs.uniform(0, 25, n), rs.uniform(5, 20, n), rs.uniform(10, 95, n)])
+		# missing values of the weather report
+		self.readings[rs.uniform(size=n) < 0.05, 1] = -9999
+		self.readings[rs.uniform(size=n) < 0.05, 3] = -9999
+
+	def test_stats(self):
+		history = weatherhistory.WeatherHistory(capacity=50, windows=[5., 10.])
+		for i, (minute, values) in enumerate(zip(self.minutes, self.readings)):
+			history.append(self.t0 + minute * u.min, *values)
+			for window in [5, 10]:
+				stats = history.stats(window)
+				inside = np.arange(max(0, i - 49), i + 1)
+				inside = inside[self.minutes[inside] >= minute - window - 1e-6]
+				self.assertEqual(stats["count"], len(inside))
+
+				wd, ws, t, rh = self.readings[inside].T
+				ws, rh = ws[ws >= 0], rh[rh >= 0]
+				for name, values in [("windspeed", ws), ("temperature", t), ("humidity", rh)]:
+					if len(values):
+						self.assertAlmostEqual(stats[name], np.mean(values), places=9)
+					else:
+						self.assertTrue(np.isnan(stats[name]))
+				for name, values in [("windgust", ws), ("humiditymax", rh)]:
+					if len(values):
+						self.assertEqual(stats[name], np.max(values))
+					else:
+						self.assertTrue(np.isnan(stats[name]))
+				direction = np.rad2deg(np.arctan2(np.sin(np.deg2rad(wd)).sum(), np.cos(np.deg2rad(wd)).sum())) % 360.
+				self.assertAlmostEqual(np.cos(np.deg2rad(stats["winddirection"] - direction)), 1., places=6)
+
+		with self.assertRaises(KeyError):
+			history.stats(3)
+
+	def test_ring(self):
+		history = weatherhistory.WeatherHistory(capacity=20, windows=[1000.])
+		for minute, values in zip(self.minutes[:30], self.readings[:30]):
+			history.append(self.t0 + minute * u.min, *values)
+		self.assertEqual(len(history), 20)
+		self.assertEqual(history.times.size, 20)
+		self.assertEqual(history.stats(1000)["count"], 20)
+
+		times, values = history.series()
+		np.testing.assert_allclose(times, (self.t0 + self.minutes[10:30] * u.min).unix)
+		np.testing.assert_array_equal(values["temperature"], self.readings[10:30, 2])
+		self.assertTrue(np.all(np.diff(times) > 0))
+
+		# readings older than the last one are ignored
+		history.append(self.t0, 0., 0., 0., 0.)
+		self.assertEqual(history.count, 30)
+
+	def test_direction(self):
+		history = weatherhistory.WeatherHistory(windows=[10.])
+		history.append(self.t0, 350., 10., 10., 50.)
+		history.append(self.t0 + 1 * u.min, 10., 20., 10., 50.)
+		stats = history.stats(10)
+		self.assertAlmostEqual(np.cos(np.deg2rad(stats["winddirection"])), 1., places=9)
+		self.assertEqual(stats["windspeed"], 15.)
+		self.assertEqual(stats["windgust"], 20.)
+
+		history.append(self.t0 + 20 * u.min, -9999, -9999, 10., 50.)
+		stats = history.stats(10)
+		self.assertEqual(stats["count"], 1)
+		self.assertTrue(np.isnan(stats["windspeed"]) and np.isnan(stats["windgust"]) and np.isnan(stats["winddirection"]))
+
+	def test_meteo(self):
+		settings = resources.settings()
+		statistic = settings["weather"]["windstatistic"]
+		currentmeteo = meteo.Meteo(name='LaSilla', cloudscheck=False, debugmode=True, minimal=True)
+		window = float(settings["weather"]["windwindow"])
+		try:
+			for i, ws in enumerate([5., 18., 8.]):
+				currentmeteo._set_weather((200., ws, 10., 50.), self.t0 + i * u.min)
+			# the same reading is only kept once
+			currentmeteo._set_weather((200., 8., 10., 50.), self.t0 + 2 * u.min)
+			self.assertEqual(currentmeteo.weatherhistory.stats(window)["count"], 3)
+			# the same report downloaded again later is kept once, at the time of the report
+			for i in range(3, 6):
+				currentmeteo._set_weather((200., 8., 10., 50.), self.t0 + i * u.min, self.t0 + 2.5 * u.min)
+			self.assertEqual(currentmeteo.weatherhistory.stats(window)["count"], 4)
+			self.assertEqual(currentmeteo.lastest_weatherupdate_time, self.t0 + 5 * u.min)
+
+			settings["weather"]["windstatistic"] = "last"
+			self.assertEqual(currentmeteo.get_windspeed(), 8.)
+			settings["weather"]["windstatistic"] = "mean"
+			self.assertAlmostEqual(currentmeteo.get_windspeed(), 39. / 4.)
+			settings["weather"]["windstatistic"] = "gust"
+			self.assertEqual(currentmeteo.get_windspeed(), 18.)
+		finally:
+			settings["weather"]["windstatistic"] = statistic
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,95 @@
+"""
+Testing script for the parser of the fixed-width weather reports
+"""
+
+import os, sys
+import shutil
+import tempfile
+import unittest
+import numpy as np
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import resources, util, weatherparser
+
+
+class WeatherParserTest(unittest.TestCase):
+	'''Parse the debug report and archives made of it'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.text = resources.read_text("config", "meteoDebugMode.last")
+
+	def test_parse(self):
+		reports, readings = weatherparser.parse(self.text)
+		self.assertEqual(len(reports), 1)
+		self.assertEqual(reports["time"][0], np.datetime64("2018-02-08T16:36"))
+		self.assertEqual(reports["site"][0], "LASILLA1")
+		self.assertEqual(len(readings), 13)
+		self.assertTrue(np.all(readings["report"] == 0))
+
+		# the fixed columns of the average
+		lines = [line for line in self.text.split("\n") if line[:1].isalpha()]
+		self.assertEqual(len(lines), len(readings))
+		for line, reading in zip(lines, readings):
+			self.assertTrue(line.startswith(reading["sensor"]))
+			self.assertEqual(float(line[18:25]), reading["ave"])
+
+		t = readings[readings["sensor"] == "T"]
+		self.assertEqual(list(t["station"]), [1, 2, 3])
+		self.assertEqual(list(t["valid"]), [True, True, False])
+		self.assertEqual(t["unit"][0], "C")
+		self.assertEqual(t["interval"][0], "03H")
+		np.testing.assert_array_equal(t[0][["inst", "ave", "max", "min", "dev"]].tolist(), [15.6, 15.6, 15.6, 14.7, 0.])
+
+		rh = weatherparser.select(readings, "RH")
+		self.assertEqual(len(rh), 1)
+		self.assertEqual(rh["station"][0], 0)
+		self.assertEqual(rh["unit"][0], "%")
+		self.assertEqual(len(weatherparser.select(readings, "WS")), 2)
+		self.assertEqual(len(weatherparser.select(readings, "WS", valid=False)), 3)
+		self.assertEqual(len(weatherparser.select(readings, "QNH")), 1)
+
+	def test_report(self):
+		report = util.load_station("LaSilla").WeatherReport()
+		self.assertEqual(report.parse(self.text), (233., 2.7, 15.6, 60.))
+
+		# with a reading of the 3.6m anemometer, and without any temperature
+		lines = [line for line in self.text.split("\n") if not line.startswith("T ")]
+		lines = ["WS3 M/S 10M    9.0    9.0    9.0    9.0    0.0" if line.startswith("WS3 ") else line for line in lines]
+		self.assertEqual(report.parse("\n".join(lines))[:3], (233., 9., -9999))
+
+		self.assertEqual(report.parse(""), (-9999, -9999, -9999, -9999))
+
+	def test_archive(self):
+		tmpdir = tempfile.mkdtemp()
+		try:
+			history = self.text + self.text.replace("2018-02-08  16:36", "2018-02-08  16:37").replace("15.6", "15.1")
+			paths = []
+			for i in range(3):
+				paths.append(os.path.join(tmpdir, "meteo{}.last".format(i)))
+				with open(paths[-1], "w") as f:
+					f.write(history)
+			with open(os.path.join(tmpdir, "broken.last"), "w") as f:
+				f.write(self.text.replace("   60     60", "   60     --"))
+
+			reports, readings = weatherparser.parse_files(paths + [os.path.join(tmpdir, "broken.last")])
+			self.assertEqual(len(reports), 6)
+			self.assertEqual(len(readings), 6 * 13)
+			self.assertEqual(list(np.unique(readings["report"])), list(range(6)))
+			self.assertEqual(reports["time"][1] - reports["time"][0], np.timedelta64(1, "m"))
+
+			t = weatherparser.select(readings, "T")
+			np.testing.assert_array_equal(t["ave"][t["report"] % 2 == 1], 15.1)
+		finally:
+			shutil.rmtree(tmpdir)
+
+		reports, readings = weatherparser.parse("RH  %   03H     60     60     64     59    0.0\n")
+		self.assertTrue(np.isnat(reports["time"][0]))
+		self.assertEqual(readings["ave"][0], 60.)
+
+
+if __name__ == "__main__":
+
+	unittest.main()
@@ -0,0 +1,142 @@
+"""
+Testing script for the background weather report downloads, against a local HTTP server
+"""
+
+import os, sys
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler
+
+path = os.path.join(os.path.dirname(os.path.realpath(sys.argv[0])), '../pouet')
+sys.path.append(path)
+
+import fetcher, meteo, resources, util, weatherservice
+import httpstub
+
+
+class Handler(BaseHTTPRequestHandler):
+	'''Serves the debug weather report, slowly or with errors on demand'''
+
+	def do_GET(self):
+		server = self.server
+		server.requests.append(time.time())
+		time.sleep(server.latency)
+		if server.failing:
+			self.send_response(503)
+			self.end_headers()
+			return
+		self.send_response(200)
+		self.send_header("Content-Type", "text/plain")
+		self.send_header("Content-Length", str(len(server.content)))
+		self.end_headers()
+		try:
+			self.wfile.write(server.content)
+		except (BrokenPipeError, ConnectionResetError):
+			pass
+
+	def log_message(self, *args):
+		pass
+
+
+def wait_for(condition, timeout=5.):
+	t0 = time.time()
+	while not condition():
+		if time.time() - t0 > timeout:
+			return False
+		time.sleep(0.01)
+	return True
+
+
+class WeatherServiceTest(unittest.TestCase):
+	'''Download the weather report in a worker thread'''
+
+	@classmethod
+	def setUpClass(cls):
+		cls.server = httpstub.start(Handler, "meteo.last")
+		cls.server.content = resources.read_text("config", "meteoDebugMode.last").encode("utf-8")
+		cls.url = cls.server.url
+		cls.report = util.load_station("LaSilla").WeatherReport()
+		cls.expected = cls.report.get(debugmode=True)
+
+	@classmethod
+	def tearDownClass(cls):
+		httpstub.stop(cls.server)
+
+	def setUp(self):
+		self.server.requests = []
+		self.server.latency = 0.
+		self.server.failing = False
+
+	def test_poll(self):
+		service = weatherservice.WeatherService(self.report, url=self.url)
+		self.assertIsNone(service.latest())
+		self.assertEqual(service.poll(), fetcher.NEW)
+		values, t, readtime = service.latest()
+		self.assertEqual(values, tuple(self.expected))
+		# the time in the header of the report
+		self.assertEqual(readtime.iso, "2018-02-08 16:36:00.000")
+
+		self.assertEqual(service.poll(), fetcher.UNCHANGED)
+		self.assertGreaterEqual(service.latest()[1], t)
+		self.assertEqual(service.latest()[2], readtime)
+
+		self.server.failing = True
+		self.assertEqual(service.poll(), fetcher.FAILED)
+		self.assertEqual(service.poll(), fetcher.FAILED)
+		# the last reading is kept
+		self.assertEqual(service.latest()[0], values)
+		service.fetcher.close()
+
+	def test_backoff(self):
+		service = weatherservice.WeatherService(self.report, url=self.url, period=10., maxbackoff=60.)
+		self.assertEqual(service.delay(), 10.)
+		for failures, delay in [(1, 20.), (2, 40.), (3, 60.), (10, 60.)]:
+			service.failures = failures
+			self.assertEqual(service.delay(), delay)
+
+		self.server.failing = True
+		service = weatherservice.WeatherService(self.report, url=self.url, period=0.05, maxbackoff=0.2)
+		service.start()
+		self.assertTrue(wait_for(lambda: len(self.server.requests) >= 5))
+		service.stop()
+		gaps = [b - a for a, b in zip(self.server.requests[:5], self.server.requests[1:5])]
+		self.assertGreater(gaps[-1], gaps[0])
+		self.assertIsNone(service.latest())
+
+	def test_meteo(self):
+		currentmeteo = meteo.Meteo(name='LaSilla', cloudscheck=False, debugmode=False, minimal=True)
+		currentmeteo.weatherReport.url = self.url
+		self.server.latency = 1.
+		self.assertTrue(currentmeteo.start_weatherservice())
+
+		# no reading yet, and the callers do not wait for the server
+		t0 = time.time()
+		currentmeteo.updateweather()
+		self.assertLess(time.time() - t0, 0.5)
+		self.assertIsNone(currentmeteo.lastest_weatherupdate_time)
+
+		self.assertTrue(wait_for(lambda: currentmeteo.weatherservice.latest() is not None))
+		currentmeteo.updateweather()
+		self.assertEqual((currentmeteo.winddirection, currentmeteo.windspeed, currentmeteo.temperature, currentmeteo.humidity), tuple(self.expected))
+		self.assertIsNotNone(currentmeteo.lastest_weatherupdate_time)
+
+		t0 = time.time()
+		currentmeteo.stop_weatherservice()
+		self.assertLess(time.time() - t0, 2.)
+		self.assertIsNone(currentmeteo.weatherservice)
+
+		debug = meteo.Meteo(name='LaSilla', cloudscheck=False, debugmode=True, minimal=True)
+		self.assertFalse(debug.start_weatherservice())
+
+	def test_timeout(self):
+		self.server.latency = 2.
+		service = weatherservice.WeatherService(self.report, url=self.url, timeout=(1., 0.3))
+		t0 = time.time()
+		self.assertEqual(service.poll(), fetcher.FAILED)
+		self.assertLess(time.time() - t0, 1.5)
+		self.assertEqual(service.failures, 1)
+
+
+if __name__ == "__main__":
+
+	unittest.main()